@@ -36,5 +36,7 @@ from .version import VERSION
 from . import logging_ as logging
 from . import paths
 from . import plugins
+from . import query
+from . import rcon
 from . import server
 from . import worlds
@@ -140,6 +140,17 @@ class Application(object):
         """
         return self._paths
 
+    def lock(self):
+        """
+        Returns the file lock, which prevents multiple EMSM applications
+        from running at the same time.
+
+        Long running plugins (e.g. the guard daemon) may release the lock,
+        while they are idle. They must acquire it again, before they access
+        the worlds and before they return.
+        """
+        return self._lock
+
     def conf(self):
         """
         Returns the used :class:`~emsm.core.conf.Configuration` instance.
@@ -208,6 +208,8 @@ class WorldsConfiguration(ConfigParser):
         "stop_message = string\n"
         "stop_delay = int\n"
         "server = a server in server.conf\n"
+        "depends_on = comma separated list of worlds\n"
+        "start_order = int\n"
         "\n"
         "Note, that some plugins may offer you some more options for\n"
         "a world, like *enable_initd*. Take a look at the plugins help page\n"
@@ -225,6 +227,8 @@ class WorldsConfiguration(ConfigParser):
         defaults["stop_delay"] = "5"
         defaults["stop_message"] = "The server is going down.\n"\
                                    "Hope to see you soon."
+        defaults["depends_on"] = ""
+        defaults["start_order"] = "0"
         return None
 
 
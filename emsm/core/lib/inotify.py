@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Benedikt Schmitt <benedikt@benediktschmitt.de>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+A small wrapper for the Linux *inotify(7)* API, which uses :mod:`ctypes`, so
+that we don't depend on a third party package.
+
+:class:`Inotify` is a thin wrapper around the inotify file descriptor.
+:class:`TreeWatcher` watches a whole directory tree and reports the paths
+of the changed files.
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "InotifyError",
+    "Event",
+    "Changes",
+    "Inotify",
+    "TreeWatcher"
+    ]
+
+# The event masks (see *inotify(7)*).
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+# The flags of *inotify_init1()*.
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# *struct inotify_event* without the variable length name.
+_EVENT_HEADER = struct.Struct("iIII")
+
+# The events, which indicate a change in a watched directory.
+TREE_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM \
+            | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF \
+            | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW | IN_EXCL_UNLINK
+
+_libc = None
+
+
+# Exceptions
+# ------------------------------------------------
+
+class InotifyError(OSError):
+    """
+    Raised if an inotify call failed or inotify is not available.
+    """
+    pass
+
+
+# Functions
+# ------------------------------------------------
+
+def _load_libc():
+    """
+    Loads the C library and returns it.
+
+    :raises InotifyError:
+        if the C library has no inotify support.
+    """
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise InotifyError(errno.ENOSYS, "inotify is not available")
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [
+            ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32
+            ]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+def _check(result):
+    """
+    Raises an :class:`InotifyError` with the current *errno*, if *result*
+    is negative.
+    """
+    if result < 0:
+        err = ctypes.get_errno()
+        raise InotifyError(err, os.strerror(err))
+    return result
+
+
+# Classes
+# ------------------------------------------------
+
+#: A single inotify event. *name* is the name of the file in the watched
+#: directory or an empty string, if the event concerns the directory itself.
+Event = collections.namedtuple("Event", ["wd", "mask", "cookie", "name"])
+
+#: The changes reported by :meth:`TreeWatcher.read`:
+#:
+#: *paths*
+#:      The set of the changed, created or deleted paths, relative to the
+#:      root directory.
+#: *overflow*
+#:      ``True``, if the kernel dropped events or a directory could not
+#:      be watched (see :meth:`TreeWatcher.incomplete`), so *paths* is
+#:      incomplete.
+#: *root_changed*
+#:      ``True``, if the attributes (e.g. the mtime) of the root directory
+#:      changed.
+#: *root_gone*
+#:      ``True``, if the root directory has been removed, moved or
+#:      unmounted. The watcher should be closed.
+Changes = collections.namedtuple(
+    "Changes", ["paths", "overflow", "root_changed", "root_gone"]
+    )
+
+
+class Inotify(object):
+    """
+    Wraps an inotify file descriptor.
+
+    :raises InotifyError:
+        if inotify is not available.
+    """
+
+    def __init__(self):
+        """
+        """
+        self._libc = _load_libc()
+        self._fd = _check(self._libc.inotify_init1(IN_CLOEXEC))
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return None
+
+    def fileno(self):
+        """
+        Returns the inotify file descriptor.
+        """
+        return self._fd
+
+    def close(self):
+        """
+        Closes the file descriptor. All watches are removed.
+        """
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        return None
+
+    def add_watch(self, path, mask):
+        """
+        Watches *path* for the events in *mask* and returns the watch
+        descriptor.
+        """
+        return _check(self._libc.inotify_add_watch(
+            self._fd, os.fsencode(path), mask
+            ))
+
+    def rm_watch(self, wd):
+        """
+        Removes the watch *wd*.
+        """
+        _check(self._libc.inotify_rm_watch(self._fd, wd))
+        return None
+
+    def read(self, timeout=None):
+        """
+        Waits up to *timeout* seconds (forever, if ``None``) for events and
+        returns the list of all pending :class:`Event` objects.
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return list()
+
+        data = os.read(self._fd, 64*1024)
+        events = list()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append(Event(wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+
+class TreeWatcher(object):
+    """
+    Watches the directory *root* and all its sub directories.
+
+    New directories are watched as soon as they are created. Since files may
+    be created in a new directory before it is watched, all files in a new
+    directory are reported as changed.
+
+    If a directory can not be watched, e.g. since the *max_user_watches*
+    limit has been reached, the watcher is :meth:`incomplete` and each
+    :meth:`read` reports an overflow.
+    """
+
+    def __init__(self, root):
+        """
+        """
+        self._root = os.path.abspath(root)
+        self._inotify = Inotify()
+
+        # Maps the watch descriptors to the directory (relative to *root*).
+        self._dirs = dict()
+        self._root_wd = None
+
+        # True, if a directory in the tree is not watched.
+        self._incomplete = False
+        return None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return None
+
+    def root(self):
+        """
+        Returns the watched root directory.
+        """
+        return self._root
+
+    def incomplete(self):
+        """
+        Returns ``True``, if a directory in the tree could not be watched,
+        so that changes in it are not reported.
+        """
+        return self._incomplete
+
+    def close(self):
+        """
+        """
+        self._inotify.close()
+        self._dirs.clear()
+        return None
+
+    def start(self):
+        """
+        Watches the whole directory tree.
+        """
+        self._root_wd = self._inotify.add_watch(self._root, TREE_MASK)
+        self._dirs[self._root_wd] = os.curdir
+        self._watch_tree(os.curdir)
+        return None
+
+    def _watch_tree(self, rel_dir):
+        """
+        Watches all sub directories of *rel_dir* and returns the paths of
+        all files in them.
+        """
+        files = set()
+        top = os.path.join(self._root, rel_dir)
+        for dirpath, dirnames, filenames in os.walk(top):
+            rel_path = os.path.normpath(os.path.relpath(dirpath, self._root))
+            if rel_path != os.curdir:
+                try:
+                    wd = self._inotify.add_watch(dirpath, TREE_MASK)
+                except InotifyError as err:
+                    # The directory has already been removed again.
+                    if err.errno in (errno.ENOENT, errno.ENOTDIR):
+                        continue
+                    # E.g. ENOSPC, if the *max_user_watches* limit has been
+                    # reached. The changes in the directory are lost.
+                    self._incomplete = True
+                    continue
+                self._dirs[wd] = rel_path
+            for filename in filenames:
+                files.add(os.path.normpath(os.path.join(rel_path, filename)))
+        return files
+
+    def _unwatch_tree(self, rel_dir):
+        """
+        Removes the watches of *rel_dir* and its sub directories, after the
+        directory has been moved away.
+        """
+        prefix = rel_dir + os.sep
+        for wd, path in list(self._dirs.items()):
+            if path == rel_dir or path.startswith(prefix):
+                del self._dirs[wd]
+                try:
+                    self._inotify.rm_watch(wd)
+                except InotifyError:
+                    pass
+        return None
+
+    def read(self, timeout=None):
+        """
+        Waits up to *timeout* seconds for events and returns the
+        :class:`Changes`.
+        """
+        paths = set()
+        overflow = False
+        root_changed = False
+        root_gone = False
+
+        for event in self._inotify.read(timeout):
+            if event.mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+
+            rel_dir = self._dirs.get(event.wd)
+            if rel_dir is None:
+                continue
+
+            if event.mask & IN_IGNORED:
+                del self._dirs[event.wd]
+                if event.wd == self._root_wd:
+                    root_gone = True
+                continue
+
+            # Events of the watched directory itself.
+            if not event.name:
+                if event.wd == self._root_wd:
+                    if event.mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                        root_gone = True
+                    elif event.mask & IN_ATTRIB:
+                        root_changed = True
+                continue
+
+            path = os.path.normpath(os.path.join(rel_dir, event.name))
+            paths.add(path)
+
+            if event.mask & IN_ISDIR:
+                if event.mask & (IN_CREATE | IN_MOVED_TO):
+                    paths.update(self._watch_tree(path))
+                elif event.mask & IN_MOVED_FROM:
+                    self._unwatch_tree(path)
+        overflow = overflow or self._incomplete
+        return Changes(paths, overflow, root_changed, root_gone)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Benedikt Schmitt <benedikt@benediktschmitt.de>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+Extracts the tick lag warnings of a minecraft server from its log:
+
+.. code-block:: none
+
+    [12:34:56] [Server thread/WARN]: Can't keep up! Is the server overloaded?
+    Running 5023ms or 100 ticks behind
+
+:class:`LagMonitor` reads only the new part of the log on each update and
+keeps the events of the last hour, so that rolling aggregates like the
+number of events per hour or the 95th percentile of the lag are available.
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import collections
+import datetime
+import math
+import os
+import re
+import time
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "LagEvent",
+    "LagStats",
+    "parse_lag_line",
+    "percentile",
+    "LagMonitor"
+    ]
+
+# The time span in seconds, which is covered by the aggregates.
+WINDOW = 60*60
+
+# The maximum number of events kept in the window, so that the state of a
+# heavily lagging server does not grow without limit.
+MAX_EVENTS = 10000
+
+# Minecraft 1.7+ logs only the time of the day, older versions the date too.
+_TIME_RE = re.compile(r"^\[(\d\d):(\d\d):(\d\d)\]")
+_DATETIME_RE = re.compile(r"^(\d{4})-(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)")
+
+# *"Running 5023ms or 100 ticks behind"* and since 1.8
+# *"Running 5023ms behind, skipping 100 tick(s)"*. Very old versions do not
+# log the lag at all.
+_MS_RE = re.compile(r"Running (\d+)ms")
+
+
+# Functions
+# ------------------------------------------------
+
+#: A single lag warning. *time* is the unix timestamp of the warning and
+#: *ms* the number of milliseconds the server is behind or ``None``, if the
+#: server did not log it.
+LagEvent = collections.namedtuple("LagEvent", ["time", "ms"])
+
+#: The aggregates of the lag events in the window (see :meth:`LagMonitor.stats`):
+#:
+#: *events*
+#:      The number of lag warnings.
+#: *per_hour*
+#:      The number of lag warnings per hour.
+#: *p95*, *max*
+#:      The 95th percentile and the maximum of the milliseconds the server
+#:      has been behind or ``None``, if unknown.
+#: *last*
+#:      The unix timestamp of the latest warning or ``None``.
+LagStats = collections.namedtuple(
+    "LagStats", ["events", "per_hour", "p95", "max", "last"]
+    )
+
+
+def parse_lag_line(line, now=None):
+    """
+    Returns the :class:`LagEvent` of the lag warning *line*.
+
+    If the line contains only the time of the day, the event is assumed
+    to be the latest one before *now*. If it has no timestamp at all,
+    *now* is used.
+    """
+    now = time.time() if now is None else now
+
+    match = _DATETIME_RE.match(line)
+    if match:
+        timestamp = time.mktime(
+            datetime.datetime(*map(int, match.groups())).timetuple()
+            )
+    else:
+        match = _TIME_RE.match(line)
+        if match:
+            hour, minute, second = map(int, match.groups())
+            today = datetime.datetime.fromtimestamp(now)
+            timestamp = time.mktime(today.replace(
+                hour=hour, minute=minute, second=second, microsecond=0
+                ).timetuple())
+
+            # The warning has been logged before midnight.
+            if timestamp > now + 60:
+                timestamp -= 24*60*60
+        else:
+            timestamp = now
+
+    match = _MS_RE.search(line)
+    ms = int(match.group(1)) if match else None
+    return LagEvent(timestamp, ms)
+
+
+def percentile(values, p):
+    """
+    Returns the *p*-th percentile (nearest rank) of *values* or ``None``,
+    if *values* is empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(1, int(math.ceil(p/100*len(values))))
+    return values[rank - 1]
+
+
+# Classes
+# ------------------------------------------------
+
+class LagMonitor(object):
+    """
+    Collects the lag warnings in the log *path*, which are matched by
+    *lag_re* (see :meth:`emsm.core.server.BaseServerWrapper.log_lag_re`).
+
+    *state* is the value of :meth:`state` after the previous update.
+
+    The events are discarded, when the server has been restarted, i.e. the
+    log has been rotated or truncated or a line matches *start_re* (see
+    :meth:`emsm.core.server.BaseServerWrapper.log_start_re`), since the
+    lag of the previous run says nothing about the current one.
+    """
+
+    def __init__(self, path, lag_re, state=None, window=WINDOW,
+                 start_re=None):
+        """
+        """
+        self._path = path
+        self._lag_re = re.compile(lag_re)
+        self._start_re = re.compile(start_re) if start_re is not None \
+                         else None
+        self._window = window
+
+        # The inode of the log, the number of bytes, which have already
+        # been scanned and the events in the window.
+        state = state or dict()
+        self._inode = state.get("inode")
+        self._offset = state.get("offset", 0)
+        self._events = collections.deque(
+            (LagEvent(*event) for event in state.get("events", list())),
+            maxlen = MAX_EVENTS
+            )
+        return None
+
+    def state(self):
+        """
+        Returns a JSON serializable dictionary, which can be used to
+        continue the monitoring later.
+        """
+        return {
+            "inode": self._inode,
+            "offset": self._offset,
+            "events": [list(event) for event in self._events]
+            }
+
+    def events(self):
+        """
+        Returns the list of the :class:`LagEvent` objects in the window.
+        """
+        return list(self._events)
+
+    def _expire(self, now):
+        """
+        Removes the events, which are older than the window.
+        """
+        while self._events and self._events[0].time < now - self._window:
+            self._events.popleft()
+        return None
+
+    def update(self, now=None):
+        """
+        Scans the new lines of the log and returns the list of the new
+        :class:`LagEvent` objects. An incomplete last line is scanned in the
+        next update.
+        """
+        now = time.time() if now is None else now
+        try:
+            with open(self._path, "rb") as file:
+                stat = os.fstat(file.fileno())
+
+                # The log has been rotated or truncated.
+                if stat.st_ino != self._inode or stat.st_size < self._offset:
+                    self._inode = stat.st_ino
+                    self._offset = 0
+                    self._events.clear()
+
+                file.seek(self._offset)
+                data = file.read()
+        except OSError:
+            data = b""
+
+        data = data[:data.rfind(b"\n") + 1]
+        self._offset += len(data)
+
+        events = list()
+        for line in data.decode(errors="replace").splitlines():
+            if self._start_re is not None and self._start_re.match(line):
+                self._events.clear()
+                events = list()
+            elif self._lag_re.match(line):
+                events.append(parse_lag_line(line, now))
+        self._events.extend(sorted(events))
+        self._expire(now)
+        return events
+
+    def stats(self, now=None):
+        """
+        Returns the :class:`LagStats` of the events in the window.
+        """
+        now = time.time() if now is None else now
+        self._expire(now)
+
+        events = self._events
+        ms = [event.ms for event in events if event.ms is not None]
+        return LagStats(
+            events = len(events),
+            per_hour = len(events)*60*60/self._window,
+            p95 = percentile(ms, 95),
+            max = max(ms) if ms else None,
+            last = events[-1].time if events else None
+            )
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Benedikt Schmitt <benedikt@benediktschmitt.de>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+A minimal client for S3 compatible object stores (AWS S3, MinIO, Ceph, ...).
+
+Only the few operations needed to store backups are implemented. The requests
+are signed with AWS Signature Version 4 and sent with :mod:`urllib`, so that
+we don't depend on a large SDK. The objects are addressed path-style
+(``endpoint/bucket/key``), which is supported by all S3 compatible servers.
+
+Large objects are uploaded with :class:`MultipartWriter` and read with
+:class:`RangeReader`. Both hold at most one part (block) in memory.
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import datetime
+import hashlib
+import hmac
+import io
+import urllib.error
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "S3Error",
+    "S3Client",
+    "MultipartWriter",
+    "RangeReader"
+    ]
+
+# The hash of an empty payload.
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+
+# S3 requires at least 5 MiB for all parts of a multipart upload, but the
+# last one.
+MIN_PART_SIZE = 5*2**20
+
+
+# Exceptions
+# ------------------------------------------------
+
+class S3Error(Exception):
+    """
+    Raised if the S3 server rejected a request.
+    """
+
+    def __init__(self, status, code, message):
+        self.status = status
+        self.code = code
+        self.message = message
+        return None
+
+    def __str__(self):
+        temp = "S3 error {} ({}): {}"\
+               .format(self.status, self.code, self.message)
+        return temp
+
+
+# Functions
+# ------------------------------------------------
+
+def _quote(value, safe="-_.~"):
+    """
+    URI encodes *value* as required by Signature Version 4.
+    """
+    return urllib.parse.quote(value, safe=safe)
+
+
+def _hmac(key, msg):
+    """
+    """
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def _xml_find(element, name):
+    """
+    Returns the text of the first child *name* of *element*, ignoring the
+    XML namespace of the S3 responses.
+    """
+    for child in element.iter():
+        if child.tag.rsplit("}", 1)[-1] == name:
+            return child.text
+    return None
+
+
+# Classes
+# ------------------------------------------------
+
+class S3Client(object):
+    """
+    Sends signed requests to the S3 compatible server at *endpoint*,
+    e.g. ``https://s3.eu-central-1.amazonaws.com`` or
+    ``http://localhost:9000``.
+    """
+
+    def __init__(self, endpoint, access_key, secret_key, region="us-east-1",
+                 timeout=60):
+        """
+        """
+        self._endpoint = endpoint.rstrip("/")
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self._region = region
+        self._timeout = timeout
+        return None
+
+    def endpoint(self):
+        """
+        Returns the URL of the server.
+        """
+        return self._endpoint
+
+    def sign(self, method, path, query, headers, payload_hash, now=None):
+        """
+        Adds the Signature Version 4 *Authorization* header to the
+        dictionary *headers*. All headers in *headers* are signed, so
+        *headers* must contain the *host* header.
+
+        *path* is the URI encoded path and *query* a dictionary with the
+        (not encoded) query parameters.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope_date = now.strftime("%Y%m%d")
+
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = payload_hash
+
+        canonical_headers = sorted(
+            (name.lower(), " ".join(str(value).split())) \
+            for name, value in headers.items()
+            )
+        signed_headers = ";".join(name for name, value in canonical_headers)
+        canonical_request = "\n".join([
+            method,
+            path,
+            "&".join("{}={}".format(_quote(key), _quote(value)) \
+                     for key, value in sorted(query.items())),
+            "".join("{}:{}\n".format(name, value) \
+                    for name, value in canonical_headers),
+            signed_headers,
+            payload_hash
+            ])
+
+        scope = "{}/{}/s3/aws4_request".format(scope_date, self._region)
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest()
+            ])
+
+        key = _hmac(("AWS4" + self._secret_key).encode(), scope_date)
+        key = _hmac(key, self._region)
+        key = _hmac(key, "s3")
+        key = _hmac(key, "aws4_request")
+        signature = hmac.new(
+            key, string_to_sign.encode(), hashlib.sha256
+            ).hexdigest()
+
+        headers["Authorization"] = \
+            "AWS4-HMAC-SHA256 Credential={}/{}, SignedHeaders={}, "\
+            "Signature={}".format(
+                self._access_key, scope, signed_headers, signature
+                )
+        return headers
+
+    def request(self, method, bucket, key="", query=None, headers=None,
+                body=b""):
+        """
+        Sends a signed request and returns the response. The response must be
+        closed by the caller.
+
+        :raises S3Error:
+            if the server responded with an error.
+        """
+        query = query or dict()
+        headers = dict(headers or dict())
+
+        path = "/" + _quote(bucket)
+        if key:
+            path += "/" + _quote(key, safe="-_.~/")
+
+        url = urllib.parse.urlsplit(self._endpoint)
+        headers["host"] = url.netloc
+        self.sign(
+            method, url.path.rstrip("/") + path, query, headers,
+            hashlib.sha256(body).hexdigest()
+            )
+
+        full_url = self._endpoint + path
+        if query:
+            full_url += "?" + "&".join(
+                "{}={}".format(_quote(key), _quote(value)) \
+                for key, value in sorted(query.items())
+                )
+
+        request = urllib.request.Request(
+            full_url, data=body if method in ("PUT", "POST") else None,
+            headers=headers, method=method
+            )
+        try:
+            return urllib.request.urlopen(request, timeout=self._timeout)
+        except urllib.error.HTTPError as err:
+            data = err.read()
+            err.close()
+            try:
+                root = xml.etree.ElementTree.fromstring(data)
+            except xml.etree.ElementTree.ParseError:
+                raise S3Error(err.code, None, err.reason)
+            raise S3Error(
+                err.code, _xml_find(root, "Code"), _xml_find(root, "Message")
+                )
+
+    def head_object(self, bucket, key):
+        """
+        Returns the size of the object or ``None``, if it does not exist.
+        """
+        try:
+            with self.request("HEAD", bucket, key) as resp:
+                return int(resp.headers["Content-Length"])
+        except S3Error as err:
+            if err.status == 404:
+                return None
+            raise
+
+    def get_object(self, bucket, key, start=None, end=None):
+        """
+        Returns the content of the object. If *start* is given, only the
+        bytes from *start* to *end* (inclusive) are returned.
+        """
+        headers = dict()
+        if start is not None:
+            headers["range"] = "bytes={}-{}".format(
+                start, end if end is not None else ""
+                )
+        with self.request("GET", bucket, key, headers=headers) as resp:
+            return resp.read()
+
+    def put_object(self, bucket, key, data):
+        """
+        Uploads the object *key* with the content *data* (bytes).
+        """
+        with self.request("PUT", bucket, key, body=data) as resp:
+            resp.read()
+        return None
+
+    def delete_object(self, bucket, key):
+        """
+        Removes the object. Missing objects are ignored.
+        """
+        with self.request("DELETE", bucket, key) as resp:
+            resp.read()
+        return None
+
+    def list_objects(self, bucket, prefix=""):
+        """
+        Yields a two tuple *(key, size)* for each object, whose key starts
+        with *prefix*.
+        """
+        query = {"list-type": "2", "prefix": prefix}
+        while True:
+            with self.request("GET", bucket, query=query) as resp:
+                root = xml.etree.ElementTree.fromstring(resp.read())
+
+            for element in root:
+                if element.tag.rsplit("}", 1)[-1] != "Contents":
+                    continue
+                yield (_xml_find(element, "Key"),
+                       int(_xml_find(element, "Size")))
+
+            if _xml_find(root, "IsTruncated") != "true":
+                break
+            query["continuation-token"] = _xml_find(
+                root, "NextContinuationToken"
+                )
+        return None
+
+    def create_multipart_upload(self, bucket, key):
+        """
+        Starts a multipart upload and returns its id.
+        """
+        with self.request("POST", bucket, key, query={"uploads": ""}) as resp:
+            root = xml.etree.ElementTree.fromstring(resp.read())
+        return _xml_find(root, "UploadId")
+
+    def upload_part(self, bucket, key, upload_id, part_number, data):
+        """
+        Uploads the part *part_number* (starting at 1) and returns its ETag.
+        """
+        query = {"partNumber": str(part_number), "uploadId": upload_id}
+        with self.request("PUT", bucket, key, query=query, body=data) as resp:
+            resp.read()
+            return resp.headers["ETag"]
+
+    def complete_multipart_upload(self, bucket, key, upload_id, etags):
+        """
+        Completes the multipart upload with the ETags of all parts.
+        """
+        body = io.StringIO()
+        body.write("<CompleteMultipartUpload>")
+        for part_number, etag in enumerate(etags, 1):
+            body.write(
+                "<Part><PartNumber>{}</PartNumber><ETag>{}</ETag></Part>"\
+                .format(part_number, etag.replace("&", "&amp;")\
+                        .replace("<", "&lt;").replace(">", "&gt;"))
+                )
+        body.write("</CompleteMultipartUpload>")
+
+        query = {"uploadId": upload_id}
+        with self.request(
+            "POST", bucket, key, query=query, body=body.getvalue().encode()
+            ) as resp:
+            data = resp.read()
+
+        # S3 may report an error with the status code 200.
+        root = xml.etree.ElementTree.fromstring(data)
+        if root.tag.rsplit("}", 1)[-1] == "Error":
+            raise S3Error(200, _xml_find(root, "Code"),
+                          _xml_find(root, "Message"))
+        return None
+
+    def abort_multipart_upload(self, bucket, key, upload_id):
+        """
+        Aborts the multipart upload and removes the uploaded parts.
+        """
+        query = {"uploadId": upload_id}
+        with self.request("DELETE", bucket, key, query=query) as resp:
+            resp.read()
+        return None
+
+
+class MultipartWriter(object):
+    """
+    A writeable, not seekable file object, that uploads the data written to
+    it as the object *key*. At most *part_size* bytes are buffered.
+
+    Small objects (less than one part) are uploaded with a single *PUT*
+    request. The object is only created, when :meth:`close` is called.
+    :meth:`abort` discards the upload.
+    """
+
+    def __init__(self, client, bucket, key, part_size=8*2**20):
+        """
+        """
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(part_size, MIN_PART_SIZE)
+
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._etags = list()
+        self._size = 0
+        self._closed = False
+        return None
+
+    def write(self, data):
+        """
+        """
+        self._buffer += data
+        self._size += len(data)
+        while len(self._buffer) >= self._part_size:
+            self._upload_part(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+        return len(data)
+
+    def tell(self):
+        """
+        Returns the number of bytes written so far.
+        """
+        return self._size
+
+    def flush(self):
+        """
+        """
+        return None
+
+    def _upload_part(self, data):
+        """
+        """
+        if self._upload_id is None:
+            self._upload_id = self._client.create_multipart_upload(
+                self._bucket, self._key
+                )
+        etag = self._client.upload_part(
+            self._bucket, self._key, self._upload_id,
+            len(self._etags) + 1, data
+            )
+        self._etags.append(etag)
+        return None
+
+    def close(self):
+        """
+        Uploads the remaining data and creates the object.
+        """
+        if self._closed:
+            return None
+        self._closed = True
+
+        if self._upload_id is None:
+            self._client.put_object(self._bucket, self._key, bytes(self._buffer))
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self._client.complete_multipart_upload(
+                self._bucket, self._key, self._upload_id, self._etags
+                )
+        self._buffer = bytearray()
+        return None
+
+    def abort(self):
+        """
+        Discards all data written so far.
+        """
+        if self._closed:
+            return None
+        self._closed = True
+
+        if self._upload_id is not None:
+            self._client.abort_multipart_upload(
+                self._bucket, self._key, self._upload_id
+                )
+        self._buffer = bytearray()
+        return None
+
+
+class RangeReader(io.RawIOBase):
+    """
+    A readable and seekable file object for the object *key*. The data is
+    fetched with *Range* requests of *block_size* bytes, so reading the
+    object sequentially costs one request per block and seeking is cheap.
+    """
+
+    def __init__(self, client, bucket, key, size=None, block_size=8*2**20):
+        """
+        """
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._block_size = block_size
+
+        self._size = size if size is not None \
+                     else client.head_object(bucket, key)
+        if self._size is None:
+            raise FileNotFoundError(key)
+
+        self._pos = 0
+        self._block_start = 0
+        self._block = b""
+        return None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def size(self):
+        """
+        Returns the size of the object.
+        """
+        return self._size
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        """
+        """
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError("invalid whence ({})".format(whence))
+
+        if pos < 0:
+            raise ValueError("negative seek position {}".format(pos))
+        self._pos = pos
+        return self._pos
+
+    def readinto(self, buffer):
+        """
+        """
+        if self._pos >= self._size:
+            return 0
+
+        # Fetch the block, that contains the current position.
+        offset = self._pos - self._block_start
+        if not 0 <= offset < len(self._block):
+            end = min(self._pos + self._block_size, self._size) - 1
+            self._block = self._client.get_object(
+                self._bucket, self._key, self._pos, end
+                )
+            self._block_start = self._pos
+            offset = 0
+
+        data = self._block[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
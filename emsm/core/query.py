@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Benedikt Schmitt <benedikt@benediktschmitt.de>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+A client for the (GameSpy 4) UDP query protocol, which is supported by the
+minecraft server, if *enable-query* is set in the :file:`server.properties`.
+
+A query is much cheaper than a Server List Ping, since it needs no tcp
+connection. :func:`query_servers` queries many servers at once from a single
+udp socket and caches the results for a short time, so that several
+consumers can share one poll:
+
+.. code-block:: python
+
+    >>> query_servers([("localhost", 25565), ("localhost", 25566)])
+    [QueryResult(hostname='A Minecraft Server', ...), asyncio.TimeoutError()]
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import asyncio
+import collections
+import logging
+import random
+import struct
+import threading
+import time
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "QueryError",
+    "QueryResult",
+    "query_servers",
+    "query"
+    ]
+
+log = logging.getLogger(__file__)
+
+# Seconds, until a server is considered unresponsive.
+QUERY_TIMEOUT = 2
+
+# The number of times a request is sent, since udp packets may be lost.
+QUERY_ATTEMPTS = 3
+
+# Seconds, a result is reused by :func:`query_servers`.
+CACHE_TTL = 2
+
+# The packet types.
+TYPE_HANDSHAKE = 0x09
+TYPE_STAT = 0x00
+
+_MAGIC = b"\xfe\xfd"
+
+# The header of the full stat response and the start of the player list.
+_STAT_PADDING = b"splitnum\x00\x80\x00"
+_PLAYER_PADDING = b"\x01player_\x00\x00"
+
+# Maps the address of a server to the tuple (time, result).
+_cache = dict()
+_cache_lock = threading.Lock()
+
+
+# Exceptions
+# ------------------------------------------------
+
+class QueryError(Exception):
+    """
+    Raised, if a server sent an invalid answer to a query.
+    """
+    pass
+
+
+# Functions
+# ------------------------------------------------
+
+#: The full stat of a server. *online* and *max* are the number of online
+#: players and the player limit, *players* the names of the online players,
+#: *server_mod* the name of the server software (e.g. *CraftBukkit*) and
+#: *plugins* the list of the installed plugins. *latency* is the time in
+#: seconds the server needed to answer the stat request.
+QueryResult = collections.namedtuple(
+    "QueryResult", [
+        "hostname", "game_type", "game_id", "version", "server_mod",
+        "plugins", "map", "online", "max", "host_ip", "host_port",
+        "players", "latency"
+        ])
+
+
+def _split_strings(data):
+    """
+    Splits the null terminated strings in *data* until the first empty
+    string and returns them and the remaining data.
+    """
+    strings = list()
+    while True:
+        end = data.find(b"\x00")
+        if end < 0:
+            raise QueryError("unterminated string")
+        string, data = data[:end], data[end + 1:]
+        if not string:
+            return (strings, data)
+        strings.append(string.decode("utf-8", errors="replace"))
+
+
+def _parse_plugins(value):
+    """
+    Returns the tuple (server_mod, plugins) of the *plugins* value, e.g.:
+    ``"CraftBukkit on Bukkit 1.8: WorldEdit 6.1; Essentials 2.0"``.
+    """
+    if not value:
+        return ("", list())
+    server_mod, sep, plugins = value.partition(":")
+    plugins = [plugin.strip() for plugin in plugins.split(";")] if sep else []
+    return (server_mod.strip(), [plugin for plugin in plugins if plugin])
+
+
+def _parse_stat(data, latency):
+    """
+    Returns the :class:`QueryResult` of the full stat payload *data*.
+    """
+    if not data.startswith(_STAT_PADDING):
+        raise QueryError("invalid full stat response")
+    data = data[len(_STAT_PADDING):]
+
+    values, data = _split_strings(data)
+    if len(values) % 2:
+        raise QueryError("invalid key value section")
+    stat = dict(zip(values[::2], values[1::2]))
+
+    players = list()
+    if data.startswith(_PLAYER_PADDING):
+        players, data = _split_strings(data[len(_PLAYER_PADDING):])
+
+    def integer(key):
+        try:
+            return int(stat.get(key))
+        except (TypeError, ValueError):
+            return None
+
+    server_mod, plugins = _parse_plugins(stat.get("plugins"))
+    return QueryResult(
+        hostname = stat.get("hostname"),
+        game_type = stat.get("gametype"),
+        game_id = stat.get("game_id"),
+        version = stat.get("version"),
+        server_mod = server_mod,
+        plugins = plugins,
+        map = stat.get("map"),
+        online = integer("numplayers"),
+        max = integer("maxplayers"),
+        host_ip = stat.get("hostip"),
+        host_port = integer("hostport"),
+        players = players,
+        latency = latency
+        )
+
+
+async def _request(transport, protocol, adr, session_id, packet_type,
+                   payload, timeout, attempts):
+    """
+    Sends the request to *adr* and returns the payload of the response.
+    The request is repeated, if no response is received.
+    """
+    loop = asyncio.get_event_loop()
+    packet = _MAGIC + struct.pack(">Bi", packet_type, session_id) + payload
+    for attempt in range(attempts):
+        future = loop.create_future()
+        future.packet_type = packet_type
+        protocol.pending[session_id] = future
+        try:
+            transport.sendto(packet, adr)
+            return await asyncio.wait_for(future, timeout/attempts)
+        except asyncio.TimeoutError:
+            continue
+        finally:
+            protocol.pending.pop(session_id, None)
+    raise asyncio.TimeoutError()
+
+
+async def _query(transport, protocol, adr, session_id, timeout, attempts):
+    """
+    Requests the challenge token and the full stat of the server at the
+    udp address *adr*.
+    """
+    adr = (adr[0] or "localhost", adr[1])
+
+    data = await _request(
+        transport, protocol, adr, session_id, TYPE_HANDSHAKE, b"",
+        timeout, attempts
+        )
+    try:
+        token = int(data.rstrip(b"\x00"))
+    except ValueError:
+        raise QueryError("invalid challenge token")
+
+    start = time.monotonic()
+    data = await _request(
+        transport, protocol, adr, session_id, TYPE_STAT,
+        struct.pack(">i", token) + b"\x00"*4, timeout, attempts
+        )
+    return _parse_stat(data, time.monotonic() - start)
+
+
+async def _query_all(addresses, timeout, attempts):
+    """
+    Queries all *addresses* from a single udp socket.
+    """
+    loop = asyncio.get_event_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _QueryProtocol, local_addr=("0.0.0.0", 0)
+        )
+    try:
+        # The server ignores the high bits of each byte in the session id.
+        session_ids = random.sample(range(0x10000), len(addresses))
+        session_ids = [(sid & 0x0f0f) | ((sid & 0xf0f0) << 12) \
+                       for sid in session_ids]
+
+        coros = [asyncio.wait_for(
+                     _query(transport, protocol, adr, sid, timeout, attempts),
+                     timeout
+                     ) for adr, sid in zip(addresses, session_ids)]
+        return await asyncio.gather(*coros, return_exceptions=True)
+    finally:
+        transport.close()
+
+
+def query_servers(addresses, timeout=QUERY_TIMEOUT, attempts=QUERY_ATTEMPTS,
+                  ttl=CACHE_TTL):
+    """
+    Queries the servers at the udp *addresses* at the same time and returns
+    the list of their :class:`QueryResult`. If a server could not be
+    queried, the exception is returned instead: :class:`asyncio.TimeoutError`,
+    if the server did not answer within *timeout* seconds,
+    :class:`QueryError`, if the answer was invalid, or an :class:`OSError`.
+
+    Results, which are younger than *ttl* seconds, are taken from the cache.
+    """
+    addresses = [tuple(adr) for adr in addresses]
+    now = time.monotonic()
+
+    with _cache_lock:
+        results = dict()
+        for adr in addresses:
+            cached = _cache.get(adr)
+            if cached is not None and now - cached[0] < ttl:
+                results[adr] = cached[1]
+
+        missing = list(collections.OrderedDict.fromkeys(
+            adr for adr in addresses if not adr in results
+            ))
+        if missing:
+            loop = asyncio.new_event_loop()
+            try:
+                fresh = loop.run_until_complete(
+                    _query_all(missing, timeout, attempts)
+                    )
+            except OSError as err:
+                fresh = [err]*len(missing)
+            finally:
+                loop.close()
+
+            now = time.monotonic()
+            for adr, result in zip(missing, fresh):
+                results[adr] = result
+                _cache[adr] = (now, result)
+    return [results[adr] for adr in addresses]
+
+
+def query(adr, timeout=QUERY_TIMEOUT, attempts=QUERY_ATTEMPTS, ttl=CACHE_TTL):
+    """
+    Queries the server at the udp address *adr* and returns its
+    :class:`QueryResult`.
+
+    :raises asyncio.TimeoutError:
+        if the server did not answer within *timeout* seconds.
+    :raises QueryError:
+        if the server sent an invalid answer.
+    """
+    result = query_servers([adr], timeout, attempts, ttl)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+# Classes
+# ------------------------------------------------
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    """
+    Dispatches the responses received on the shared udp socket to the
+    waiting requests. The requests are identified by their session id.
+    """
+
+    def __init__(self):
+        """
+        """
+        # Maps the session id to the future of the pending request.
+        self.pending = dict()
+        return None
+
+    def datagram_received(self, data, addr):
+        """
+        """
+        if len(data) < 5:
+            return None
+        packet_type = data[0]
+        session_id, = struct.unpack_from(">i", data, 1)
+
+        future = self.pending.get(session_id)
+        if future is not None and not future.done() \
+           and future.packet_type == packet_type:
+            future.set_result(data[5:])
+        return None
+
+    def error_received(self, exc):
+        # E.g. *ICMP port unreachable*. We can not know which request
+        # failed, so the request times out.
+        return None
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+
+# The MIT License (MIT)
+#
+# Copyright (c) 2014-2015 Benedikt Schmitt <benedikt@benediktschmitt.de>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+"""
+A client for the RCON protocol, which is supported by the minecraft server
+since 1.9, if *enable-rcon* is set in the :file:`server.properties`.
+
+Unlike commands sent to the screen session, RCON commands return the
+response of the server, so the log must not be parsed.
+
+.. code-block:: python
+
+    >>> with RconClient("localhost", 25575, "secret") as rcon:
+    ...     rcon.command("list")
+    'There are 0/20 players online:'
+"""
+
+
+# Modules
+# ------------------------------------------------
+
+# std
+import itertools
+import logging
+import socket
+import struct
+import threading
+
+
+# Data
+# ------------------------------------------------
+
+__all__ = [
+    "RconError",
+    "RconConnectionError",
+    "RconAuthError",
+    "RconCommandTooLongError",
+    "RconClient",
+    "RconPool"
+    ]
+
+log = logging.getLogger(__file__)
+
+# The default port of the RCON interface.
+DEFAULT_PORT = 25575
+
+# The packet types.
+SERVERDATA_RESPONSE_VALUE = 0
+SERVERDATA_EXECCOMMAND = 2
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_AUTH = 3
+
+# The minecraft server closes the connection, if a packet is larger than
+# this (in bytes, including the header).
+MAX_PACKET_SIZE = 1460
+
+# The length prefix and the header (request id, packet type) of a packet.
+_LENGTH = struct.Struct("<i")
+_HEADER = struct.Struct("<ii")
+
+
+# Exceptions
+# ------------------------------------------------
+
+class RconError(Exception):
+    """
+    Raised, if the communication with the RCON server failed.
+    """
+    pass
+
+
+class RconConnectionError(RconError):
+    """
+    Raised, if the connection could not be established or the command could
+    not be written. The server did not receive the command, so it is safe
+    to send it again.
+    """
+    pass
+
+
+class RconAuthError(RconConnectionError):
+    """
+    Raised, if the RCON server rejected the password.
+    """
+    pass
+
+
+class RconCommandTooLongError(RconConnectionError):
+    """
+    Raised, if a command does not fit into a single packet. The command
+    has not been sent.
+    """
+    pass
+
+
+# Classes
+# ------------------------------------------------
+
+class RconClient(object):
+    """
+    A connection to the RCON interface at (*host*, *port*).
+
+    The client is thread safe and connects lazily, so that it can be kept
+    open and used for many commands. If the connection breaks, the next
+    command reconnects.
+    """
+
+    def __init__(self, host, port, password, timeout=5):
+        """
+        """
+        self._host = host
+        self._port = port
+        self._password = password
+        self._timeout = timeout
+
+        self._socket = None
+        self._buffer = bytearray()
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        return None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return None
+
+    def address(self):
+        """
+        Returns the address (host, port) of the RCON server.
+        """
+        return (self._host, self._port)
+
+    def is_connected(self):
+        """
+        Returns ``True``, if the client is connected and authenticated.
+        """
+        return self._socket is not None
+
+    def connect(self):
+        """
+        Connects to the server and authenticates the client. Nothing happens,
+        if the client is already connected.
+
+        :raises RconAuthError:
+            if the password is wrong.
+        :raises RconError:
+            if the server is not reachable.
+        """
+        with self._lock:
+            if self._socket is not None:
+                return None
+
+            try:
+                self._socket = socket.create_connection(
+                    (self._host, self._port), self._timeout
+                    )
+            except OSError as err:
+                raise RconConnectionError("could not connect to {}:{} ({})"\
+                                          .format(self._host, self._port, err))
+            self._buffer = bytearray()
+
+            try:
+                request_id = self._send(SERVERDATA_AUTH, self._password)
+
+                # Some servers send an empty response value before the
+                # auth response.
+                while True:
+                    response_id, response_type, payload = self._receive()
+                    if response_type == SERVERDATA_AUTH_RESPONSE:
+                        break
+                if response_id == -1:
+                    raise RconAuthError("the RCON password has been rejected")
+                elif response_id != request_id:
+                    raise RconConnectionError("unexpected auth response")
+            except RconConnectionError:
+                self.close()
+                raise
+            except RconError as err:
+                self.close()
+                raise RconConnectionError(str(err))
+        return None
+
+    def _is_stale(self):
+        """
+        Returns ``True``, if the server closed the connection in the
+        meantime (e.g. it has been restarted).
+        """
+        # With a timeout, the socket would wait for data.
+        self._socket.settimeout(0)
+        try:
+            data = self._socket.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+        finally:
+            self._socket.settimeout(self._timeout)
+        return not data
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        with self._lock:
+            if self._socket is not None:
+                try:
+                    self._socket.close()
+                except OSError:
+                    pass
+                self._socket = None
+        return None
+
+    def _send(self, packet_type, payload):
+        """
+        Sends a packet and returns its request id.
+        """
+        request_id = next(self._ids) & 0x7fffffff
+        payload = payload.encode("utf-8")
+        packet = _HEADER.pack(request_id, packet_type) + payload + b"\0\0"
+        # Nothing has been sent, so the command can be sent another way.
+        if len(packet) + _LENGTH.size > MAX_PACKET_SIZE:
+            raise RconCommandTooLongError("the command is too long")
+
+        # If the packet could not be written completely, the server did not
+        # receive it.
+        try:
+            self._socket.sendall(_LENGTH.pack(len(packet)) + packet)
+        except OSError as err:
+            self.close()
+            raise RconConnectionError("the connection has been lost ({})"\
+                                      .format(err))
+        return request_id
+
+    def _read(self, size):
+        """
+        Returns the next *size* bytes received from the server.
+        """
+        while len(self._buffer) < size:
+            try:
+                data = self._socket.recv(4096)
+            except OSError as err:
+                self.close()
+                raise RconError("the connection has been lost ({})"\
+                                .format(err))
+            if not data:
+                self.close()
+                raise RconError("the server closed the connection")
+            self._buffer.extend(data)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _receive(self):
+        """
+        Receives the next packet and returns the tuple
+        (request_id, packet_type, payload).
+        """
+        length, = _LENGTH.unpack(self._read(_LENGTH.size))
+        if length < _HEADER.size + 2:
+            self.close()
+            raise RconError("received a malformed packet")
+
+        packet = self._read(length)
+        request_id, packet_type = _HEADER.unpack_from(packet)
+        payload = packet[_HEADER.size:-2].decode("utf-8", errors="replace")
+        return (request_id, packet_type, payload)
+
+    def command(self, cmd):
+        """
+        Runs the server command *cmd* and returns the response.
+
+        The server splits long responses into multiple packets. Since the
+        number of packets is not known, an invalid packet is sent after the
+        command. The server answers it after the last packet of the
+        response.
+
+        :raises RconConnectionError:
+            if the command could not be sent (e.g. it is too long).
+        :raises RconError:
+            if the command has been sent, but the response has been lost
+            (e.g. the server did not respond within the timeout). The
+            command may have been run, so it must not be sent again.
+        """
+        with self._lock:
+            # Reconnect, if the server closed the connection since the last
+            # command, so that the command is not written into a dead
+            # connection.
+            if self._socket is not None and self._is_stale():
+                self.close()
+            self.connect()
+
+            request_id = self._send(SERVERDATA_EXECCOMMAND, cmd)
+            try:
+                end_id = self._send(SERVERDATA_RESPONSE_VALUE, "")
+            except RconConnectionError as err:
+                raise RconError(str(err))
+
+            response = list()
+            while True:
+                response_id, packet_type, payload = self._receive()
+                if response_id == end_id:
+                    break
+                elif response_id == request_id:
+                    response.append(payload)
+            return "".join(response)
+
+
+class RconPool(object):
+    """
+    Keeps one persistent :class:`RconClient` per RCON server, so that
+    repeated commands do not pay for the connect and the authentication.
+    """
+
+    def __init__(self, timeout=5):
+        """
+        """
+        self._timeout = timeout
+
+        # Maps (host, port, password) to the client.
+        self._clients = dict()
+        self._lock = threading.Lock()
+        return None
+
+    def get(self, host, port, password):
+        """
+        Returns the client for the RCON server at (*host*, *port*). The
+        client is not connected yet, if it has just been created.
+        """
+        key = (host, port, password)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = RconClient(host, port, password, self._timeout)
+                self._clients[key] = client
+        return client
+
+    def command(self, host, port, password, cmd):
+        """
+        Runs *cmd* on the RCON server at (*host*, *port*) and returns the
+        response. If the command could not be written into a pooled
+        connection, the connection is reopened once. A command, which has
+        been sent, is never repeated.
+
+        :raises RconConnectionError:
+            if the command could not be sent.
+        :raises RconError:
+            if the response has been lost.
+        """
+        client = self.get(host, port, password)
+        was_connected = client.is_connected()
+        try:
+            return client.command(cmd)
+        except (RconAuthError, RconCommandTooLongError):
+            raise
+        except RconConnectionError:
+            # The server may have been restarted since the last command.
+            if not was_connected:
+                raise
+            log.info("reconnecting to the RCON server at {}:{} ..."\
+                     .format(host, port))
+            return client.command(cmd)
+
+    def close(self):
+        """
+        Closes all connections.
+        """
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+        return None
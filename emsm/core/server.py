@@ -389,6 +389,30 @@ class BaseServerWrapper(object):
         """
         raise NotImplementedError()
 
+    def log_lag_re(self):
+        """
+        Returns a regex, that matches every line with a warning about a
+        server overload (the server can not keep up with its ticks) or
+        ``None``, if the server does not report this.
+        """
+        return re.compile(".*Can't keep up!.*")
+
+    def log_save_complete_re(self):
+        """
+        Returns a regex, that matches the line logged by the server, after
+        the *save-all* command has been completed and the world data
+        has been written to the disk. ``None`` is returned, if the message
+        is not known.
+        """
+        return None
+
+    def has_world_data(self):
+        """
+        Returns ``False``, if the server has no world data, which must be
+        saved before a backup (e.g. a proxy).
+        """
+        return True
+
     def world_address(self, world):
         """
         **ABSTRACT**
@@ -404,6 +428,62 @@ class BaseServerWrapper(object):
         """
         raise NotImplementedError()
 
+    def _server_properties(self, world):
+        """
+        Returns the options in the world's :file:`server.properties` as
+        dictionary or ``None``, if the file can not be read.
+        """
+        conf_path = os.path.join(world.directory(), "server.properties")
+        try:
+            with open(conf_path, "r") as file:
+                lines = file.read().splitlines()
+        except (OSError, IOError) as err:
+            return None
+
+        conf = dict()
+        for line in lines:
+            if "=" in line and not line.lstrip().startswith("#"):
+                key, value = line.split("=", 1)
+                conf[key.strip()] = value.strip()
+        return conf
+
+    def world_rcon(self, world):
+        """
+        Returns the address and the password (ip, port, password) of the
+        world's RCON interface or ``None``, if RCON is not enabled.
+
+        The default implementation reads the *enable-rcon*, *rcon.port* and
+        *rcon.password* options in the world's :file:`server.properties`.
+        """
+        conf = self._server_properties(world) or dict()
+        if conf.get("enable-rcon") != "true" or not conf.get("rcon.password"):
+            return None
+
+        port = conf.get("rcon.port", "25575")
+        if not port.isdecimal():
+            return None
+        ip = conf.get("server-ip") or "localhost"
+        return (ip, int(port), conf["rcon.password"])
+
+    def world_query(self, world):
+        """
+        Returns the udp address (ip, port) of the world's query interface
+        or ``None``, if the query is not enabled.
+
+        The default implementation reads the *enable-query* and *query.port*
+        options in the world's :file:`server.properties`. Like the server,
+        the query listens on the *server-port*, if no *query.port* is set.
+        """
+        conf = self._server_properties(world) or dict()
+        if conf.get("enable-query") != "true":
+            return None
+
+        port = conf.get("query.port") or conf.get("server-port", "25565")
+        if not port.isdecimal():
+            return None
+        ip = conf.get("server-ip") or "localhost"
+        return (ip, int(port))
+
 
 # Vanilla
 # '''''''
@@ -422,6 +502,11 @@ class VanillaBase(BaseServerWrapper):
     def translate_command(self, cmd):
         return cmd
 
+    def log_save_complete_re(self):
+        # Until 1.6: "CONSOLE: Save complete."
+        # Since 1.7: "Saved the world", since 1.13: "Saved the game"
+        return re.compile(".*(Save complete\.|Saved the (world|game)).*")
+
     def install(self):
         """
         """
@@ -836,6 +921,38 @@ class BungeeCordServerWrapper(BaseServerWrapper):
     def log_error_re(self):
         return re.compile(".* \[SEVERE\] .*", re.MULTILINE)
 
+    def log_lag_re(self):
+        # The proxy does not tick, so it can not lag behind.
+        return None
+
+    def world_rcon(self, world):
+        # The proxy has no RCON interface.
+        return None
+
+    def world_query(self, world):
+        """
+        """
+        conf_path = os.path.join(world.directory(), "config.yml")
+        try:
+            with open(conf_path) as file:
+                conf = yaml.load(file)
+            listener = conf["listeners"][0]
+        except Exception as err:
+            return None
+
+        if not listener.get("query_enabled"):
+            return None
+
+        ip, port = self.world_address(world)
+        port = listener.get("query_port", port)
+        if not isinstance(port, int):
+            return None
+        return (ip or "localhost", port)
+
+    def has_world_data(self):
+        # The proxy only forwards the players to other servers.
+        return False
+
     def world_address(self, world):
         """
         """
@@ -970,6 +1087,9 @@ class Spigot(BaseServerWrapper):
         """
         return re.compile(".*/SEVERE\].*", re.MULTILINE)
 
+    def log_save_complete_re(self):
+        return re.compile(".*Saved the (world|game).*")
+
     def translate_command(self, cmd):
         return cmd
 
@@ -40,10 +40,14 @@ import random
 import socket
 import logging
 import io
+import threading
 
 # third party
 import blinker
 
+# local
+from . import rcon
+
 
 # Backward compatibility
 # ------------------------------------------------
@@ -91,7 +95,8 @@ __all__ = [
     "WorldStopFailed",
     "WorldCommandTimeout",
     "WorldWrapper",
-    "WorldManager"
+    "WorldManager",
+    "screen_ls"
     ]
 
 log = logging.getLogger(__file__)
@@ -194,6 +199,24 @@ class WorldCommandTimeout(WorldError):
         return temp
 
 
+# Functions
+# ------------------------------------------------
+
+def screen_ls():
+    """
+    Returns the output of ``screen -ls``, which lists the screen sessions
+    of the current user.
+
+    .. seealso::
+
+        * :meth:`WorldWrapper.pids`
+    """
+    # XXX: screen -ls seems to exit always with the exit code 1.
+    #   so it's convenient to use gestatusoutput.
+    status, output = subprocess.getstatusoutput("screen -ls")
+    return output
+
+
 # Classes
 # ------------------------------------------------
 
@@ -280,6 +303,23 @@ class WorldWrapper(object):
         if not self._conf["server"] in self._app.server().get_names():
             raise ValueError("{} - conf:server does not exist"\
                              .format(self._name))
+
+        # start order
+        try:
+            int(self._conf.get("start_order", "0"))
+        except ValueError:
+            raise TypeError("{} - conf:start_order is not an integer"\
+                            .format(self._name))
+
+        # dependencies
+        worlds = self._app.conf().worlds().sections()
+        for name in self.depends_on():
+            if name == self._name:
+                raise ValueError("{} - conf:depends_on contains the world "\
+                                 "itself".format(self._name))
+            if not name in worlds:
+                raise ValueError("{} - conf:depends_on: the world '{}' does "\
+                                 "not exist".format(self._name, name))
         return None
 
     def worldpath_to_ospath(self, rel_path):
@@ -361,6 +401,27 @@ class WorldWrapper(object):
         """
         return WorldWrapper._SCREEN_PREFIX + self._name
 
+    def depends_on(self):
+        """
+        Returns the names of the worlds, which must be running, before this
+        world is started (*depends_on* option in the :file:`worlds.conf`).
+        A BungeeCord proxy for example depends on its backend servers.
+        """
+        names = self._conf.get("depends_on", "").replace(",", " ").split()
+        return sorted(set(names))
+
+    def start_order(self):
+        """
+        Returns the *start_order* of the world. Worlds with a lower start
+        order are started before worlds with a higher start order and
+        stopped after them.
+
+        .. seealso::
+
+            * :meth:`WorldManager.dependency_levels`
+        """
+        return int(self._conf.get("start_order", "0"))
+
     def directory(self):
         """
         Returns the directory that contains all world data generated by the
@@ -379,6 +440,65 @@ class WorldWrapper(object):
         """
         return self._server.world_address(self)
 
+    def log_path(self):
+        """
+        Returns the absolute path of the world's server log file.
+
+        .. seealso::
+
+            * :meth:`emsm.core.server.BaseServerWrapper.log_path`
+        """
+        return os.path.abspath(
+            os.path.join(self._directory, self._server.log_path())
+            )
+
+    def rcon_address(self):
+        """
+        Returns the address and the password (ip, port, password) of the
+        world's RCON interface or ``None``, if RCON is not enabled.
+
+        .. seealso::
+
+            * :meth:`emsm.core.server.BaseServerWrapper.world_rcon`
+        """
+        return self._server.world_rcon(self)
+
+    def query_address(self):
+        """
+        Returns the udp address (ip, port) of the world's query interface or
+        ``None``, if the query is not enabled.
+
+        .. seealso::
+
+            * :meth:`emsm.core.server.BaseServerWrapper.world_query`
+            * :func:`emsm.core.query.query_servers`
+        """
+        return self._server.world_query(self)
+
+    def rcon_command(self, server_cmd):
+        """
+        Runs the command via RCON and returns the response of the server.
+        The connection is kept open in the
+        :meth:`~WorldManager.rcon_pool`, so that the next command is sent
+        without a new handshake.
+
+        :raises emsm.core.rcon.RconConnectionError:
+            if RCON is not enabled or the command could not be sent.
+        :raises emsm.core.rcon.RconError:
+            if the command has been sent, but the response has been lost.
+        """
+        address = self.rcon_address()
+        if address is None:
+            raise rcon.RconConnectionError("RCON is not enabled")
+
+        # Translate the server command for *cross-server* support.
+        server_cmd = self._server.translate_command(server_cmd)
+
+        host, port, password = address
+        return self._app.worlds().rcon_pool().command(
+            host, port, password, server_cmd
+            )
+
     def latest_log(self):
         """
         Returns the log of the world since the last start. If the
@@ -387,9 +507,7 @@ class WorldWrapper(object):
         # Matches all lines in the log, that signalize the start of
         # a server.
         re_start_line = self._server.log_start_re()
-        log_path = os.path.abspath(
-            os.path.join(self._directory, self._server.log_path())
-            )
+        log_path = self.log_path()
 
         try:
             last_log = io.StringIO()
@@ -403,15 +521,16 @@ class WorldWrapper(object):
             last_log = str()
         return last_log
 
-    def pids(self):
+    def pids(self, sessions=None):
         """
         Returns a list with the pids of the screen sessions with the name
         :meth:`screen_name`.
+
+        *sessions* is the output of :func:`screen_ls`. If the pids of many
+        worlds are needed, screen is only run once this way.
         """
         # Get sessions
-        # XXX: screen -ls seems to exit always with the exit code 1.
-        #   so it's convenient to use gestatusoutput.
-        status, output = subprocess.getstatusoutput("screen -ls")
+        output = screen_ls() if sessions is None else sessions
 
         # Example output (without the '>' char):
         #
@@ -444,7 +563,9 @@ class WorldWrapper(object):
     def send_command(self, server_cmd):
         """
         Sends the given command to all screen sessions with the world's screen
-        name.
+        name. If RCON is enabled, the command is sent via RCON instead and
+        the screen session is only used, if the command could not be sent
+        via RCON.
 
         :raises WorldIsOfflineError:
             if the world is offline.
@@ -459,6 +580,27 @@ class WorldWrapper(object):
         if not pids:
             raise WorldIsOfflineError(self)
 
+        if self.rcon_address() is not None:
+            try:
+                self.rcon_command(server_cmd)
+            except rcon.RconConnectionError as err:
+                log.warning("{}: could not send the command via RCON ({}), "
+                            "using screen.".format(self._name, err))
+            except rcon.RconError as err:
+                # The command has been sent, so it must not be repeated.
+                log.warning("{}: no RCON response to '{}' ({})."\
+                            .format(self._name, server_cmd, err))
+                return None
+            else:
+                return None
+
+        self._send_screen_command(server_cmd, pids)
+        return None
+
+    def _send_screen_command(self, server_cmd, pids):
+        """
+        Sends the command to the screen sessions with the *pids*.
+        """
         # Translate the server command for *cross-server* support.
         server_cmd = self._server.translate_command(server_cmd)
 
@@ -483,25 +625,44 @@ class WorldWrapper(object):
         change. If no change could be detected after *timeout* seconds,
         an error will be raised.
 
+        If RCON is enabled, the response of the server is returned instead.
+
         :raises WorldIsOfflineError:
             if the world is offline.
         :raises WorldCommandTimeout:
-            if the world did not react within *timeout* seconds.
+            if the world did not react within *timeout* seconds or the RCON
+            response has been lost.
         """
-        log_path = os.path.abspath(
-            os.path.join(self._directory, self._server.log_path())
-            )
+        pids = self.pids()
+
+        # Break if the world is offline.
+        if not pids:
+            raise WorldIsOfflineError(self)
+
+        if self.rcon_address() is not None:
+            try:
+                return self.rcon_command(server_cmd)
+            except rcon.RconConnectionError as err:
+                log.warning("{}: could not send the command via RCON ({}), "
+                            "using screen.".format(self._name, err))
+            except rcon.RconError as err:
+                # The command has been sent, so it must not be repeated.
+                log.warning("{}: no RCON response to '{}' ({})."\
+                            .format(self._name, server_cmd, err))
+                raise WorldCommandTimeout(self)
+
+        log_path = self.log_path()
 
         # Save the current size of the logfile to detect changes.
         try:
-            with open(log_path) as log:
-                log.seek(0, 2)
-                offset = log.tell()
+            with open(log_path) as file:
+                file.seek(0, 2)
+                offset = file.tell()
         except (FileNotFoundError, IOError):
             offset = 0
 
         # Send the command.
-        self.send_command(server_cmd)
+        self._send_screen_command(server_cmd, pids)
 
         # Parse the logfile for a change.
         start_time = time.time()
@@ -510,9 +671,9 @@ class WorldWrapper(object):
             time.sleep(poll_intervall)
 
             try:
-                with open(log_path) as log:
-                    log.seek(offset, 0)
-                    output = log.read()
+                with open(log_path) as file:
+                    file.seek(offset, 0)
+                    output = file.read()
             except (FileNotFoundError, IOError):
                 break
 
@@ -520,6 +681,86 @@ class WorldWrapper(object):
             raise WorldCommandTimeout(self)
         return output
 
+    def save(self, timeout=30, poll_intervall=0.2):
+        """
+        Sends the *save-all* command to the world and blocks until the
+        world has been saved (save barrier). Returns the number of seconds
+        the save took.
+
+        If RCON is enabled, the response to the command is the barrier.
+        Otherwise, the log is polled for the save-complete message (see
+        :meth:`emsm.core.server.BaseServerWrapper.log_save_complete_re`) or,
+        if the message is not known, for any output of the server.
+
+        If the server has no world data (see
+        :meth:`emsm.core.server.BaseServerWrapper.has_world_data`), e.g. a
+        proxy, nothing is sent and ``0`` is returned.
+
+        :raises WorldIsOfflineError:
+            if the world is offline.
+        :raises WorldCommandTimeout:
+            if the world has not been saved within *timeout* seconds.
+        """
+        if not self._server.has_world_data():
+            return 0
+
+        pids = self.pids()
+
+        # Break if the world is offline.
+        if not pids:
+            raise WorldIsOfflineError(self)
+
+        start_time = time.time()
+
+        # The server answers the RCON command after the save has been done.
+        if self.rcon_address() is not None:
+            try:
+                self.rcon_command("save-all")
+            except rcon.RconConnectionError as err:
+                log.warning("{}: could not send the command via RCON ({}), "
+                            "using screen.".format(self._name, err))
+            except rcon.RconError as err:
+                # The command has been sent, so it must not be repeated.
+                log.warning("{}: no RCON response to 'save-all' ({})."\
+                            .format(self._name, err))
+                raise WorldCommandTimeout(self)
+            else:
+                return time.time() - start_time
+
+        re_save_complete = self._server.log_save_complete_re()
+        if re_save_complete is None:
+            self.send_command_get_output("save-all", timeout, poll_intervall)
+            return time.time() - start_time
+
+        log_path = self.log_path()
+
+        # Save the current size of the logfile to detect changes.
+        try:
+            offset = os.path.getsize(log_path)
+        except (FileNotFoundError, IOError):
+            offset = 0
+
+        self._send_screen_command("save-all", pids)
+
+        # Read the new lines until the save-complete line appears. Lines,
+        # which have not been completed yet, are read again later.
+        while time.time() - start_time < timeout:
+            time.sleep(poll_intervall)
+
+            try:
+                with open(log_path, "rb") as file:
+                    file.seek(offset, 0)
+                    for line in file:
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        line = line.decode(errors="replace")
+                        if re.match(re_save_complete, line):
+                            return time.time() - start_time
+            except (FileNotFoundError, IOError):
+                break
+        raise WorldCommandTimeout(self)
+
     def open_console(self):
         """
         Opens **all** screen sessions whichs pid is in :meth:`pids`.
@@ -833,9 +1074,145 @@ class WorldManager(object):
         # world.name() => world
         self._worlds = dict()
 
+        # The persistent RCON connections of the worlds.
+        self._rcon_pool = rcon.RconPool()
+
         WorldWrapper.world_uninstalled.connect(self._remove)
         return None
 
+    def rcon_pool(self):
+        """
+        Returns the :class:`~emsm.core.rcon.RconPool`, which keeps the RCON
+        connections of the worlds open.
+        """
+        return self._rcon_pool
+
+    def stop_worlds(self, worlds, force_stop=False, delay=None, deadline=None):
+        """
+        Stops all *worlds* at the same time and returns the list of the
+        worlds, which could not be stopped.
+
+        Unlike calling :meth:`WorldWrapper.stop` for each world, the
+        worlds share the waiting times: The *stop_message* of each world is
+        sent at once, then *delay* seconds (default: the largest
+        *stop_delay*) are waited, before *save-all* and *stop* are sent to
+        all worlds. Then, the stop of all worlds is awaited until the
+        *deadline* (default: *delay* + the largest *stop_timeout*) is
+        reached. If *force_stop* is true, the remaining worlds are killed.
+
+        The *deadline* is the maximum duration of the whole call in seconds,
+        so *delay* is shortened, if necessairy. The commands are sent to
+        each world in its own thread, so a hung world (e.g. an RCON command
+        waiting for the timeout) does not delay the others or the deadline.
+
+        **Signals:**
+
+            * :attr:`WorldWrapper.world_about_to_stop`
+            * :attr:`WorldWrapper.world_stopped`
+            * :attr:`WorldWrapper.world_stop_failed`
+        """
+        start_time = time.time()
+
+        sessions = screen_ls()
+        worlds = [world for world in worlds if world.pids(sessions)]
+        if not worlds:
+            return list()
+
+        # Get the default parameter values from the configuration.
+        if delay is None:
+            delay = max(int(world.conf()["stop_delay"]) for world in worlds)
+        if deadline is None:
+            deadline = delay + max(
+                int(world.conf()["stop_timeout"]) for world in worlds
+                )
+
+        # Keep some time to kill the worlds, which did not stop in time.
+        end_time = start_time + deadline
+        stop_end_time = end_time - (min(2, deadline/10) if force_stop else 0)
+
+        def send(world, server_cmds):
+            for server_cmd in server_cmds:
+                try:
+                    world.send_command(server_cmd)
+                except WorldIsOfflineError:
+                    break
+            return None
+
+        def broadcast(commands, until):
+            """
+            Sends the commands to the worlds in parallel and waits, until
+            they have been sent or the time *until* is reached.
+            """
+            threads = list()
+            for world, server_cmds in commands:
+                thread = threading.Thread(
+                    target=send, args=(world, server_cmds), daemon=True
+                    )
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join(max(0, until - time.time()))
+            return None
+
+        # Wait the shared delay, so that the message can be read, but leave
+        # at least half of the remaining time for the stop.
+        delay_end_time = time.time() \
+                         + max(0, min(delay, (stop_end_time - time.time())/2))
+
+        # Broadcast the stop messages.
+        commands = list()
+        for world in worlds:
+            WorldWrapper.world_about_to_stop.send(world)
+            commands.append((world, [
+                "say {}".format(line.strip()) \
+                for line in world.conf()["stop_message"].split("\n")
+                ]))
+        broadcast(commands, delay_end_time)
+
+        if delay_end_time > time.time():
+            time.sleep(delay_end_time - time.time())
+
+        # Save and stop all worlds.
+        broadcast(
+            [(world, ["save-all", "stop"]) for world in worlds],
+            stop_end_time
+            )
+
+        def wait(online, until, poll_intervall):
+            """
+            Removes the worlds, which stopped, from *online*, until all
+            worlds are offline or the time *until* is reached.
+            """
+            while True:
+                sessions = screen_ls()
+                for world in list(online):
+                    if not world.pids(sessions):
+                        online.remove(world)
+                        WorldWrapper.world_stopped.send(world)
+                if not online or time.time() >= until:
+                    return sessions
+                time.sleep(poll_intervall)
+
+        # Wait until all worlds are offline.
+        online = list(worlds)
+        sessions = wait(online, stop_end_time, 0.25)
+
+        # Force the stop if necessairy.
+        if force_stop and online:
+            for world in online:
+                log.warning("{}: killing the processes, since the world did "
+                            "not stop in time.".format(world.name()))
+                for pid in world.pids(sessions):
+                    try:
+                        os.kill(pid, signal.SIGTERM)
+                    except OSError:
+                        pass
+            wait(online, end_time, 0.1)
+
+        for world in online:
+            WorldWrapper.world_stop_failed.send(world)
+        return online
+
     def load_worlds(self):
         """
         Loads all worlds declared in the :file:`worlds.conf` configuration
@@ -853,8 +1230,66 @@ class WorldManager(object):
             # Make sure the folder exists.
             if not world.is_installed():
                 world.install()
+
+        self._check_dependencies()
         return None
 
+    def _check_dependencies(self):
+        """
+        Checks, that the *depends_on* options of the worlds do not form a
+        cycle.
+
+        :raises ValueError:
+            if a world depends (indirectly) on itself.
+        """
+        # Depth first search. *path* contains the worlds on the current path
+        # and *done* the worlds, whose dependencies have been checked.
+        done = set()
+        def visit(world, path):
+            if world.name() in done:
+                return None
+            if world.name() in path:
+                cycle = path[path.index(world.name()):] + [world.name()]
+                raise ValueError("conf:depends_on contains a cycle: {}"\
+                                 .format(" -> ".join(cycle)))
+            path.append(world.name())
+            for name in world.depends_on():
+                visit(self._worlds[name], path)
+            path.pop()
+            done.add(world.name())
+            return None
+
+        for name in sorted(self._worlds):
+            visit(self._worlds[name], list())
+        return None
+
+    def dependency_levels(self, worlds):
+        """
+        Groups the *worlds* by their dependencies and returns a list of
+        lists. Each world comes after the worlds it depends on and after
+        the worlds with a lower :meth:`~WorldWrapper.start_order`, so the
+        worlds of a level can be started at the same time, after the
+        previous levels are running. They are stopped in the reverse order.
+
+        The level of a world is the largest value of its *start_order* and
+        the level of its dependencies plus one. Dependencies, which are not
+        in *worlds*, are ignored, but still count for the level.
+        """
+        levels = dict()
+        def level(world):
+            if not world.name() in levels:
+                levels[world.name()] = max(
+                    [world.start_order()] \
+                    + [level(self._worlds[name]) + 1 \
+                       for name in world.depends_on()]
+                    )
+            return levels[world.name()]
+
+        groups = collections.defaultdict(list)
+        for world in sorted(worlds, key = lambda w: w.name()):
+            groups[level(world)].append(world)
+        return [groups[key] for key in sorted(groups)]
+
     # container
     # --------------------------------------------
 
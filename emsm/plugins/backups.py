@@ -45,12 +45,38 @@ Configuration
     restore_delay = 5
     max_storage_size = 30
     backup_logs = yes
+    verify_workers = 0
+    incremental = no
+    watch = no
+    chunk_delta = no
+    full_backup_interval = 7
+    keep_hourly = 0
+    keep_daily = 0
+    keep_weekly = 0
+    keep_monthly = 0
+    io_class = none
+    io_priority = 4
+    niceness = 0
+    bandwidth_limit = 0
+    lag_backoff = 0
+    max_online_snapshots = 2
+    storage = local
+    storage_path =
+    s3_endpoint =
+    s3_region = us-east-1
+    s3_bucket =
+    s3_prefix = emsm/
+    s3_access_key =
+    s3_secret_key =
+    s3_part_size = 8
+    dedup = no
+    dedup_min_size = 64
 
 **archive_format**
 
     Is the name of the archive format used to create the backups. This string has
-    to be listed in *shutil.get_archive_formats()*. Usually, there should be at
-    least *zip* or *tar* available.
+    to be listed in *shutil.get_archive_formats()*. The backups plugin supports
+    *zip*, *tar*, *gztar*, *bztar* and *xztar*.
 
 **restore_message**
 
@@ -64,12 +90,169 @@ Configuration
 **max_storage_size**
 
     Maximum number of backups in the storage folder, before older backups
-    will be removed.
+    will be removed. If one of the *keep_* options is set, this is the number
+    of the newest backups, which are kept in addition to the retention tiers.
 
 **backup_logs**
 
     If ``yes``, the log files are included into the backup, otherwise not.
 
+**verify_workers**
+
+    The number of processes used to verify the backups. If ``0``, one process
+    per CPU is used.
+
+**incremental**
+
+    If ``yes``, a backup only contains the files, whose size or modification
+    time changed since the previous backup (like GNU tar's
+    *--listed-incremental*). The archives remain plain tar or zip archives.
+    The manifest of each backup records the size and mtime of all world
+    files and the files, which have been deleted since the previous
+    backup. A restore unpacks the last full backup and replays all
+    incremental backups up to the selected one in order.
+
+**watch**
+
+    If ``yes``, a watcher process is started for each world, when the world
+    is started (or with *--watch*). The watcher uses *inotify(7)* to record
+    the paths, which changed since the last backup, in the journal
+    ``plugins_data/backups/<world>/dirty.journal``. An *incremental* backup
+    then only checks these files, instead of walking through the whole world.
+
+    The whole world is scanned, if the watcher was not running all the
+    time since the previous backup, events have been lost, or more than
+    100000 paths changed. The watcher runs independently of the EMSM and
+    stops, when the world directory is removed.
+
+**chunk_delta**
+
+    If ``yes``, the region files (*.mca*, *.mcr*) are only saved as *chunk
+    deltas*: The backup contains only the chunks, whose timestamp changed
+    since the previous backup. All other files are still saved completely.
+    A restore rebuilds the complete region files from the last full backup
+    and all deltas.
+
+**full_backup_interval**
+
+    The maximum number of incremental or delta backups between two full
+    backups, if *incremental* or *chunk_delta* is enabled. This limits the
+    number of archives, which are needed to restore a backup. If ``0``,
+    only the first backup is a full backup.
+
+**keep_hourly**, **keep_daily**, **keep_weekly**, **keep_monthly**
+
+    Grandfather-father-son retention: The newest backup of each of the last
+    *n* hours, days, (ISO) weeks and months is kept. A backup is removed,
+    if no tier and not *max_storage_size* keeps it. ``0`` disables the tier.
+
+    .. code-block:: ini
+
+        # Hourly backups for a day, daily backups for a week, ...
+        [backups]
+        max_storage_size = 0
+        keep_hourly = 24
+        keep_daily = 7
+        keep_weekly = 4
+        keep_monthly = 12
+
+**io_class**
+
+    The I/O scheduling class (*ioprio_set(2)*) of the EMSM, while it creates
+    or verifies backups: *none* (don't change it), *idle*, *best-effort* or
+    *realtime*. With *idle*, the backup only uses the disk, when no other
+    process (e.g. the worlds) needs it.
+
+**io_priority**
+
+    The priority within the *best-effort* and *realtime* I/O class, from
+    ``0`` (highest) to ``7`` (lowest).
+
+**niceness**
+
+    The niceness (CPU priority) of the EMSM, while it creates or verifies
+    backups. ``0`` keeps the current niceness, ``19`` is the lowest priority.
+
+**bandwidth_limit**
+
+    The maximum number of KiB per second, which are read from the world
+    directory while creating a backup. ``0`` means no limit. The copy of an
+    online world is never limited, since the auto-save is disabled during
+    the copy.
+
+**lag_backoff**
+
+    If a world on this host reports *Can't keep up!* in its log while a
+    backup is created, the backup is paused for *lag_backoff* seconds.
+    ``0`` disables the back-off (default). Like the *bandwidth_limit*, the
+    back-off is not applied, while an online world is copied.
+
+**max_online_snapshots**
+
+    The maximum number of online worlds, which are copied at the same time
+    (with auto-save disabled), when the backups are created with *--jobs*.
+    The compression of the archives is not limited by this option.
+
+**storage**
+
+    Where the backup archives and their manifests are stored:
+
+    *local*
+        In the plugin's data directory or, if set, in *storage_path*.
+    *mount*
+        In *storage_path*, which must be on a mounted file system (e.g. a
+        NFS share or an external disk). A backup is refused, if the file
+        system is not mounted, so that the backups don't fill up the local
+        disk. The archives are flushed to the disk, before they are committed.
+    *s3*
+        In an S3 compatible object storage (AWS, MinIO, Ceph, ...). The
+        archives are uploaded with multipart uploads, while they are created,
+        so they never touch the local disk.
+
+    The archives are always written to a temporary name (or an unfinished
+    multipart upload) first and only appear under their final name, when
+    they are complete. The backup catalog is always kept in the plugin's
+    data directory.
+
+**storage_path**
+
+    The directory for the *local* and *mount* storage. The backups of each
+    world are stored in a sub directory with the name of the world.
+
+**s3_endpoint**, **s3_region**, **s3_bucket**, **s3_prefix**
+
+    The URL of the S3 service (e.g. ``https://s3.eu-central-1.amazonaws.com``),
+    the region used to sign the requests, the bucket and the key prefix. The
+    backups of a world are stored under ``<s3_prefix><world>/``.
+
+**s3_access_key**, **s3_secret_key**
+
+    The credentials for the S3 service.
+
+**s3_part_size**
+
+    The size of the parts of a multipart upload in MiB (at least 5).
+
+**dedup**
+
+    If ``yes``, the files of a backup, which are at least *dedup_min_size*
+    KiB large, are not stored in the archive, but in a *content store*,
+    which is shared by all worlds. Each file is stored only once, named after
+    its SHA-256 hash sum, no matter how many backups of how many worlds
+    contain it. So if many worlds are created from the same template map,
+    the untouched region files are only stored once.
+
+    The content store is kept in the *.content* directory (or prefix) of
+    the *storage*. Objects, which are no longer referenced by any backup of
+    any world, are removed after *--create* and *--prune*. The backups,
+    which use the content store, can still be restored after *dedup* has
+    been disabled.
+
+**dedup_min_size**
+
+    The minimum size of the files in KiB, which are stored in the content
+    store, if *dedup* is enabled. Smaller files are stored in the archive.
+
 Arguments
 ---------
 
@@ -80,15 +263,47 @@ Arguments
 
 .. option:: --list
 
-    Lists all available backups.
+    Lists all available backups and their names.
 
 .. option:: --create
 
     Creates a new backup.
 
+.. option:: --jobs N
+
+    Can be combined with *--create*. Creates the backups of up to *N* worlds
+    at once. The output of each world is printed, when its backup is done,
+    followed by a summary table with the duration and size of each backup.
+
+    .. code-block:: bash
+
+        $ minecraft -W backups --create --jobs 8
+
 .. option:: --restore PATH
 
-    Restores the world with the backup from the given BACKUP_PATH.
+    Restores the world with the backup from the given BACKUP_PATH. If there
+    is no such file, PATH is the name of a backup in the configured
+    *storage*, as shown by *--list*, or a unique prefix of the name.
+
+    The backup is extracted next to the world directory, before the world
+    is stopped. The world directory is then replaced with two *renames*,
+    so that the world is only offline for the length of a restart.
+
+.. option:: --restore-as NEWWORLD PATH
+
+    Restores the backup *PATH* (like in *--restore*) into the new world
+    *NEWWORLD*, e.g. to clone a production world for testing. The original
+    world is not touched. The world configuration of the backup is added to
+    the *worlds.conf* under the new name and a free *server-port* and
+    *rcon.port* are written to the *server.properties* of the new world.
+
+    If the backup uses the content store and the store is on a file system
+    with reflinks (btrfs, XFS), the files of the new world share their data
+    with the store, until the server changes them.
+
+    .. code-block:: bash
+
+        $ minecraft -w foo backups --restore-as foo_test 2014_09_02
 
 .. option:: --restore-latest
 
@@ -98,6 +313,66 @@ Arguments
 
     Opens a menu, where the user can select which backup he wants to restore.
 
+.. option:: --only GLOB
+
+    Can be combined with the restore arguments above. Only the files of the
+    world, which match the glob pattern, are restored. The pattern is relative
+    to the world directory. All other files of the world are not touched.
+    The argument can be used multiple times.
+
+    .. code-block:: bash
+
+        # Restores only a single region file.
+        $ minecraft -w foo backups --restore-latest --only region/r.0.0.mca
+
+        # Restores the nether and the player data.
+        $ minecraft -w foo backups --restore-menu --only DIM-1 --only playerdata
+
+.. option:: --diff A B
+
+    Lists the files of the world, which have been added, removed or modified
+    between the backups *A* and *B* (paths, names or name prefixes like in
+    *--restore*) and the change of their size. For modified region files,
+    the coordinates of the changed chunks are listed too. Only the manifests
+    of the backups are compared, so no archive is unpacked.
+
+    .. code-block:: bash
+
+        $ minecraft -w foo backups --diff 2014_09_01 2014_09_02
+
+.. option:: --usage
+
+    Shows the storage used by the backups of each world: The *unique* bytes
+    are only used by this world (the archives and the objects in the content
+    store, which no other world references). The *shared* bytes are objects
+    in the content store, which are also referenced by other worlds.
+
+.. option:: --rebuild-catalog
+
+    Recreates the backup catalog from the backup directory. Use this, if
+    you added or removed backups by hand.
+
+.. option:: --verify
+
+    Checks all backups against their manifests. The exit code is set to *2*,
+    if a corrupted backup has been found.
+
+.. option:: --prune
+
+    Removes all backups, which are not kept by the retention policy. This
+    is also done after each new backup.
+
+.. option:: --watch
+
+    Starts the watchers of the worlds, if they are not running yet, and
+    shows their pids (see *watch*). Use this after a reboot, if the worlds
+    are not started by the EMSM.
+
+.. option:: --dry-run
+
+    Can be combined with *--prune*. Shows for each backup, if it would be
+    kept or removed and which rules keep it, without removing anything.
+
 Cron
 ----
 
@@ -119,11 +394,42 @@ A typical backup archive has this structure:
 
     o
     |- world_conf.json        # The EMSM configuration of the world
+    |- deleted.json           # Files deleted since the parent backup
+    |                         # (incremental and delta backups only)
     |- world                  # the minecraft world
         |- server.log
         |- server.properties
         |- ...
 
+Each backup archive comes with a manifest, which is stored next to the archive
+in a file with the suffix ``.manifest.json``. The manifest contains the size
+and sha256 hash sum of the archive and of each file in the archive, so that
+``--verify`` can check a backup without unpacking it. For tar archives, the
+manifest also stores the offset of each file in the (uncompressed) tar stream.
+If the archive is not compressed (*tar*), ``--only`` uses the offsets to
+restore single files without scanning the archive. A compressed tar archive
+can not be seeked, so it is decompressed up to the last requested file. The
+members of a *zip* archive are always found in its central directory.
+
+The EMSM keeps a catalog of all backups of a world in the file
+``plugins_data/backups/<world>/catalog.json``. The catalog stores the date,
+size, format, number of files, duration and checksum of each backup, so that
+the backup list is available without scanning the backup directory.
+
+If *chunk_delta* is enabled, a region file in a delta backup is stored as
+``<region>.chunkdelta``. The file contains the location and timestamp table
+of the region file and the sectors of all chunks, which changed since the
+*parent* backup. The manifest of each backup names its parent and the state
+of all world files (size, mtime and the chunk timestamps of the region files),
+so that the next delta can be computed without reading the previous archive.
+Backups, which are needed by a newer delta backup, are not removed by
+*max_storage_size*.
+
+If *incremental* is enabled, files, whose size and mtime did not change since
+the *parent* backup, are not part of the archive at all. A file, which has
+changed, is stored completely, unless it is a region file and *chunk_delta*
+is enabled too.
+
 Changelog
 ---------
 
@@ -140,18 +446,37 @@ EMSM v3
 # std
 import hashlib
 import os
+import sys
 import time
 import shutil
 import datetime
 import tempfile
 import logging
 import json
+import tarfile
+import zipfile
+import fnmatch
+import mmap
+import struct
+import threading
+import concurrent.futures
+import copy
+import io
+import ctypes
+import platform
+import fcntl
+import signal
+import subprocess
+import uuid
+import socket
 
 # third party
 import termcolor
 
 # local
 import emsm
+import emsm.core.lib.s3
+import emsm.core.lib.inotify
 from emsm.core.base_plugin import BasePlugin
 
 
@@ -160,8 +485,10 @@ from emsm.core.base_plugin import BasePlugin
 
 try:
     FileExistsError
+    FileNotFoundError
 except NameError:
     FileExistsError = OSError
+    FileNotFoundError = OSError
 
 
 # Data
@@ -169,350 +496,3291 @@ except NameError:
 
 PLUGIN = "Backups"
 
-AVLB_ARCHIVE_FORMATS = [name for name, desc in shutil.get_archive_formats()]
+# Maps the archive formats we can write to the compression used by
+# *tarfile*. *zip* archives are handled by *zipfile*.
+_TAR_COMPRESSION = {
+    "tar": "",
+    "gztar": "gz",
+    "bztar": "bz2",
+    "xztar": "xz"
+    }
+
+# The file extensions of the archive formats.
+_ARCHIVE_EXTENSIONS = {
+    "zip": ".zip",
+    "tar": ".tar",
+    "gztar": ".tar.gz",
+    "bztar": ".tar.bz2",
+    "xztar": ".tar.xz"
+    }
+
+AVLB_ARCHIVE_FORMATS = [
+    name for name, desc in shutil.get_archive_formats() \
+    if name in _TAR_COMPRESSION or name == "zip"
+    ]
+
+# The manifest of a backup is stored next to the archive in a file with
+# this suffix.
+MANIFEST_SUFFIX = ".manifest.json"
+
+# The hash algorithm used for the manifests.
+MANIFEST_HASH = "sha256"
+
+# Size of the blocks read when hashing or copying files.
+CHUNK_SIZE = 2**20
+
+# Anvil (and McRegion) region files consist of 4 KiB sectors. The first
+# sector contains the location table and the second one the timestamp table
+# of the 32x32 chunks in the region.
+REGION_SECTOR_SIZE = 4096
+REGION_CHUNKS = 1024
+REGION_EXTENSIONS = (".mca", ".mcr")
+
+# The changed chunks of a region file are stored in a file with this
+# suffix in delta backups.
+CHUNK_DELTA_SUFFIX = ".chunkdelta"
+CHUNK_DELTA_MAGIC = b"EMSMCD01"
+
+# The tiers of the grandfather-father-son retention and the *strftime()*
+# format of their periods. The newest backup of each period is kept.
+RETENTION_TIERS = (
+    ("hourly", "%Y-%m-%d %H"),
+    ("daily", "%Y-%m-%d"),
+    ("weekly", "%G-W%V"),
+    ("monthly", "%Y-%m")
+    )
+
+# The I/O scheduling classes of *ioprio_set(2)* and the syscall numbers
+# of *ioprio_set* on the common architectures.
+IOPRIO_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_SYS_IOPRIO_SET = {
+    "x86_64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "armv7l": 314,
+    "ppc64le": 273
+    }
+
+# The names of the files, which have been deleted since the parent backup,
+# are stored in this file in the archives of incremental and delta backups.
+DELETED_FILES_NAME = "deleted.json"
+
+# Seconds between two checks of the server logs for lag warnings.
+LAG_CHECK_INTERVAL = 5
+
+# The shared content store of all worlds is kept in this directory (or
+# prefix) of the storage. The list of the objects referenced by the backups
+# of a world is stored in the object *<world>.refs.json*.
+CONTENT_DIR = ".content"
+CONTENT_REFS_SUFFIX = ".refs.json"
+
+# The paths changed since the last backup are recorded by the watcher of
+# a world in this file in the backup directory of the world. If the journal
+# grows larger than *JOURNAL_MAX_ENTRIES* paths, the next backup scans the
+# whole world.
+JOURNAL_NAME = "dirty.journal"
+JOURNAL_MAX_ENTRIES = 100000
+
+# Seconds a backup waits for the watcher to catch up with the world.
+JOURNAL_SYNC_TIMEOUT = 5
+
+# The *ioctl()* request, which clones the data of a file on a copy-on-write
+# file system (btrfs, XFS, ...) without copying it (*ioctl_ficlone(2)*).
+_FICLONE = 0x40049409
+
+# The first port assigned to a restored world.
+FIRST_SERVER_PORT = 25565
 
 log = logging.getLogger(__file__)
 
 
-# Functions
+# Exceptions
 # ------------------------------------------------
 
-def file_hash(path):
+class StorageError(Exception):
     """
-    Returns the sha512 hash sum of the file at *path*.
+    Raised if a backup storage is not available or rejected an operation.
     """
-    with open(path, "rb") as file:
-        data = file.read()
-        sum_ = hashlib.sha512(data)
-    return sum_.hexdigest()
+    pass
 
 
-# Classes
+# Functions
 # ------------------------------------------------
 
-class BackupManager(object):
+def stream_hash(file, algorithm=MANIFEST_HASH):
     """
-    Manages the backups of one world.
+    Reads the file object *file* in chunks until EOF and returns a two tuple
+    with the hex digest and the number of bytes read.
     """
+    sum_ = hashlib.new(algorithm)
+    size = 0
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+        sum_.update(chunk)
+        size += len(chunk)
+    return (sum_.hexdigest(), size)
 
-    def __init__(self, app, world, max_storage_size, backup_dir, backup_logs):
-        """
-        """
-        self._app = app
-        self._world = world
-        self._backup_dir = backup_dir
-        self._max_storage_size = max_storage_size
-        self._backup_logs = backup_logs
 
-        os.makedirs(self._backup_dir, exist_ok=True)
+def current_umask():
+    """
+    Returns the umask of the process.
+    """
+    # Since Linux 4.7, the umask can be read without changing it, which
+    # would affect files created by other threads in the meantime.
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def file_hash(path, algorithm="sha512"):
+    """
+    Returns the hash sum of the file at *path*. The file is read in chunks,
+    so that large files are never loaded completely into memory.
+    """
+    with open(path, "rb") as file:
+        digest, size = stream_hash(file, algorithm)
+    return digest
+
+
+def manifest_name(backup_name):
+    """
+    Returns the name of the manifest, that belongs to the backup archive
+    *backup_name*.
+    """
+    return backup_name + MANIFEST_SUFFIX
+
+
+def load_manifest(storage, backup_name):
+    """
+    Loads the manifest of the backup *backup_name* from the *storage*. If the
+    backup has no manifest, ``None`` is returned.
+    """
+    try:
+        with storage.open_read(manifest_name(backup_name)) as file:
+            return json.loads(file.read().decode())
+    except (IOError, FileNotFoundError, ValueError, StorageError):
         return None
 
-    def app(self):
-        """
-        Returns that EMSM application that implicitly owns this object.
-        """
-        return self._app
 
-    def world(self):
-        """
-        Returns the world whichs backups are managed.
-        """
-        return self._world
+def content_refs(manifest):
+    """
+    Returns the set of the objects in the :class:`ContentStore`, which are
+    referenced by the backup with the *manifest*.
+    """
+    return {state[MANIFEST_HASH] \
+            for state in manifest.get("files", dict()).values() \
+            if state.get("stored") == "content"}
 
-    def backup_dir(self):
-        """
-        Returns the backup directory.
-        """
-        return self._backup_dir
 
-    def max_storage_size(self):
-        """
-        Returns the maximum number of backups that can be stored to the same
-        time. If this value is *0*, then there is no limit.
-        """
-        return self._max_storage_size
+def format_size(size):
+    """
+    Returns the number of bytes *size* as human readable string.
+    """
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024:
+            break
+        size /= 1024
+    else:
+        unit = "TiB"
+    return "{:.1f} {}".format(size, unit) if unit != "B" else "{} B".format(size)
 
-    def backup_logs(self):
-        """
-        Returns the option to include the logs in the backup.
-        """
-        return self._backup_logs
 
-    # We use the *filenames* to store the *timestamp* of a backup.
+def format_size_delta(delta):
+    """
+    Returns the size difference *delta* as human readable string with a
+    sign, e.g. ``+1.2 KiB``.
+    """
+    return ("-" if delta < 0 else "+") + format_size(abs(delta))
 
-    def _filename_format(self):
-        """
-        Returns a string that can be formatted with *datetime.strftime()*.
 
-        Example:
-            >>> now = datetime.datetime.now()
-            >>> fmt = bm.filename_format()
-            >>> fmt
-            %Y_%m_%d-%H_%M_%S-foobar
-            >>> now.strftime(fmt)
-            '2014_09_02-20_37_08-foobar'
-        """
-        filename_format = "%Y_%m_%d-%H_%M_%S-{}".format(self._world.name())
-        return filename_format
+def _iter_members(file, archive_format):
+    """
+    Yields a two tuple *(name, member)* for each regular file in the archive,
+    which is read from the file object *file*. *member* is a readable file
+    object, that streams the content of the member. Nothing is extracted to
+    the disk.
 
-    def _date_from_filename(self, path):
-        """
-        Extracts the timestamp from the filename and returns the corresponding
-        ``datetime.datetime`` instance.
+    Tar archives are read strictly sequential, zip archives need a seekable
+    *file*.
+    """
+    if archive_format == "zip":
+        with zipfile.ZipFile(file) as archive:
+            for info in archive.infolist():
+                if info.filename.endswith("/"):
+                    continue
+                with archive.open(info) as member:
+                    yield (os.path.normpath(info.filename), member)
+    else:
+        with tarfile.open(fileobj=file, mode="r|*") as archive:
+            for info in archive:
+                if not info.isreg():
+                    continue
+                yield (os.path.normpath(info.name), archive.extractfile(info))
+    return None
+
+
+def unpack_archive(file, archive_format, extract_dir):
+    """
+    Extracts the archive, which is read from the file object *file*, into
+    *extract_dir*. Unlike :func:`shutil.unpack_archive`, the archive needs
+    not to be a local file. Tar archives are read as a stream.
+    """
+    if archive_format == "zip":
+        with zipfile.ZipFile(file) as archive:
+            archive.extractall(extract_dir)
+    else:
+        with tarfile.open(fileobj=file, mode="r|*") as archive:
+            # Newer Python versions warn, if no extraction filter is set.
+            # The *data* filter rejects members outside of *extract_dir*.
+            if hasattr(tarfile, "data_filter"):
+                archive.extraction_filter = tarfile.data_filter
+            archive.extractall(extract_dir)
+    return None
+
+
+def file_unchanged(old, new):
+    """
+    Returns ``True``, if the file state *new* has the same size and mtime as
+    the state *old* of the previous backup. The mtime is compared with
+    nanosecond precision, if both states have it.
+    """
+    if not old or old.get("size") != new["size"]:
+        return False
+    if "mtime_ns" in old and "mtime_ns" in new:
+        return old["mtime_ns"] == new["mtime_ns"]
+    return old.get("mtime") == new["mtime"]
 
-        See also:
-            * filename_format()
-        """
-        # Extract the filename and remove any extensions.
-        path = os.path.basename(path)
-        filename = path[:path.find(".")]
 
-        # Extract the datetime.
-        try:
-            return datetime.datetime.strptime(filename, self._filename_format())
-        except ValueError as err:
-            return None
+def is_region_file(path):
+    """
+    Returns ``True`` if the file at *path* is a region file (by its name).
+    """
+    return path.endswith(REGION_EXTENSIONS)
 
-    def _create_filename(self, date):
-        """
-        Creates the filename (without extensions) for the backup that has
-        been created at the datetime *date*.
-        """
-        filename = date.strftime(self._filename_format())
-        return filename
 
-    def backup_list(self):
-        """
-        Returns a dictionary that maps the creation date of the backup to
-        the backup path.
-        """
-        backups = dict()
-        for filename in os.listdir(self._backup_dir):
-            path = os.path.join(self._backup_dir, filename)
+def region_position(path):
+    """
+    Returns the region coordinates *(x, z)* of the region file *path*
+    (``r.<x>.<z>.mca``) or ``None``, if the name is not valid.
+    """
+    parts = os.path.basename(path).split(".")
+    if len(parts) != 4 or parts[0] != "r":
+        return None
+    try:
+        return (int(parts[1]), int(parts[2]))
+    except ValueError:
+        return None
 
-            if not os.path.isfile(path):
-                continue
-            if path.endswith(".tmp"):
-                continue
 
-            date = self._date_from_filename(filename)
-            if date is None:
-                continue
+def changed_chunks(path, old_chunks, new_chunks):
+    """
+    Compares the chunk timestamps *old_chunks* and *new_chunks* of the region
+    file *path* (see :meth:`RegionFile.chunk_timestamps`) and returns the
+    sorted list with the coordinates *(x, z)* of the chunks, which have been
+    added, removed or modified.
 
-            backups[date] = path
-        return backups
+    The coordinates are absolute chunk coordinates, if the region position
+    is known, otherwise they are relative to the region.
+    """
+    region_x, region_z = region_position(path) or (0, 0)
 
-    def latest_backup(self):
-        """
-        Returns a two tuple, that contains the date and the path of the latest
-        available backup. If no backup is available, ``(None, None)`` is
-        returned.
+    indices = set(old_chunks) | set(new_chunks)
+    changed = [int(index) for index in indices \
+               if old_chunks.get(index) != new_chunks.get(index)]
 
-        See also:
-            * backup_list()
-        """
-        backups = self.backup_list()
-        if backups:
-            date = max(backups.keys())
-            path = backups[date]
-            return (date, path)
-        else:
-            return (None, None)
+    coords = [(region_x*32 + index % 32, region_z*32 + index//32) \
+              for index in changed]
+    coords.sort()
+    return coords
 
-    def clean_backup_dir(self):
-        """
-        Removes old backups that are no longer needed.
 
-        See also:
-            * max_storage_size()
-        """
-        # Remove some old backups if we store currently too many backups.
-        if self._max_storage_size > 0:
-            backups = list(self.backup_list().items())
-            backups.sort(reverse=True)
+def write_chunk_delta(region_path, delta_path, parent_chunks):
+    """
+    Compares the region file at *region_path* with the chunk timestamps
+    *parent_chunks* of the previous backup and writes the chunks that
+    changed into the file *delta_path*.
 
-            while len(backups) > self._max_storage_size:
-                date, path = backups.pop()
-                os.remove(path)
+    Returns a two tuple: The chunk timestamps of the region file
+    (``{"chunk index": timestamp}``) and ``True`` if a delta has been
+    written. If no chunk changed, no file is written.
 
-        # Remove .tmp files.
-        # These are backups which could not be craeated successfully.
-        for filename in os.listdir(self._backup_dir):
-            path = os.path.join(self._backup_dir, filename)
+    The chunk delta file looks like this:
 
-            if path.endswith(".tmp"):
-                try:
-                    os.remove(path)
-                except OSError:
-                    pass
-        return None
+        magic               8 bytes
+        location table      4096 bytes (copied from the region file)
+        timestamp table     4096 bytes (copied from the region file)
+        stored bitmap       128 bytes (one bit per chunk)
+        chunk sectors       the sectors of all stored chunks, in the
+                            order of the chunk index
 
-    def _save_world(self, backup_dir):
-        """
-        Copies the world directory (world data) into the backup directory:
+    :raises ValueError:
+        if the file is not a valid region file.
+    """
+    with RegionFile(region_path) as region:
+        chunks = region.chunk_timestamps()
 
-            EMSM_ROOT/worlds/foo -> backup_dir/world
-        """
-        try:
-            # We need to disable the auto-save for the backup. I'm paranoid,
-            # so I'disable auto-save in this try-catch construct.
-            if self._world.is_online():
-                self._world.send_command("save-off")
-                try:
-                    # We use verbose send, to wait until the world has been
-                    # saved.
-                    self._world.send_command_get_output("save-all", timeout=30)
-                except emsm.core.worlds.WorldCommandTimeout as err:
-                    pass
+        stored = [index for index in range(REGION_CHUNKS) \
+                  if str(index) in chunks \
+                  and parent_chunks.get(str(index)) != chunks[str(index)]]
 
-            # Copy the world data to *backup_dir*.
-            if self._backup_logs:
-                shutil.copytree(
-                    self._world.directory(),
-                    os.path.join(backup_dir, "world")
-                )
-            else:
-                shutil.copytree(
-                    self._world.directory(),
-                    os.path.join(backup_dir, "world"),
-                    ignore=shutil.ignore_patterns("logs")
-                )
-        finally:
-            if self._world.is_online():
-                self._world.send_command("save-on")
-                self._world.send_command("save-all")
-        return None
+        # Chunks, which have been removed, are recognized by the location
+        # table, but we have to write the delta anyway.
+        if not stored and chunks.keys() == parent_chunks.keys():
+            return (chunks, False)
 
-    def _restore_world(self, backup_dir):
-        """
-        Copies the world directory from the backup in *backup_dir* into the
-        EMSM world folder.
+        bitmap = bytearray(REGION_CHUNKS//8)
+        for index in stored:
+            bitmap[index//8] |= 1 << (index % 8)
 
-        Exceptions:
-            * WorldIsOnlineError
+        with open(delta_path, "wb") as file:
+            file.write(CHUNK_DELTA_MAGIC)
+            file.write(region.header())
+            file.write(bytes(bitmap))
+            for index in stored:
+                file.write(region.chunk_sectors(index))
+    return (chunks, True)
 
-        See also:
-            * _save_world()
-        """
-        # Break if the world is currently online.
-        if self._world.is_online():
-            raise emsm.core.worlds.WorldIsOnlineError()
 
-        # Delete the world directory (``EMSM/world/...``)
-        for i in range(100):
-            # XXX: Fixes an error with server.log.lck
-            # and shutil.rmtree(...) when the server was online.
-            try:
-                shutil.rmtree(self._world.directory())
-            except OSError:
-                time.sleep(0.05)
-            else:
-                break
+def apply_chunk_delta(delta, region_path):
+    """
+    Reads the chunk delta from the file object *delta* (see
+    :func:`write_chunk_delta`) and updates the region file at *region_path*.
+    The chunks, which are not contained in the delta, are taken from the
+    current region file. The region file is rebuilt completely (without
+    gaps) and replaced atomically.
 
-        # Copy the world backup to the EMSM world directory.
-        shutil.copytree(
-            src = os.path.join(backup_dir, "world"),
-            dst = self._world.directory()
-            )
-        return None
+    The delta is read strictly sequential, so *delta* may be a stream.
 
-    def _save_world_conf(self, backup_dir):
-        """
-        Saves the configuration of the world in *backup_dir/conf/world.json*.
-        """
-        world_conf_backup_path = os.path.join(backup_dir, "world_conf.json")
+    :raises ValueError:
+        if the delta is invalid or if it refers to a chunk, which is not
+        available in the current region file.
+    """
+    def read_exactly(size):
+        data = delta.read(size)
+        if len(data) != size:
+            raise ValueError("unexpected end of the chunk delta")
+        return data
+
+    if read_exactly(len(CHUNK_DELTA_MAGIC)) != CHUNK_DELTA_MAGIC:
+        raise ValueError("invalid chunk delta")
+
+    locations = struct.unpack(">1024I", read_exactly(REGION_SECTOR_SIZE))
+    timestamps = read_exactly(REGION_SECTOR_SIZE)
+    bitmap = read_exactly(REGION_CHUNKS//8)
+
+    current = RegionFile(region_path) if os.path.exists(region_path) else None
+    try:
+        # Compute the new location table. The chunks are written in the
+        # order of their index, starting at sector 2.
+        sources = list()
+        new_locations = [0]*REGION_CHUNKS
+        sector = 2
+        for index in range(REGION_CHUNKS):
+            if not locations[index]:
+                continue
+
+            if bitmap[index//8] & (1 << (index % 8)):
+                count = locations[index] & 0xFF
+                sources.append((index, True))
+            elif current is not None and current.has_chunk(index):
+                count = current.chunk_location(index)[1]
+                sources.append((index, False))
+            else:
+                raise ValueError("chunk {} of '{}' is missing"\
+                                 .format(index, region_path))
+
+            new_locations[index] = (sector << 8) | count
+            sector += count
+
+        # Write the new region file.
+        with open(region_path + ".tmp", "wb") as file:
+            file.write(struct.pack(">1024I", *new_locations))
+            file.write(timestamps)
+            for index, in_delta in sources:
+                count = new_locations[index] & 0xFF
+                if in_delta:
+                    file.write(read_exactly(count*REGION_SECTOR_SIZE))
+                else:
+                    file.write(current.chunk_sectors(index))
+    finally:
+        if current is not None:
+            current.close()
+
+    os.replace(region_path + ".tmp", region_path)
+    return None
+
+
+def set_io_priority(io_class, level=4):
+    """
+    Sets the I/O scheduling class *io_class* (a key of
+    :data:`IOPRIO_CLASSES`) and the *level* (0 - 7, 0 is the highest
+    priority) of the current process with *ioprio_set(2)*.
+
+    :raises OSError:
+        if the priority could not be changed or if the system is not
+        supported.
+    """
+    number = _SYS_IOPRIO_SET.get(platform.machine())
+    if number is None or not sys.platform.startswith("linux"):
+        raise OSError("ioprio_set is not supported on this system")
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    ioprio = (IOPRIO_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT) | level
+    if libc.syscall(number, _IOPRIO_WHO_PROCESS, 0, ioprio) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return None
+
+
+def copy_file(src, dst, throttle=None):
+    """
+    Copies the file *src* to *dst* like :func:`shutil.copy2`, but the data
+    is passed through the *throttle* (see :class:`Throttle`).
+    """
+    if throttle is None:
+        shutil.copy2(src, dst)
+        return None
+
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        for chunk in iter(lambda: src_file.read(CHUNK_SIZE), b""):
+            throttle.consume(len(chunk))
+            dst_file.write(chunk)
+    shutil.copystat(src, dst)
+    return None
+
+
+def clone_file(src, dst):
+    """
+    Copies the file *src* to *dst*. If the file system supports it, *dst*
+    becomes a copy-on-write clone (*reflink*) of *src*, which shares the data
+    with *src*, until one of the files is modified. Returns ``True``, if the
+    file has been cloned.
+    """
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+        except OSError:
+            shutil.copyfileobj(src_file, dst_file, CHUNK_SIZE)
+            return False
+    return True
+
+
+def free_port(used, start=FIRST_SERVER_PORT):
+    """
+    Returns the first TCP port from *start* on, which is not in the set
+    *used* and not bound by another process on this host.
+
+    :raises ValueError:
+        if all ports are in use.
+    """
+    for port in range(start, 2**16):
+        if port in used:
+            continue
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            try:
+                sock.bind(("", port))
+            except OSError:
+                continue
+        return port
+    raise ValueError("there is no free port")
+
+
+def set_server_properties(path, properties):
+    """
+    Sets the *properties* (a dictionary) in the *server.properties* file at
+    *path*. Properties, which are not in the file yet, are appended.
+    """
+    with open(path) as file:
+        lines = file.read().splitlines()
+
+    properties = dict(properties)
+    for i, line in enumerate(lines):
+        key = line.split("=", 1)[0].strip()
+        if "=" in line and key in properties:
+            lines[i] = "{}={}".format(key, properties.pop(key))
+    for key, value in sorted(properties.items()):
+        lines.append("{}={}".format(key, value))
+
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+    return None
+
+
+def remove_tree_in_background(path):
+    """
+    Removes the directory *path* in a background thread and returns the
+    thread. The thread is not a daemon, so the EMSM waits for it before
+    it exits.
+    """
+    thread = threading.Thread(
+        target = shutil.rmtree,
+        args = (path,),
+        kwargs = {"ignore_errors": True},
+        name = "rmtree {}".format(path)
+        )
+    thread.start()
+    return thread
+
+
+def watch_world(world_dir, journal_path):
+    """
+    Watches the world directory *world_dir* and records all changed paths in
+    the :class:`DirtyJournal` *journal_path*, until the world directory is
+    removed or the process is terminated.
+
+    This is the main function of the watcher process, which is started by
+    the backups plugin (see :meth:`Backups._start_watcher`).
+    """
+    # Terminate gracefully, so that the journal is closed.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    journal = DirtyJournal(journal_path)
+    with emsm.core.lib.inotify.TreeWatcher(world_dir) as watcher:
+        journal.begin()
+
+        # The journal is useless, if not all directories are watched. The
+        # next backup must scan the whole world.
+        if watcher.incomplete():
+            log.warning("could not watch all directories in '{}'."\
+                        .format(world_dir))
+            journal.record(set(), overflow=True)
+        try:
+            while True:
+                changes = watcher.read()
+                sync = os.stat(world_dir).st_mtime_ns \
+                       if changes.root_changed and not changes.root_gone \
+                       else None
+                journal.record(changes.paths, changes.overflow, sync)
+                if changes.root_gone:
+                    break
+        finally:
+            journal.end()
+    return None
+
+
+def verify_backup(storage, backup_name, objects=None, content_store=None):
+    """
+    Checks the backup archive *backup_name* in the *storage* against its
+    manifest and returns a list with the detected problems. If the list is
+    empty, the backup is intact.
+
+    *objects* maps the objects of the :class:`ContentStore` *content_store*
+    to their size (see :meth:`ContentStore.objects`). If given, the files of
+    the backup in the content store must exist and their content must match
+    the hash sum, which is the name of the object.
+
+    The archive is only streamed, so the verification needs no temporary
+    disk space. This function does not depend on the EMSM application, so
+    that it can be run in a worker process.
+    """
+    manifest = load_manifest(storage, backup_name)
+    if manifest is None:
+        return ["the manifest is missing or broken."]
+
+    # Check the archive as a whole.
+    algorithm = manifest["algorithm"]
+    with storage.open_read(backup_name) as file:
+        digest, size = stream_hash(file, algorithm)
+    if size != manifest["archive"]["size"]:
+        return ["the archive size differs: {} != {} bytes."\
+                .format(size, manifest["archive"]["size"])]
+    if digest != manifest["archive"][algorithm]:
+        problems = ["the archive checksum differs."]
+    else:
+        problems = list()
+
+    # Check the single members.
+    expected = dict(manifest["members"])
+    try:
+        with storage.open_read(backup_name) as file:
+            for name, member in _iter_members(file, manifest["format"]):
+                record = expected.pop(name, None)
+                if record is None:
+                    problems.append("unexpected member '{}'.".format(name))
+                    continue
+
+                digest, size = stream_hash(member, algorithm)
+                if size != record["size"] or digest != record[algorithm]:
+                    problems.append(
+                        "the member '{}' is corrupted.".format(name)
+                        )
+    # The decompressors raise different exceptions for corrupted data
+    # (zlib.error, lzma.LZMAError, OSError, ...), so we catch them all.
+    except Exception as err:
+        problems.append("the archive could not be read: {}".format(err))
+    else:
+        for name in sorted(expected):
+            problems.append("the member '{}' is missing.".format(name))
+
+    # Check the files, which are stored in the content store. Equal files
+    # share an object, so each object is hashed only once.
+    if objects is not None:
+        intact = dict()
+        for name, state in sorted(manifest.get("files", dict()).items()):
+            if state.get("stored") != "content":
+                continue
+            digest = state[algorithm]
+            if not digest in objects:
+                problems.append("the content of '{}' is missing.".format(name))
+                continue
+
+            if not digest in intact:
+                intact[digest] = objects[digest] == state["size"]
+                if intact[digest] and content_store is not None:
+                    try:
+                        with content_store.open_read(digest) as file:
+                            intact[digest] = \
+                                stream_hash(file, algorithm)[0] == digest
+                    except Exception as err:
+                        log.warning("could not read the object '{}': {}"\
+                                    .format(digest, err))
+                        intact[digest] = False
+            if not intact[digest]:
+                problems.append(
+                    "the content of '{}' is corrupted.".format(name)
+                    )
+    return problems
+
+
+def manifest_files(manifest):
+    """
+    Returns a dictionary, which maps the name of each world file in the
+    backup with the *manifest* to its state (*size*, *mtime*, the hash sum
+    and the *chunks* of region files).
+
+    Manifests of older backups have no file states, so the archive members
+    are used.
+    """
+    if "files" in manifest:
+        return manifest["files"]
+
+    prefix = "world" + os.sep
+    return {name: member for name, member in manifest["members"].items() \
+            if name.startswith(prefix)}
+
+
+def _file_modified(old, new):
+    """
+    Returns ``True``, if the file states *old* and *new* (see
+    :func:`manifest_files`) describe different file contents.
+    """
+    if old.get(MANIFEST_HASH) and new.get(MANIFEST_HASH):
+        return old[MANIFEST_HASH] != new[MANIFEST_HASH]
+    if "chunks" in old and "chunks" in new:
+        return old["size"] != new["size"] or old["chunks"] != new["chunks"]
+    return old["size"] != new["size"] or old.get("mtime") != new.get("mtime")
+
+
+def diff_manifests(old, new):
+    """
+    Compares the world files in the manifests *old* and *new* and returns
+    a list with the four tuples *(status, name, old state, new state)*,
+    sorted by the name. *status* is either ``"added"``, ``"removed"`` or
+    ``"modified"``. The state of an added or removed file is ``None``.
+
+    Only the manifests are compared, so no archive is read.
+    """
+    old_files = manifest_files(old)
+    new_files = manifest_files(new)
+
+    diff = list()
+    for name in sorted(set(old_files) | set(new_files)):
+        old_state = old_files.get(name)
+        new_state = new_files.get(name)
+        if old_state is None:
+            diff.append(("added", name, None, new_state))
+        elif new_state is None:
+            diff.append(("removed", name, old_state, None))
+        elif _file_modified(old_state, new_state):
+            diff.append(("modified", name, old_state, new_state))
+    return diff
+
+
+# Classes
+# ------------------------------------------------
+
+class RegionFile(object):
+    """
+    Read-only access to an Anvil (or McRegion) region file.
+
+    The file is mapped into the memory, so that only the header and the
+    sectors of the chunks we actually touch are read from the disk.
+
+    :raises ValueError:
+        if the file is too small to be a region file.
+    """
+
+    def __init__(self, path):
+        """
+        """
+        self._file = open(path, "rb")
+        try:
+            if os.fstat(self._file.fileno()).st_size < 2*REGION_SECTOR_SIZE:
+                raise ValueError("'{}' is not a region file".format(path))
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        except:
+            self._file.close()
+            raise
+
+        self._locations = struct.unpack(
+            ">1024I", self._map[:REGION_SECTOR_SIZE]
+            )
+        self._timestamps = struct.unpack(
+            ">1024I", self._map[REGION_SECTOR_SIZE:2*REGION_SECTOR_SIZE]
+            )
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return None
+
+    def close(self):
+        """
+        """
+        self._map.close()
+        self._file.close()
+        return None
+
+    def header(self):
+        """
+        Returns the location and timestamp table (the first two sectors).
+        """
+        return self._map[:2*REGION_SECTOR_SIZE]
+
+    def has_chunk(self, index):
+        """
+        Returns ``True`` if the chunk with the *index* exists.
+        """
+        return bool(self._locations[index])
+
+    def chunk_location(self, index):
+        """
+        Returns a two tuple with the first sector and the number of sectors
+        of the chunk with the *index*.
+        """
+        location = self._locations[index]
+        return (location >> 8, location & 0xFF)
+
+    def chunk_timestamps(self):
+        """
+        Returns a dictionary, which maps the index (as string) of each
+        existing chunk to its timestamp.
+        """
+        return {str(index): self._timestamps[index] \
+                for index in range(REGION_CHUNKS) if self._locations[index]}
+
+    def chunk_sectors(self, index):
+        """
+        Returns the raw sectors of the chunk with the *index*.
+
+        :raises ValueError:
+            if the sectors are outside of the file.
+        """
+        offset, count = self.chunk_location(index)
+        start = offset*REGION_SECTOR_SIZE
+        end = start + count*REGION_SECTOR_SIZE
+        if end > len(self._map):
+            raise ValueError("chunk {} is outside of the region file"\
+                             .format(index))
+        return self._map[start:end]
+
+
+class Throttle(object):
+    """
+    Limits the bandwidth of a backup with a token bucket and pauses it,
+    while one of the *worlds* reports lag in its log.
+
+    *rate* is the number of bytes per second (``0`` means no limit). If a
+    world logs a lag warning (see
+    :meth:`emsm.core.server.BaseServerWrapper.log_lag_re`), the backup
+    sleeps *backoff* seconds.
+    """
+
+    def __init__(self, rate=0, worlds=tuple(), backoff=0):
+        """
+        """
+        self._rate = rate
+        self._backoff = backoff
+
+        # The bucket holds at most the tokens for one second.
+        self._tokens = rate
+        self._last_fill = time.monotonic()
+
+        # Maps the log path to the lag regex and the offset, up to which
+        # the log has been checked. Old warnings are ignored.
+        self._logs = dict()
+        if backoff > 0:
+            for world in worlds:
+                lag_re = world.server().log_lag_re()
+                if lag_re is None:
+                    continue
+                try:
+                    offset = os.path.getsize(world.log_path())
+                except OSError:
+                    offset = 0
+                self._logs[world.log_path()] = (lag_re, offset)
+        self._last_check = time.monotonic()
+        return None
+
+    def consume(self, size):
+        """
+        Takes *size* tokens (bytes) from the bucket and blocks until they
+        are available. The logs are checked for lag every
+        :data:`LAG_CHECK_INTERVAL` seconds.
+        """
+        if self._logs \
+           and time.monotonic() - self._last_check >= LAG_CHECK_INTERVAL:
+            if self.server_lags():
+                log.info("a world lags, pausing the backup for {}s ..."\
+                         .format(self._backoff))
+                time.sleep(self._backoff)
+            self._last_check = time.monotonic()
+
+        if self._rate <= 0:
+            return None
+
+        now = time.monotonic()
+        self._tokens = min(
+            self._rate, self._tokens + (now - self._last_fill)*self._rate
+            )
+        self._last_fill = now
+
+        # We allow the bucket to become negative, so that chunks larger
+        # than the bucket are possible. The debt is paid by sleeping.
+        self._tokens -= size
+        if self._tokens < 0:
+            time.sleep(-self._tokens/self._rate)
+        return None
+
+    def server_lags(self):
+        """
+        Returns ``True`` if one of the worlds logged a lag warning since the
+        last check.
+        """
+        lags = False
+        for path, (lag_re, offset) in self._logs.items():
+            try:
+                with open(path, errors="replace") as file:
+                    # The log has been rotated.
+                    file.seek(0, 2)
+                    if file.tell() < offset:
+                        offset = 0
+                    file.seek(offset)
+                    data = file.read()
+                    offset = file.tell()
+            except OSError:
+                continue
+            self._logs[path] = (lag_re, offset)
+
+            if any(lag_re.match(line) for line in data.splitlines()):
+                lags = True
+        return lags
+
+
+class HashingReader(object):
+    """
+    Wraps the readable file object *file* and updates the hash object
+    *sum_* with all data read through it. If a *throttle* is given, the
+    data is passed through it.
+    """
+
+    def __init__(self, file, sum_, throttle=None):
+        """
+        """
+        self._file = file
+        self._hash = sum_
+        self._throttle = throttle
+        return None
+
+    def read(self, size=-1):
+        """
+        """
+        data = self._file.read(size)
+        if self._throttle is not None:
+            self._throttle.consume(len(data))
+        self._hash.update(data)
+        return data
+
+
+class HashingWriter(object):
+    """
+    Wraps the writeable file object *file* and computes the hash sum and
+    size of all data written through it.
+    """
+
+    def __init__(self, file, algorithm=MANIFEST_HASH):
+        """
+        """
+        self._file = file
+        self._hash = hashlib.new(algorithm)
+        self._size = 0
+        return None
+
+    def write(self, data):
+        """
+        """
+        self._hash.update(data)
+        self._size += len(data)
+        self._file.write(data)
+        return len(data)
+
+    def tell(self):
+        """
+        Returns the number of bytes written so far.
+        """
+        return self._size
+
+    def flush(self):
+        """
+        """
+        self._file.flush()
+        return None
+
+    def hexdigest(self):
+        """
+        Returns the hash sum of the data written so far.
+        """
+        return self._hash.hexdigest()
+
+
+class ArchiveWriter(object):
+    """
+    Writes a backup archive with the *archive_format* into the file object
+    *file* and computes the size and hash sum of each member on the fly,
+    so that no file has to be read twice.
+
+    The archive is written as a stream, *file* needs not to be seekable.
+    All files are read through the *throttle* (see :class:`Throttle`), if
+    one is given.
+    """
+
+    def __init__(self, file, archive_format, algorithm=MANIFEST_HASH,
+                 throttle=None):
+        """
+        """
+        self._algorithm = algorithm
+        self._format = archive_format
+        self._throttle = throttle
+
+        # Maps the member names to ``{"size": ..., algorithm: ...}``.
+        self._members = dict()
+
+        if archive_format == "zip":
+            self._archive = zipfile.ZipFile(
+                file, "w", compression=zipfile.ZIP_DEFLATED
+                )
+        else:
+            mode = "w|" + _TAR_COMPRESSION[archive_format]
+            self._archive = tarfile.open(fileobj=file, mode=mode)
+        return None
+
+    def members(self):
+        """
+        Returns a dictionary, that maps the name of each member to its
+        size and hash sum.
+        """
+        return self._members
+
+    def add_file(self, path, arcname):
+        """
+        Adds the regular file at *path* with the name *arcname* to the
+        archive.
+        """
+        sum_ = hashlib.new(self._algorithm)
+        stat = os.stat(path)
+        record = {
+            "size": 0,
+            "mode": stat.st_mode & 0o7777,
+            "mtime": int(stat.st_mtime)
+            }
+
+        if self._format == "zip":
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, self._archive.open(info, "w") as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                    if self._throttle is not None:
+                        self._throttle.consume(len(chunk))
+                    sum_.update(chunk)
+                    record["size"] += len(chunk)
+                    dst.write(chunk)
+        else:
+            info = self._archive.gettarinfo(path, arcname)
+            with open(path, "rb") as src:
+                self._archive.addfile(
+                    info, HashingReader(src, sum_, self._throttle)
+                    )
+            record["size"] = info.size
+
+            # Remember where the data of the member starts in the
+            # uncompressed tar stream. This allows us to restore single
+            # files without reading the archive headers.
+            blocks, remainder = divmod(info.size, tarfile.BLOCKSIZE)
+            if remainder:
+                blocks += 1
+            record["offset"] = self._archive.offset - blocks*tarfile.BLOCKSIZE
+
+        record[self._algorithm] = sum_.hexdigest()
+        self._members[os.path.normpath(arcname)] = record
+        return None
+
+    def add_dir(self, path, arcname):
+        """
+        Adds the directory entry at *path* (not its content) to the archive.
+        """
+        if self._format == "zip":
+            self._archive.write(path, arcname)
+        else:
+            self._archive.add(path, arcname, recursive=False)
+        return None
+
+    def add_tree(self, root_dir):
+        """
+        Adds all files and directories below *root_dir* to the archive. The
+        member names are relative to *root_dir*.
+        """
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            dirnames.sort()
+            for name in dirnames:
+                path = os.path.join(dirpath, name)
+                self.add_dir(path, os.path.relpath(path, root_dir))
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                self.add_file(path, os.path.relpath(path, root_dir))
+        return None
+
+    def close(self):
+        """
+        Finishes the archive. The underlying file object is not closed.
+        """
+        self._archive.close()
+        return None
+
+
+# Storage
+# ------------------------------------------------
+
+class StorageWriter(object):
+    """
+    The file object returned by :meth:`BackupStorage.open_write`. It wraps
+    the *upload*, which must provide *write()*, *tell()*, *close()* and
+    *abort()*. The errors of the upload (e.g. a rejected S3 request or a
+    network failure) are raised as :class:`StorageError`.
+
+    When used as context manager, the upload is completed, if the block
+    is left without an exception and aborted otherwise.
+    """
+
+    def __init__(self, upload):
+        """
+        """
+        self._upload = upload
+        return None
+
+    def write(self, data):
+        """
+        """
+        try:
+            return self._upload.write(data)
+        except (emsm.core.lib.s3.S3Error, OSError) as err:
+            raise StorageError(err)
+
+    def tell(self):
+        """
+        """
+        return self._upload.tell()
+
+    def flush(self):
+        """
+        """
+        return None
+
+    def close(self):
+        """
+        Completes the upload. The object is visible in the storage now.
+        """
+        try:
+            self._upload.close()
+        except (emsm.core.lib.s3.S3Error, OSError) as err:
+            raise StorageError(err)
+        return None
+
+    def abort(self):
+        """
+        Discards the upload.
+        """
+        try:
+            self._upload.abort()
+        except (emsm.core.lib.s3.S3Error, OSError) as err:
+            raise StorageError(err)
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # The original error is more important than a failed clean up.
+            try:
+                self.abort()
+            except StorageError as err:
+                log.warning("could not abort the upload: {}".format(err))
+        return None
+
+
+class _LocalUpload(object):
+    """
+    Writes the file *path*. The data is written to a unique *.tmp* file
+    next to *path* first and renamed, when the upload is closed. So several
+    threads can write the same *path* at once. If *sync* is true, the data
+    is flushed to the disk before the file is renamed.
+    """
+
+    def __init__(self, path, sync=False):
+        """
+        """
+        self._path = path
+        self._sync = sync
+
+        fd, self._tmp_path = tempfile.mkstemp(
+            prefix = os.path.basename(path) + ".",
+            suffix = ".tmp",
+            dir = os.path.dirname(path)
+            )
+        self._file = os.fdopen(fd, "wb")
+        return None
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        """
+        """
+        if self._sync:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._file.close()
+
+        # *mkstemp()* creates files with the mode 0600. We apply the mode a
+        # normal *open()* would use.
+        os.chmod(self._tmp_path, 0o666 & ~current_umask())
+        os.replace(self._tmp_path, self._path)
+        return None
+
+    def abort(self):
+        """
+        """
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+        return None
+
+
+class BackupStorage(object):
+    """
+    **ABSTRACT**
+
+    A target, the backup archives and their manifests are stored in. The
+    objects in a storage are addressed by their *name* (a filename).
+
+    The storage objects must be picklable, since they are passed to the
+    worker processes of ``--verify``.
+    """
+
+    def url(self, name):
+        """
+        Returns a human readable location of the object *name*.
+        """
+        raise NotImplementedError()
+
+    def list(self):
+        """
+        Returns a dictionary, which maps the names of all objects in the
+        storage to their size.
+        """
+        raise NotImplementedError()
+
+    def exists(self, name):
+        """
+        Returns ``True`` if the object *name* exists.
+        """
+        raise NotImplementedError()
+
+    def open_read(self, name):
+        """
+        Returns a readable and seekable binary file object for the object
+        *name*.
+
+        :raises FileNotFoundError:
+            if the object does not exist.
+        """
+        raise NotImplementedError()
+
+    def open_write(self, name):
+        """
+        Returns a :class:`StorageWriter` for the object *name*. The object
+        is created or replaced, when the writer is closed.
+        """
+        raise NotImplementedError()
+
+    def remove(self, name):
+        """
+        Removes the object *name*. Missing objects are ignored.
+        """
+        raise NotImplementedError()
+
+    def cleanup(self):
+        """
+        Removes the remains of incomplete uploads.
+        """
+        return None
+
+
+class LocalStorage(BackupStorage):
+    """
+    Stores the backups in the local *directory*. New backups are written
+    to a temporary file in the same directory and renamed, when they are
+    complete.
+    """
+
+    def __init__(self, directory):
+        """
+        """
+        self._directory = directory
+        return None
+
+    def directory(self):
+        """
+        Returns the directory, which contains the backups.
+        """
+        return self._directory
+
+    def path(self, name):
+        """
+        Returns the path of the object *name*.
+        """
+        return os.path.join(self._directory, name)
+
+    def url(self, name):
+        return self.path(name)
+
+    def list(self):
+        """
+        """
+        objects = dict()
+        try:
+            filenames = os.listdir(self._directory)
+        except FileNotFoundError:
+            filenames = list()
+
+        for filename in filenames:
+            path = self.path(filename)
+            if filename.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            objects[filename] = os.path.getsize(path)
+        return objects
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name))
+
+    def open_read(self, name):
+        return open(self.path(name), "rb")
+
+    def open_write(self, name):
+        """
+        """
+        os.makedirs(self._directory, exist_ok=True)
+        return StorageWriter(_LocalUpload(self.path(name)))
+
+    def remove(self, name):
+        """
+        """
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+        return None
+
+    def cleanup(self):
+        """
+        Removes the *.tmp* files. These are backups which could not be
+        created successfully.
+        """
+        try:
+            filenames = os.listdir(self._directory)
+        except FileNotFoundError:
+            filenames = list()
+
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                try:
+                    os.remove(self.path(filename))
+                except OSError:
+                    pass
+        return None
+
+
+class MountedStorage(LocalStorage):
+    """
+    Stores the backups in the *directory* on a mounted filesystem, e.g. an
+    NFS or SMB share or a USB disk.
+
+    Unlike the :class:`LocalStorage`, the storage checks, that a filesystem
+    is actually mounted, before it writes to it. Otherwise, the backups
+    would silently fill the disk below the mount point. The backups are
+    synced to the disk, before they are renamed.
+    """
+
+    def mount_point(self):
+        """
+        Returns the mount point of the filesystem, *directory* is on.
+        """
+        path = os.path.realpath(self._directory)
+        while not os.path.ismount(path):
+            path = os.path.dirname(path)
+        return path
+
+    def _check_mounted(self):
+        """
+        :raises StorageError:
+            if *directory* is on the root filesystem.
+        """
+        if self.mount_point() == os.path.realpath(os.sep):
+            raise StorageError(
+                "no filesystem is mounted at '{}'".format(self._directory)
+                )
+        return None
+
+    def list(self):
+        self._check_mounted()
+        return super().list()
+
+    def open_write(self, name):
+        """
+        """
+        self._check_mounted()
+        os.makedirs(self._directory, exist_ok=True)
+        return StorageWriter(_LocalUpload(self.path(name), sync=True))
+
+
+class S3Storage(BackupStorage):
+    """
+    Stores the backups in the *bucket* of an S3 compatible object store.
+    The names of the objects are prefixed with *prefix*.
+
+    The archives are uploaded in parts of *part_size* bytes while they are
+    written, so that only one part is held in memory and no temporary file
+    is needed.
+    """
+
+    def __init__(self, client, bucket, prefix="", part_size=8*2**20):
+        """
+        """
+        self._client = client
+        self._bucket = bucket
+        self._prefix = prefix
+        self._part_size = part_size
+        return None
+
+    def _key(self, name):
+        return self._prefix + name
+
+    def url(self, name):
+        return "s3://{}/{}".format(self._bucket, self._key(name))
+
+    def list(self):
+        """
+        """
+        try:
+            objects = dict()
+            for key, size in self._client.list_objects(
+                self._bucket, self._prefix
+                ):
+                name = key[len(self._prefix):]
+                if name and not "/" in name:
+                    objects[name] = size
+            return objects
+        except emsm.core.lib.s3.S3Error as err:
+            raise StorageError(err)
+
+    def exists(self, name):
+        """
+        """
+        try:
+            return self._client.head_object(
+                self._bucket, self._key(name)
+                ) is not None
+        except emsm.core.lib.s3.S3Error as err:
+            raise StorageError(err)
+
+    def open_read(self, name):
+        """
+        """
+        try:
+            return emsm.core.lib.s3.RangeReader(
+                self._client, self._bucket, self._key(name),
+                block_size=self._part_size
+                )
+        except emsm.core.lib.s3.S3Error as err:
+            raise StorageError(err)
+
+    def open_write(self, name):
+        """
+        """
+        upload = emsm.core.lib.s3.MultipartWriter(
+            self._client, self._bucket, self._key(name), self._part_size
+            )
+        return StorageWriter(upload)
+
+    def remove(self, name):
+        """
+        """
+        try:
+            self._client.delete_object(self._bucket, self._key(name))
+        except emsm.core.lib.s3.S3Error as err:
+            raise StorageError(err)
+        return None
+
+
+class ContentStore(object):
+    """
+    A content addressed store, which is shared by the backups of all worlds.
+
+    Each object is named after the hash sum of its content, so a file, which
+    is part of many backups of many worlds (e.g. an untouched region file of
+    a template map), is stored only once. The objects are kept in the
+    *storage* (see :class:`BackupStorage`).
+
+    Each world registers the objects its backups reference in a list of
+    references. Objects, which are not referenced by any world, are removed
+    by :meth:`collect_garbage`.
+    """
+
+    def __init__(self, storage):
+        """
+        """
+        self._storage = storage
+        return None
+
+    def storage(self):
+        """
+        Returns the :class:`BackupStorage` of the objects.
+        """
+        return self._storage
+
+    def _is_object(self, name):
+        """
+        Returns ``True``, if *name* is the name of an object and not of
+        a list of references.
+        """
+        return len(name) == 2*hashlib.new(MANIFEST_HASH).digest_size \
+               and all(c in "0123456789abcdef" for c in name)
+
+    def objects(self):
+        """
+        Returns a dictionary, which maps the hash sums of all objects in the
+        store to their size.
+        """
+        return {name: size for name, size in self._storage.list().items() \
+                if self._is_object(name)}
+
+    def exists(self, digest):
+        """
+        Returns ``True``, if the object *digest* is in the store.
+        """
+        return self._storage.exists(digest)
+
+    def open_read(self, digest):
+        """
+        Returns a readable binary file object for the object *digest*.
+        """
+        return self._storage.open_read(digest)
+
+    def put(self, path, digest):
+        """
+        Adds the file at *path* with the hash sum *digest* to the store and
+        returns ``True``. If the object already exists, nothing is done and
+        ``False`` is returned.
+        """
+        if self._storage.exists(digest):
+            return False
+
+        with open(path, "rb") as src, self._storage.open_write(digest) as dst:
+            for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+                dst.write(chunk)
+        return True
+
+    def refs(self):
+        """
+        Returns a dictionary, which maps the name of each world to the set
+        of the objects referenced by its backups.
+        """
+        refs = dict()
+        for name in self._storage.list():
+            if not name.endswith(CONTENT_REFS_SUFFIX):
+                continue
+            with self._storage.open_read(name) as file:
+                world_refs = json.loads(file.read().decode())
+            refs[name[:-len(CONTENT_REFS_SUFFIX)]] = set(world_refs)
+        return refs
+
+    def set_refs(self, world, digests):
+        """
+        Replaces the references of the *world* with *digests*.
+        """
+        name = world + CONTENT_REFS_SUFFIX
+        if not digests:
+            self._storage.remove(name)
+            return None
+
+        with self._storage.open_write(name) as file:
+            file.write(json.dumps(sorted(digests)).encode())
+        return None
+
+    def add_refs(self, world, digests):
+        """
+        Adds the *digests* to the references of the *world*.
+
+        This must be done before a backup, which references them, is
+        committed. Otherwise, :meth:`collect_garbage` could remove them,
+        if the backup is interrupted.
+        """
+        refs = self.refs().get(world, set())
+        if not set(digests) <= refs:
+            self.set_refs(world, refs | set(digests))
+        return None
+
+    def usage(self):
+        """
+        Returns a dictionary, which maps the name of each world to a two
+        tuple with the number of bytes only referenced by this world
+        (*unique*) and the number of bytes, which are also referenced by
+        other worlds (*shared*).
+        """
+        objects = self.objects()
+        refs = self.refs()
+
+        ref_count = dict()
+        for world_refs in refs.values():
+            for digest in world_refs:
+                ref_count[digest] = ref_count.get(digest, 0) + 1
+
+        usage = dict()
+        for world, world_refs in refs.items():
+            unique = sum(objects.get(digest, 0) for digest in world_refs \
+                         if ref_count[digest] == 1)
+            shared = sum(objects.get(digest, 0) for digest in world_refs \
+                         if ref_count[digest] > 1)
+            usage[world] = (unique, shared)
+        return usage
+
+    def collect_garbage(self):
+        """
+        Removes all objects, which are not referenced by any world, and
+        returns the number of removed objects and bytes.
+        """
+        referenced = set()
+        for world_refs in self.refs().values():
+            referenced.update(world_refs)
+
+        count = 0
+        size = 0
+        for digest, digest_size in self.objects().items():
+            if not digest in referenced:
+                self._storage.remove(digest)
+                count += 1
+                size += digest_size
+
+        # Remove the objects, which could not be stored successfully.
+        self._storage.cleanup()
+        return (count, size)
+
+
+class DirtyJournal(object):
+    """
+    Records the paths in a world directory, which changed since the last
+    backup, so that an incremental backup does not need to walk through the
+    whole world.
+
+    The journal is written by the watcher of the world (see
+    :func:`watch_world`), which runs in its own process. Each line is either
+    a JSON encoded path relative to the world directory or a control line:
+
+    ``!start <pid>``
+        The watcher started. Changes before are unknown.
+    ``!stop``
+        The watcher stopped. Changes after are unknown.
+    ``!overflow``
+        Events have been lost or the journal is full.
+    ``!sync <token>``
+        The watcher processed all events up to a :meth:`sync` request.
+    ``!rotate <token>``
+        The first line of the journal after a backup. The *token* is stored
+        in the manifest of the backup.
+
+    The journal is only complete, if it starts with the token of the
+    previous backup and contains none of the other control lines. All
+    accesses are serialized with a lock on the file *<path>.lock*.
+    """
+
+    def __init__(self, path):
+        """
+        """
+        self._path = path
+        self._lock_path = path + ".lock"
+        self._pid_path = path + ".pid"
+
+        # The watcher records each path only once per journal. The journal
+        # is identified by its first line.
+        self._header = None
+        self._recorded = set()
+        self._full = False
+        return None
+
+    def path(self):
+        """
+        Returns the path of the journal.
+        """
+        return self._path
+
+    def _lock(self):
+        """
+        Returns the opened lock file, after it has been locked. The lock is
+        released, when the file is closed.
+        """
+        file = open(self._lock_path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX)
+        except:
+            file.close()
+            raise
+        return file
+
+    def watcher_pid(self):
+        """
+        Returns the pid of the running watcher or ``None``.
+        """
+        try:
+            with open(self._pid_path) as file:
+                pid = int(file.read())
+            os.kill(pid, 0)
+
+            # The pid may have been reused by another process.
+            with open("/proc/{}/cmdline".format(pid), "rb") as file:
+                cmdline = file.read().split(b"\0")
+        except (OSError, ValueError):
+            return None
+        return pid if os.fsencode(self._path) in cmdline else None
+
+    def begin(self):
+        """
+        Called by the watcher, when it starts.
+        """
+        with self._lock():
+            self._header = "!start {}".format(os.getpid())
+            self._recorded.clear()
+            self._full = False
+            with open(self._path, "w") as file:
+                file.write(self._header + "\n")
+            with open(self._pid_path, "w") as file:
+                file.write(str(os.getpid()))
+        return None
+
+    def end(self):
+        """
+        Called by the watcher, when it stops.
+        """
+        with self._lock():
+            with open(self._path, "a") as file:
+                file.write("!stop\n")
+            try:
+                os.remove(self._pid_path)
+            except FileNotFoundError:
+                pass
+        return None
+
+    def record(self, paths, overflow=False, sync=None):
+        """
+        Called by the watcher. Appends the changed *paths* to the journal.
+        If *overflow* is true, events have been lost. *sync* is the token of
+        a :meth:`sync` request, which is answered.
+        """
+        with self._lock():
+            with open(self._path, "a+") as file:
+                # A backup started a new journal.
+                file.seek(0)
+                header = file.readline().rstrip("\n")
+                if header != self._header:
+                    self._header = header
+                    self._recorded.clear()
+                    self._full = False
+
+                lines = list()
+                if not self._full:
+                    paths = set(paths) - self._recorded
+                    if overflow or len(self._recorded) + len(paths) \
+                       > JOURNAL_MAX_ENTRIES:
+                        lines.append("!overflow")
+                        self._recorded.clear()
+                        self._full = True
+                    else:
+                        lines.extend(json.dumps(path) for path in sorted(paths))
+                        self._recorded.update(paths)
+                if sync is not None:
+                    lines.append("!sync {}".format(sync))
+                file.write("".join(line + "\n" for line in lines))
+        return None
+
+    def sync(self, world_dir, timeout=JOURNAL_SYNC_TIMEOUT):
+        """
+        Waits until the watcher recorded all changes in *world_dir*, which
+        happened before this call. Returns ``False``, if the watcher is not
+        running or did not answer within *timeout* seconds.
+        """
+        if self.watcher_pid() is None:
+            return False
+
+        # The watcher answers the changed mtime of the world directory with
+        # a sync line, after it processed all earlier events.
+        try:
+            os.utime(world_dir)
+            line = "!sync {}\n".format(os.stat(world_dir).st_mtime_ns)
+        except OSError:
+            return False
+
+        deadline = time.time() + timeout
+        while True:
+            try:
+                with open(self._path) as file:
+                    if line in file.read():
+                        return True
+            except FileNotFoundError:
+                pass
+            if time.time() > deadline:
+                log.warning("the watcher of '{}' did not answer."\
+                            .format(world_dir))
+                return False
+            time.sleep(0.05)
+
+    def rotate(self, token):
+        """
+        Starts a new journal for the next backup and returns a two tuple:
+        The set of the paths recorded since the backup with the journal
+        *token* or ``None``, if the journal is incomplete, and the token
+        of the new journal.
+        """
+        new_token = uuid.uuid4().hex
+        with self._lock():
+            try:
+                with open(self._path) as file:
+                    lines = file.read().splitlines()
+            except FileNotFoundError:
+                lines = list()
+
+            paths = None
+            if token and lines and lines[0] == "!rotate {}".format(token):
+                paths = set()
+                for line in lines[1:]:
+                    if not line.startswith("!"):
+                        paths.add(json.loads(line))
+                    elif not line.startswith("!sync "):
+                        paths = None
+                        break
+
+            with open(self._path, "w") as file:
+                file.write("!rotate {}\n".format(new_token))
+        return (paths, new_token)
+
+
+class BackupCatalog(object):
+    """
+    The catalog is an index of all backups of a world, so that we don't
+    have to scan the backup directory each time we need the backup list.
+
+    The catalog is a json file with a record for each backup:
+
+        {"version": 1,
+         "backups": [{"filename": "2014_09_02-20_37_08-foo.tar.gz",
+                      "timestamp": 1409683028.0,
+                      "size": 1048576,
+                      "format": "gztar",
+                      "file_count": 312,
+                      "duration": 12.4,
+                      "checksum": "sha256:...",
+                      "parent": None
+                      },
+                     ...
+                     ]
+        }
+
+    The records are sorted by their timestamp, starting with the oldest one.
+    """
+
+    def __init__(self, path):
+        """
+        """
+        self._path = path
+
+        # Maps the filename of the backup to its record.
+        self._records = dict()
+        return None
+
+    def path(self):
+        """
+        Returns the path of the catalog file.
+        """
+        return self._path
+
+    def exists(self):
+        """
+        Returns ``True`` if the catalog file exists.
+        """
+        return os.path.isfile(self._path)
+
+    def load(self):
+        """
+        Reads the catalog file. If the file does not exist, the catalog is
+        empty.
+        """
+        try:
+            with open(self._path) as file:
+                data = json.load(file)
+        except (IOError, FileNotFoundError, ValueError):
+            data = dict()
+
+        self._records = {record["filename"]: record \
+                         for record in data.get("backups", list())}
+        return None
+
+    def save(self):
+        """
+        Writes the catalog into its file.
+        """
+        data = {"version": 1, "backups": self.records()}
+        with open(self._path + ".tmp", "w") as file:
+            json.dump(data, file, indent=1)
+        os.rename(self._path + ".tmp", self._path)
+        return None
+
+    def records(self):
+        """
+        Returns a list with all records, sorted by the creation date.
+        """
+        return sorted(self._records.values(), key=lambda r: r["timestamp"])
+
+    def get(self, filename):
+        """
+        Returns the record of the backup *filename* or ``None``.
+        """
+        return self._records.get(filename)
+
+    def add(self, record):
+        """
+        Adds the *record* to the catalog. A record with the same filename
+        is replaced.
+        """
+        self._records[record["filename"]] = record
+        return None
+
+    def remove(self, filename):
+        """
+        Removes the record of the backup *filename* from the catalog.
+        """
+        self._records.pop(filename, None)
+        return None
+
+    def clear(self):
+        """
+        Removes all records.
+        """
+        self._records.clear()
+        return None
+
+    def latest(self):
+        """
+        Returns the record of the latest backup or ``None``, if the catalog
+        is empty.
+        """
+        if not self._records:
+            return None
+        return max(self._records.values(), key=lambda r: r["timestamp"])
+
+    def chain(self, filename):
+        """
+        Returns the list with the filenames of all backups the backup
+        *filename* depends on, starting with *filename* itself and ending
+        with the full backup. Parents, which are not in the catalog,
+        are not included.
+        """
+        chain = list()
+        record = self._records.get(filename)
+        while record is not None and record["filename"] not in chain:
+            chain.append(record["filename"])
+            record = self._records.get(record.get("parent"))
+        return chain
+
+
+class BackupManager(object):
+    """
+    Manages the backups of one world.
+
+    The backups are stored in the *storage* (see :class:`BackupStorage`). If
+    no storage is given, the backups are stored in *backup_dir*. The
+    catalog is always kept in *backup_dir*.
+
+    If *dedup* is true, the saved files with at least *dedup_min_size* bytes
+    are stored in the shared *content_store* (see :class:`ContentStore`)
+    instead of the archive.
+
+    If *watch* is true, incremental backups only check the files, which
+    the watcher of the world recorded in the :class:`DirtyJournal`.
+    """
+
+    def __init__(self, app, world, max_storage_size, backup_dir, backup_logs,
+                 chunk_delta=False, full_backup_interval=0, retention=None,
+                 bandwidth_limit=0, lag_backoff=0, snapshot_lock=None,
+                 storage=None, content_store=None, dedup=False,
+                 dedup_min_size=0, incremental=False, watch=False):
+        """
+        """
+        self._app = app
+        self._world = world
+        self._backup_dir = backup_dir
+        self._storage = storage or LocalStorage(backup_dir)
+        self._max_storage_size = max_storage_size
+        self._backup_logs = backup_logs
+        self._chunk_delta = chunk_delta
+        self._incremental = incremental
+        self._full_backup_interval = full_backup_interval
+        self._retention = dict(retention or dict())
+        self._bandwidth_limit = bandwidth_limit
+        self._lag_backoff = lag_backoff
+        self._snapshot_lock = snapshot_lock
+        self._content_store = content_store
+        self._dedup = dedup and content_store is not None
+        self._dedup_min_size = dedup_min_size
+        self._journal = DirtyJournal(
+            os.path.join(os.path.abspath(self._backup_dir), JOURNAL_NAME)
+            ) if watch else None
+
+        os.makedirs(self._backup_dir, exist_ok=True)
+
+        # The catalog is created from the backup directory, if it does
+        # not exist yet. (E.g. after an update of the EMSM.)
+        self._catalog = BackupCatalog(
+            os.path.join(self._backup_dir, "catalog.json")
+            )
+        if self._catalog.exists():
+            self._catalog.load()
+        else:
+            self.rebuild_catalog()
+        return None
+
+    def app(self):
+        """
+        Returns that EMSM application that implicitly owns this object.
+        """
+        return self._app
+
+    def world(self):
+        """
+        Returns the world whichs backups are managed.
+        """
+        return self._world
+
+    def backup_dir(self):
+        """
+        Returns the backup directory.
+        """
+        return self._backup_dir
+
+    def storage(self):
+        """
+        Returns the :class:`BackupStorage`, the backups are stored in.
+        """
+        return self._storage
+
+    def with_storage(self, storage):
+        """
+        Returns a copy of this manager, which reads the backups from the
+        *storage*. The copy shares the catalog with this manager, so it
+        should only be used to restore backups.
+        """
+        bm = copy.copy(self)
+        bm._storage = storage
+        return bm
+
+    def catalog(self):
+        """
+        Returns the :class:`BackupCatalog` of the world.
+        """
+        return self._catalog
+
+    def content_store(self):
+        """
+        Returns the shared :class:`ContentStore` or ``None``.
+        """
+        return self._content_store
+
+    def dedup(self):
+        """
+        Returns ``True``, if large files are stored in the content store.
+        """
+        return self._dedup
+
+    def journal(self):
+        """
+        Returns the :class:`DirtyJournal` of the world or ``None``, if the
+        world is not watched.
+        """
+        return self._journal
+
+    def max_storage_size(self):
+        """
+        Returns the maximum number of backups that can be stored to the same
+        time. If this value is *0*, then there is no limit.
+        """
+        return self._max_storage_size
+
+    def backup_logs(self):
+        """
+        Returns the option to include the logs in the backup.
+        """
+        return self._backup_logs
+
+    def incremental(self):
+        """
+        Returns ``True`` if only the files, which changed since the previous
+        backup, are saved.
+        """
+        return self._incremental
+
+    def chunk_delta(self):
+        """
+        Returns ``True`` if region files are saved as chunk deltas of the
+        previous backup.
+        """
+        return self._chunk_delta
+
+    def full_backup_interval(self):
+        """
+        Returns the maximum number of delta backups between two full backups.
+        If this value is *0*, there is no limit.
+        """
+        return self._full_backup_interval
+
+    def retention(self):
+        """
+        Returns a dictionary, which maps the retention tiers (see
+        :data:`RETENTION_TIERS`) to the number of periods, which are kept.
+        """
+        return self._retention
+
+    def bandwidth_limit(self):
+        """
+        Returns the maximum number of bytes per second read while creating
+        a backup. *0* means no limit.
+        """
+        return self._bandwidth_limit
+
+    def lag_backoff(self):
+        """
+        Returns the number of seconds a backup is paused, when a world on
+        this host lags. *0* disables the back-off.
+        """
+        return self._lag_backoff
+
+    def _throttle(self):
+        """
+        Returns a new :class:`Throttle` for a backup or ``None``, if neither
+        a bandwidth limit nor the lag back-off is configured.
+        """
+        if self._bandwidth_limit <= 0 and self._lag_backoff <= 0:
+            return None
+
+        worlds = self._app.worlds().get_all() if self._lag_backoff > 0 \
+                 else list()
+        return Throttle(self._bandwidth_limit, worlds, self._lag_backoff)
+
+    # We use the *filenames* to store the *timestamp* of a backup.
+
+    def _filename_format(self):
+        """
+        Returns a string that can be formatted with *datetime.strftime()*.
+
+        Example:
+            >>> now = datetime.datetime.now()
+            >>> fmt = bm.filename_format()
+            >>> fmt
+            %Y_%m_%d-%H_%M_%S-foobar
+            >>> now.strftime(fmt)
+            '2014_09_02-20_37_08-foobar'
+        """
+        filename_format = "%Y_%m_%d-%H_%M_%S-{}".format(self._world.name())
+        return filename_format
+
+    def _date_from_filename(self, path):
+        """
+        Extracts the timestamp from the filename and returns the corresponding
+        ``datetime.datetime`` instance.
+
+        See also:
+            * filename_format()
+        """
+        # Extract the filename and remove any extensions.
+        path = os.path.basename(path)
+        filename = path[:path.find(".")]
+
+        # Extract the datetime.
+        try:
+            return datetime.datetime.strptime(filename, self._filename_format())
+        except ValueError as err:
+            return None
+
+    def _create_filename(self, date):
+        """
+        Creates the filename (without extensions) for the backup that has
+        been created at the datetime *date*.
+        """
+        filename = date.strftime(self._filename_format())
+        return filename
+
+    def rebuild_catalog(self):
+        """
+        Recreates the catalog from the backups in the storage. The
+        information, which is not available in the storage (like the
+        duration of the backup) is lost.
+        """
+        self._catalog.clear()
+        for filename, size in sorted(self._storage.list().items()):
+            if filename.endswith(MANIFEST_SUFFIX):
+                continue
+
+            date = self._date_from_filename(filename)
+            if date is None:
+                continue
+
+            record = {
+                "filename": filename,
+                "timestamp": time.mktime(date.timetuple()),
+                "size": size,
+                "format": None,
+                "file_count": None,
+                "duration": None,
+                "checksum": None,
+                "parent": None
+                }
+
+            # The manifest knows some more things about the backup.
+            manifest = load_manifest(self._storage, filename)
+            if manifest is not None:
+                algorithm = manifest["algorithm"]
+                record["format"] = manifest["format"]
+                record["file_count"] = len(manifest.get("files", manifest["members"]))
+                record["parent"] = manifest.get("parent")
+                record["checksum"] = "{}:{}".format(
+                    algorithm, manifest["archive"][algorithm]
+                    )
+            else:
+                for archive_format, ext in _ARCHIVE_EXTENSIONS.items():
+                    if filename.endswith(ext):
+                        record["format"] = archive_format
+
+            self._catalog.add(record)
+
+        self._catalog.save()
+        return None
+
+    def _record_date(self, record):
+        """
+        Returns the creation date of the backup described by the catalog
+        *record*.
+        """
+        return datetime.datetime.fromtimestamp(record["timestamp"])
+
+    def backup_list(self):
+        """
+        Returns a dictionary that maps the creation date of the backup to
+        the name of the backup in the storage.
+        """
+        backups = {self._record_date(record): record["filename"] \
+                   for record in self._catalog.records()}
+        return backups
+
+    def latest_backup(self):
+        """
+        Returns a two tuple, that contains the date and the name of the latest
+        available backup. If no backup is available, ``(None, None)`` is
+        returned.
+
+        See also:
+            * backup_list()
+        """
+        record = self._catalog.latest()
+        if record is not None:
+            return (self._record_date(record), record["filename"])
+        else:
+            return (None, None)
+
+    def _remove_backup(self, record):
+        """
+        Removes the backup described by the catalog *record* and its
+        manifest. The catalog is not saved.
+        """
+        self._storage.remove(record["filename"])
+        self._storage.remove(manifest_name(record["filename"]))
+        self._catalog.remove(record["filename"])
+        return None
+
+    def retention_plan(self):
+        """
+        Decides which backups are kept and returns a list of two tuples
+        ``(record, reasons)``, sorted from the newest to the oldest backup.
+        *reasons* is the list of the rules, which keep the backup. If it is
+        empty, the backup can be removed.
+
+        If no retention tier is configured, the newest *max_storage_size*
+        backups are kept. Otherwise, a backup is kept, if it is the newest
+        backup of one of the last *n* hours, days, weeks or months of a
+        tier, or if it is one of the newest *max_storage_size* backups.
+        The parents of kept delta backups are always kept.
+
+        See also:
+            * max_storage_size()
+            * retention()
+        """
+        tiers = [(name, period, self._retention.get(name, 0)) \
+                 for name, period in RETENTION_TIERS \
+                 if self._retention.get(name, 0) > 0]
+
+        # Without any limit, all backups are kept.
+        if not tiers and self._max_storage_size <= 0:
+            return [(record, ["no limit"]) \
+                    for record in reversed(self._catalog.records())]
+
+        # The newest period seen per tier and the number of periods.
+        last_period = dict()
+        period_count = dict()
+
+        plan = list()
+        for i, record in enumerate(reversed(self._catalog.records())):
+            reasons = list()
+            if i < self._max_storage_size:
+                reasons.append("latest {}/{}".format(
+                    i + 1, self._max_storage_size
+                    ))
+
+            date = self._record_date(record)
+            for name, period, count in tiers:
+                key = date.strftime(period)
+                if key == last_period.get(name):
+                    continue
+                last_period[name] = key
+                period_count[name] = period_count.get(name, 0) + 1
+                if period_count[name] <= count:
+                    reasons.append("{} {}/{}".format(
+                        name, period_count[name], count
+                        ))
+            plan.append((record, reasons))
+
+        # Delta backups need their parents, so we keep them too.
+        kept = dict()
+        for record, reasons in plan:
+            if reasons:
+                for filename in self._catalog.chain(record["filename"])[1:]:
+                    kept.setdefault(filename, record["filename"])
+        for record, reasons in plan:
+            if not reasons and record["filename"] in kept:
+                reasons.append("parent of {}".format(kept[record["filename"]]))
+        return plan
+
+    def clean_backup_dir(self):
+        """
+        Removes old backups that are no longer needed and returns the
+        retention plan (see :meth:`retention_plan`).
+
+        See also:
+            * max_storage_size()
+            * retention()
+        """
+        plan = self.retention_plan()
+        for record, reasons in plan:
+            if not reasons:
+                self._remove_backup(record)
+        self._catalog.save()
+        self._update_content_refs()
+
+        # Remove the backups, which could not be created successfully.
+        self._storage.cleanup()
+        return plan
+
+    def _update_content_refs(self):
+        """
+        Replaces the references of the world in the content store with the
+        objects, which are referenced by the remaining backups. The objects
+        are not removed here, since other worlds may still need them (see
+        :meth:`ContentStore.collect_garbage`).
+        """
+        if self._content_store is None:
+            return None
+
+        digests = set()
+        for record in self._catalog.records():
+            manifest = load_manifest(self._storage, record["filename"])
+            if manifest is not None:
+                digests.update(content_refs(manifest))
+        self._content_store.set_refs(self._world.name(), digests)
+        return None
+
+    def _parent_backup(self):
+        """
+        Returns a two tuple with the name and the manifest of the backup,
+        the next backup should be a delta of. If the next backup should be
+        a full backup, ``(None, None)`` is returned.
+
+        See also:
+            * incremental()
+            * chunk_delta()
+            * full_backup_interval()
+        """
+        record = self._catalog.latest()
+        if not (self._incremental or self._chunk_delta) or record is None:
+            return (None, None)
+
+        # Start a new chain, if the current one is long enough.
+        chain = self._catalog.chain(record["filename"])
+        if self._full_backup_interval \
+           and len(chain) > self._full_backup_interval:
+            return (None, None)
+
+        manifest = load_manifest(self._storage, record["filename"])
+        if manifest is None or not "files" in manifest:
+            return (None, None)
+        return (record["filename"], manifest)
+
+    def _is_excluded(self, name):
+        """
+        Returns ``True``, if the file *name* (``world/...``) is not part of
+        the backups, e.g. the logs, if *backup_logs* is disabled.
+        """
+        parts = os.path.normpath(name).split(os.sep)
+        return not self._backup_logs and "logs" in parts[1:]
+
+    def _scan_world(self, backup_dir):
+        """
+        Walks through the whole world directory, creates its directory
+        structure in *backup_dir/world* and returns the list of all files
+        (``world/...``), which are part of the backup.
+        """
+        world_dir = self._world.directory()
+        names = list()
+        for dirpath, dirnames, filenames in os.walk(world_dir):
+            rel_dir = os.path.relpath(dirpath, world_dir)
+            os.makedirs(
+                os.path.normpath(os.path.join(backup_dir, "world", rel_dir)),
+                exist_ok=True
+                )
+            for filename in dirnames + filenames:
+                name = os.path.normpath(os.path.join("world", rel_dir, filename))
+                if self._is_excluded(name):
+                    if filename in dirnames:
+                        dirnames.remove(filename)
+                elif filename in filenames:
+                    names.append(name)
+        return names
+
+    def _scan_dirty(self, parent_files, dirty):
+        """
+        Returns the list of the files (``world/...``), which have to be
+        checked, because they have been changed, created or deleted since
+        the parent backup. *dirty* is the set of the changed paths in the
+        world directory (see :class:`DirtyJournal`) and *parent_files* the
+        world state of the parent backup.
+
+        The content of a changed directory is checked completely, since the
+        directory may have been moved.
+        """
+        world_dir = self._world.directory()
+        dirty = set(os.path.normpath(os.path.join("world", path)) \
+                    for path in dirty)
+
+        names = set()
+        for name in dirty:
+            path = self._world_member_path(name)
+            if os.path.isdir(path):
+                for dirpath, dirnames, filenames in os.walk(path):
+                    rel_dir = os.path.relpath(dirpath, world_dir)
+                    for filename in filenames:
+                        names.add(os.path.normpath(
+                            os.path.join("world", rel_dir, filename)
+                            ))
+            else:
+                names.add(name)
+
+        # A file of the parent backup has to be checked too, if one of its
+        # parent directories changed (e.g. it has been removed).
+        for name in parent_files:
+            parts = name.split(os.sep)
+            for i in range(2, len(parts)):
+                if os.sep.join(parts[:i]) in dirty:
+                    names.add(name)
+                    break
+        return sorted(name for name in names if not self._is_excluded(name))
+
+    def _copy_world(self, backup_dir, parent=None, throttle=None, dirty=None):
+        """
+        Copies the world data into *backup_dir/world* and returns the state of
+        all copied files (see :meth:`_save_world`).
+
+        If *parent* is the manifest of the previous backup, files, which did
+        not change since then, are skipped in incremental backups and only
+        the changed chunks of the region files are copied, if *chunk_delta*
+        is enabled. The files are read through the *throttle*, if given.
+
+        If *dirty* is the set of the paths, which changed since the parent
+        backup, only these files are checked in incremental backups. All
+        other files are taken from the *parent* without touching them.
+        """
+        parent_files = parent["files"] if parent is not None else dict()
+
+        files = dict()
+        if self._incremental and parent is not None and dirty is not None:
+            names = self._scan_dirty(parent_files, dirty)
+            log.info("checking {} changed paths of the world '{}'."\
+                     .format(len(names), self._world.name()))
+
+            # The files, which have not been touched since the parent backup.
+            checked = set(names)
+            for name, parent_state in parent_files.items():
+                if name in checked or self._is_excluded(name):
+                    continue
+                state = {
+                    "size": parent_state["size"],
+                    "mtime": parent_state["mtime"],
+                    "stored": None
+                    }
+                for key in ("mtime_ns", "chunks", MANIFEST_HASH):
+                    if key in parent_state:
+                        state[key] = parent_state[key]
+                files[name] = state
+        else:
+            if self._incremental and parent is not None \
+               and self._journal is not None:
+                log.info("the journal of the world '{}' is incomplete, "\
+                         "scanning the whole world.".format(self._world.name()))
+            names = self._scan_world(backup_dir)
+
+        for name in names:
+            src = self._world_member_path(name)
+            dst = os.path.join(backup_dir, name)
+            try:
+                stat = os.stat(src)
+            except FileNotFoundError:
+                continue
+            if not os.path.isfile(src):
+                continue
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+            state = {
+                "size": stat.st_size,
+                "mtime": int(stat.st_mtime),
+                "mtime_ns": stat.st_mtime_ns
+                }
+            files[name] = state
+            parent_state = parent_files.get(name, dict())
+
+            # Unchanged files are only recorded in incremental backups.
+            if self._incremental and file_unchanged(parent_state, state):
+                state["stored"] = None
+                for key in ("chunks", MANIFEST_HASH):
+                    if key in parent_state:
+                        state[key] = parent_state[key]
+                continue
+
+            # Region files are saved as chunk delta, if the region
+            # has already been part of the previous backup.
+            if is_region_file(name):
+                try:
+                    if self._chunk_delta and "chunks" in parent_state:
+                        chunks, written = write_chunk_delta(
+                            src, dst + CHUNK_DELTA_SUFFIX,
+                            parent_state["chunks"]
+                            )
+                        state["chunks"] = chunks
+                        state["stored"] = "chunks" if written else None
+                        if not written:
+                            state[MANIFEST_HASH] = parent_state.get(MANIFEST_HASH)
+                        continue
+
+                    with RegionFile(src) as region:
+                        state["chunks"] = region.chunk_timestamps()
+                except ValueError:
+                    # This is not a valid region file (yet), so we
+                    # copy it as it is.
+                    pass
+
+            copy_file(src, dst, throttle)
+            state["stored"] = "full"
+        return files
+
+    def _read_journal(self, parent=None):
+        """
+        Starts a new journal for the next backup and returns a two tuple
+        with the set of the paths, which changed since the *parent* backup,
+        and the token of the new journal (see :class:`DirtyJournal`).
+
+        The set is ``None``, if the journal is incomplete, e.g. because the
+        watcher was not running all the time.
+        """
+        if self._journal is None:
+            return (None, None)
+
+        synced = self._journal.sync(self._world.directory())
+        try:
+            dirty, token = self._journal.rotate(
+                parent.get("journal") if parent is not None else None
+                )
+        except OSError as err:
+            log.warning("could not read the journal of the world '{}': {}"\
+                        .format(self._world.name(), err))
+            return (None, None)
+        return (dirty if synced else None, token)
+
+    def start_watcher(self):
+        """
+        Starts the watcher process of the world (see :func:`watch_world`),
+        if it is not running yet, and returns its pid. If the world is not
+        watched, ``None`` is returned.
+
+        The watcher runs in its own session, so that it outlives the EMSM.
+        It stops, when the world directory is removed (e.g. by a restore).
+        """
+        if self._journal is None:
+            return None
+
+        pid = self._journal.watcher_pid()
+        if pid is not None:
+            return pid
+
+        # The watcher needs the same modules as this process. This file is
+        # not run as script, since the plugin directory must not shadow the
+        # *emsm* package.
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(path for path in sys.path if path)
+        code = "import runpy; runpy.run_path({!r}, run_name='__main__')"\
+               .format(os.path.abspath(__file__))
+
+        process = subprocess.Popen(
+            [sys.executable, "-c", code, "--watch",
+             self._world.directory(), self._journal.path()],
+            stdin = subprocess.DEVNULL,
+            stdout = subprocess.DEVNULL,
+            stderr = subprocess.DEVNULL,
+            env = env,
+            start_new_session = True
+            )
+        log.info("started the watcher of the world '{}' (pid {})."\
+                 .format(self._world.name(), process.pid))
+        return process.pid
+
+    def _save_world(self, backup_dir, parent=None, throttle=None):
+        """
+        Copies the world directory (world data) into the backup directory:
+
+            EMSM_ROOT/worlds/foo -> backup_dir/world
+
+        If *parent* is the manifest of the previous backup, the region files
+        are only saved as chunk deltas.
+
+        Returns a two tuple. The first item is a dictionary with the state
+        of the world. It maps the name of each file in the backup to its
+        *size*, *mtime*, the *chunks* timestamps (region files only) and the
+        way it has been *stored* (``"full"``, ``"chunks"`` or ``None``, if
+        it did not change). The second item is the token of the journal,
+        which records the changes after the backup (see :meth:`_read_journal`).
+
+        If the world is online and a *snapshot_lock* has been given to the
+        manager, the lock is held while the world is copied. This limits the
+        number of worlds, which have auto-save disabled at the same time.
+        The files of an offline world are read through the *throttle*.
+        """
+        lock = self._snapshot_lock if self._world.is_online() else None
+        if lock is not None:
+            lock.acquire()
+        try:
+            # We need to disable the auto-save for the backup. I'm paranoid,
+            # so I'disable auto-save in this try-catch construct.
+            if self._world.is_online():
+                self._world.send_command("save-off")
+                try:
+                    # Wait until the world data has been written to the
+                    # disk, before we copy it.
+                    duration = self._world.save(timeout=30)
+                    log.info("saved the world '{}' in {:.1f}s."\
+                             .format(self._world.name(), duration))
+                except emsm.core.worlds.WorldCommandTimeout as err:
+                    log.warning(err)
+
+            # The journal contains all changes up to now, since the world
+            # has been saved.
+            dirty, token = self._read_journal(parent)
+
+            # Copy the world data to *backup_dir*. The auto-save of an
+            # online world is disabled and the snapshot lock is held, so
+            # the copy must not be paused or rate limited. The throttle
+            # applies only to the archive, which is written after save-on.
+            if self._world.is_online():
+                throttle = None
+            files = self._copy_world(backup_dir, parent, throttle, dirty)
+        finally:
+            if self._world.is_online():
+                self._world.send_command("save-on")
+                self._world.send_command("save-all")
+            if lock is not None:
+                lock.release()
+        return (files, token)
+
+    def _store_content(self, backup_dir, files):
+        """
+        Moves the files in *backup_dir*, which have been saved completely and
+        are at least *dedup_min_size* bytes large, into the content store.
+        They are marked as stored ``"content"`` in the world state *files*
+        (see :meth:`_save_world`).
+
+        Returns the set of the referenced objects.
+        """
+        digests = set()
+        for name, state in sorted(files.items()):
+            if state["stored"] != "full" \
+               or state["size"] < self._dedup_min_size:
+                continue
+
+            path = os.path.join(backup_dir, name)
+            digest = file_hash(path, MANIFEST_HASH)
+            self._content_store.put(path, digest)
+            state["mode"] = os.stat(path).st_mode & 0o7777
+            os.remove(path)
+
+            state["stored"] = "content"
+            state[MANIFEST_HASH] = digest
+            digests.add(digest)
+        return digests
+
+    def _fetch_content(self, manifest, target_dir=None, names=None):
+        """
+        Copies the files of the backup with the *manifest*, which are stored
+        in the content store, into *target_dir* or, if *target_dir* is
+        ``None``, directly into the world directory. If *names* is given,
+        only these files are copied.
+
+        If the content store is on a local file system, which supports
+        reflinks, the files share their data with the objects in the store
+        (see :func:`clone_file`). We don't use hard links, since the server
+        modifies the region files in place, which would change the objects.
+
+        :raises ValueError:
+            if the backup needs the content store, but no store is
+            available.
+        """
+        for name, state in sorted(manifest.get("files", dict()).items()):
+            if state.get("stored") != "content" \
+               or (names is not None and not name in names):
+                continue
+            if self._content_store is None:
+                raise ValueError("the file '{}' is in the content store, "\
+                                 "but no content store is available."\
+                                 .format(name))
+
+            if target_dir is None:
+                dst = self._world_member_path(name)
+            else:
+                dst = os.path.join(target_dir, name)
+
+            storage = self._content_store.storage()
+            if isinstance(storage, LocalStorage):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                clone_file(storage.path(state[MANIFEST_HASH]), dst + ".tmp")
+                if state.get("mode") is not None:
+                    os.chmod(dst + ".tmp", state["mode"])
+                os.utime(dst + ".tmp", (state["mtime"], state["mtime"]))
+                os.replace(dst + ".tmp", dst)
+                continue
+
+            with self._content_store.open_read(state[MANIFEST_HASH]) as src:
+                self._extract_member(
+                    src, dst, state["size"], state.get("mode"), state["mtime"]
+                    )
+        return None
+
+    def _staging_dir(self):
+        """
+        Creates a new, empty directory for a restore and returns its path.
+
+        The directory is placed next to the world directory, so that it is
+        on the same filesystem and we can *rename* the restored data
+        into place.
+        """
+        staging_dir = tempfile.mkdtemp(
+            prefix = ".restore-{}-".format(self._world.name()),
+            dir = os.path.dirname(self._world.directory())
+            )
+        return staging_dir
+
+    def _restore_world(self, backup_dir):
+        """
+        Replaces the EMSM world folder with the world directory of the
+        backup in *backup_dir* using two *rename* calls. *backup_dir* must be
+        on the same filesystem as the world folder (see :meth:`_staging_dir`).
+
+        The old world folder is moved to *backup_dir/world.old*, so that it
+        can be removed after the world is back online.
+
+        Exceptions:
+            * WorldIsOnlineError
+
+        See also:
+            * _save_world()
+        """
+        # Break if the world is currently online.
+        if self._world.is_online():
+            raise emsm.core.worlds.WorldIsOnlineError(self._world)
+
+        world_dir = self._world.directory()
+        old_dir = os.path.join(backup_dir, "world.old")
+
+        # Note, that *rename* works fine, even if the server left some
+        # files open (e.g. server.log.lck).
+        if os.path.exists(world_dir):
+            os.rename(world_dir, old_dir)
+        try:
+            os.rename(os.path.join(backup_dir, "world"), world_dir)
+        except OSError:
+            # Move the old world back, so that we don't lose anything.
+            if os.path.exists(old_dir):
+                os.rename(old_dir, world_dir)
+            raise
+        return None
+
+    def _save_world_conf(self, backup_dir):
+        """
+        Saves the configuration of the world in *backup_dir/conf/world.json*.
+        """
+        world_conf_backup_path = os.path.join(backup_dir, "world_conf.json")
         with open(world_conf_backup_path, "w") as file:
             conf = dict(self._world.conf())
             json.dump([self._world.name(), conf], file)
         return None
 
+    def _save_deleted_files(self, backup_dir, deleted):
+        """
+        Saves the list with the names of the *deleted* files in
+        *backup_dir/deleted.json*, so that an incremental backup can also
+        be replayed without its manifest.
+        """
+        path = os.path.join(backup_dir, DELETED_FILES_NAME)
+        with open(path, "w") as file:
+            json.dump(deleted, file)
+        return None
+
     def _restore_world_conf(self, backup_dir):
         """
-        If the backup at *backup_dir* includes the world configuration, it
-        will be restored. If not, nothing happens.
+        If the backup at *backup_dir* includes the world configuration, it
+        will be restored. If not, nothing happens.
+        """
+        world_conf_backup_path = os.path.join(backup_dir, "world_conf.json")
+
+        # Load the configuration backup.
+        with open(world_conf_backup_path) as file:
+            _, backup_conf = json.load(file)
+
+        # Restore the configuration.
+        #
+        # Todo:
+        #   * restore the *port* option?
+        conf = self._world.conf()
+        conf.clear()
+        conf.update(backup_conf)
+        return None
+
+    def create(self, archive_format):
+        """
+        Creates a backup of the world and returns the name of the created
+        backup archive.
+
+        Parameters:
+            * archive_format
+                A string in shutil.get_archive_formats() that defines the
+                compression type.
+
+        Exceptions:
+            * ...
+        """
+        start_time = time.time()
+        parent_name, parent = self._parent_backup()
+        throttle = self._throttle()
+        with tempfile.TemporaryDirectory() as tmp_data_dir:
+
+            # Copy all stuff that should be included into the backup in the
+            # temporary directory.
+            files, journal_token = self._save_world(
+                tmp_data_dir, parent, throttle
+                )
+            self._save_world_conf(tmp_data_dir)
+
+            deleted = sorted(set(parent["files"]) - set(files)) \
+                      if parent else list()
+            if parent is not None:
+                self._save_deleted_files(tmp_data_dir, deleted)
+
+            # Large files are stored only once in the content store. They
+            # are referenced, before the backup is committed, so that the
+            # garbage collection never removes them.
+            if self._dedup:
+                digests = self._store_content(tmp_data_dir, files)
+                self._content_store.add_refs(self._world.name(), digests)
+
+            # The backup is streamed directly into the storage, e.g.:
+            #   EMSM_ROOT/plugins_data/backups/foo/
+            #
+            # The storage writes the backup to a temporary object, so
+            # that when something goes wrong, no corrupted backup will be
+            # stored.
+            # When the archive is complete, the storage commits it. The
+            # manifest is written afterwards, so that it never describes
+            # an archive, which has not been committed.
+            date = datetime.datetime.now().replace(microsecond=0)
+            backup_name = self._create_filename(date) \
+                          + _ARCHIVE_EXTENSIONS[archive_format]
+
+            with self._storage.open_write(backup_name) as upload:
+                writer = HashingWriter(upload)
+                archive = ArchiveWriter(
+                    writer, archive_format, throttle=throttle
+                    )
+                archive.add_tree(tmp_data_dir)
+                archive.close()
+
+                # Complete the world state with the hash sums of the files,
+                # which have been stored completely.
+                members = archive.members()
+                for name, state in files.items():
+                    if state["stored"] == "full":
+                        state[MANIFEST_HASH] = members[name][MANIFEST_HASH]
+
+                manifest = {
+                    "version": 1,
+                    "algorithm": MANIFEST_HASH,
+                    "world": self._world.name(),
+                    "date": date.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "format": archive_format,
+                    "parent": parent_name,
+                    "archive": {
+                        "size": writer.tell(),
+                        MANIFEST_HASH: writer.hexdigest()
+                        },
+                    "members": members,
+                    "files": files,
+                    "deleted": deleted,
+                    "journal": journal_token
+                    }
+
+            try:
+                self._write_manifest(backup_name, manifest)
+            except Exception:
+                self._storage.remove(backup_name)
+                raise
+
+        # Register the new backup in the catalog.
+        self._catalog.add({
+            "filename": backup_name,
+            "timestamp": time.mktime(date.timetuple()),
+            "size": manifest["archive"]["size"],
+            "format": archive_format,
+            "file_count": len(files),
+            "duration": time.time() - start_time,
+            "checksum": "{}:{}".format(
+                MANIFEST_HASH, manifest["archive"][MANIFEST_HASH]
+                ),
+            "parent": manifest["parent"]
+            })
+        self._catalog.save()
+
+        self.clean_backup_dir()
+        return None
+
+    def _write_manifest(self, backup_name, manifest):
+        """
+        Saves the *manifest* of the backup *backup_name* in its sidecar
+        file.
+        """
+        with self._storage.open_write(manifest_name(backup_name)) as file:
+            file.write(json.dumps(manifest).encode())
+        return None
+
+    def verify(self, executor):
+        """
+        Submits the verification of each backup to the *executor*, which is
+        usually a process pool, and returns a list with the three tuples
+        *(date, name, future)*, starting with the latest backup. The result
+        of each future is the list returned by :func:`verify_backup`.
+        """
+        backups = list(self.backup_list().items())
+        backups.sort(reverse=True)
+
+        objects = self._content_store.objects() \
+                  if self._content_store is not None else None
+        jobs = [(date, name, executor.submit(
+                    verify_backup, self._storage, name, objects,
+                    self._content_store
+                    )) \
+                for date, name in backups]
+        return jobs
+
+    def diff(self, old_name, new_name, new_storage=None):
+        """
+        Compares the backups *old_name* and *new_name* and returns the list
+        of the changed files (see :func:`diff_manifests`). If given, the
+        backup *new_name* is loaded from *new_storage*.
+
+        Only the manifests are compared, so the archives are never
+        decompressed.
+
+        :raises ValueError:
+            if one of the backups has no manifest.
+        """
+        old = load_manifest(self._storage, old_name)
+        new = load_manifest(new_storage or self._storage, new_name)
+        for name, manifest in ((old_name, old), (new_name, new)):
+            if manifest is None:
+                raise ValueError("the backup '{}' has no manifest."\
+                                 .format(name))
+        return diff_manifests(old, new)
+
+    def select_members(self, backup_name, patterns):
+        """
+        Returns the sorted list with the names of all world files in the
+        backup *backup_name*, which match at least one of the glob
+        *patterns*. The patterns are relative to the world directory,
+        e.g. ``region/r.0.0.mca`` or ``playerdata``.
+        """
+        manifest = load_manifest(self._storage, backup_name)
+        if manifest is not None:
+            names = list(manifest.get("files", manifest["members"]))
+        else:
+            archive_format = self._archive_format_of(backup_name)
+            with self._storage.open_read(backup_name) as file:
+                names = [name for name, member \
+                         in _iter_members(file, archive_format)]
+
+        selected = list()
+        for name in names:
+            if not name.startswith("world" + os.sep):
+                continue
+            rel_name = name[len("world" + os.sep):]
+            for pattern in patterns:
+                pattern = os.path.normpath(pattern)
+                if fnmatch.fnmatch(rel_name, pattern) \
+                   or fnmatch.fnmatch(rel_name, os.path.join(pattern, "*")):
+                    selected.append(name)
+                    break
+        selected.sort()
+        return selected
+
+    def _archive_format_of(self, backup_name):
+        """
+        Returns the archive format of *backup_name*, guessed from the file
+        extension.
+        """
+        for archive_format, ext in _ARCHIVE_EXTENSIONS.items():
+            if backup_name.endswith(ext) and archive_format != "tar":
+                return archive_format
+        with self._storage.open_read(backup_name) as file:
+            return "zip" if zipfile.is_zipfile(file) else "tar"
+
+    def _world_member_path(self, name):
+        """
+        Returns the path in the world directory for the archive member
+        *name* (``world/...``).
+
+        :raises ValueError:
+            if the member would be written outside of the world directory.
+        """
+        rel_name = os.path.relpath(os.path.normpath(name), "world")
+        if os.path.isabs(rel_name) or rel_name.startswith(os.pardir):
+            raise ValueError("invalid member name '{}'".format(name))
+        return os.path.join(self._world.directory(), rel_name)
+
+    def _extract_member(self, src, dst, size, mode=None, mtime=None):
+        """
+        Copies *size* bytes from the file object *src* into the file *dst*.
+        The file is written to a temporary name first and replaced atomically.
+        """
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with open(dst + ".tmp", "wb") as file:
+            while size > 0:
+                chunk = src.read(min(size, CHUNK_SIZE))
+                if not chunk:
+                    raise EOFError("unexpected end of the archive")
+                file.write(chunk)
+                size -= len(chunk)
+        if mode is not None:
+            os.chmod(dst + ".tmp", mode)
+        if mtime is not None:
+            os.utime(dst + ".tmp", (mtime, mtime))
+        os.replace(dst + ".tmp", dst)
+        return None
+
+    def _extract_members(self, backup_name, names):
+        """
+        Extracts the members *names* of the backup *backup_name* directly
+        into the world directory.
+
+        *zip* members are looked up in the central directory. For
+        uncompressed tar archives, the offsets in the manifest are used, so
+        that we can seek directly to the member's data. Compressed tar
+        archives and archives without offsets (older backups) are scanned
+        until all members have been found.
+        """
+        manifest = load_manifest(self._storage, backup_name)
+        if manifest is not None:
+            archive_format = manifest["format"]
+            members = manifest["members"]
+
+            # The files in the content store are not part of the archive.
+            content_names = [name for name in names if not name in members]
+            if content_names:
+                self._fetch_content(manifest, names=set(content_names))
+                names = [name for name in names if name in members]
+        else:
+            archive_format = self._archive_format_of(backup_name)
+            members = dict()
+
+        file = self._storage.open_read(backup_name)
+        try:
+            self._extract_members_from(file, archive_format, members, names)
+        finally:
+            file.close()
+        return None
+
+    def _extract_members_from(self, file, archive_format, members, names):
+        """
+        Extracts the members *names* from the archive in the file object
+        *file* (see :meth:`_extract_members`). *members* are the members
+        in the manifest of the archive.
+        """
+        if archive_format == "zip":
+            with zipfile.ZipFile(file) as archive:
+                for name in names:
+                    info = archive.getinfo(name.replace(os.sep, "/"))
+                    record = members.get(name, dict())
+                    with archive.open(info) as src:
+                        self._extract_member(
+                            src, self._world_member_path(name), info.file_size,
+                            record.get("mode"), record.get("mtime")
+                            )
+        elif not _TAR_COMPRESSION[archive_format] \
+             and all("offset" in members.get(name, dict()) for name in names):
+            # Seeking in a compressed stream would decompress everything
+            # before the member, so only plain tar archives are seeked.
+            names = sorted(names, key=lambda name: members[name]["offset"])
+            for name in names:
+                record = members[name]
+                file.seek(record["offset"])
+                self._extract_member(
+                    file, self._world_member_path(name), record["size"],
+                    record["mode"], record["mtime"]
+                    )
+        else:
+            names = set(names)
+            with tarfile.open(fileobj=file, mode="r|*") as archive:
+                for info in archive:
+                    name = os.path.normpath(info.name)
+                    if name in names and info.isreg():
+                        self._extract_member(
+                            archive.extractfile(info),
+                            self._world_member_path(info.name), info.size,
+                            info.mode, info.mtime
+                            )
+                        names.remove(name)
+
+                    # Stop decompressing, once all members are found.
+                    if not names:
+                        break
+        return None
+
+    def _backup_chain(self, backup_name):
+        """
+        Returns the list with the names of all backups, which are needed to
+        restore *backup_name*. The list starts with the full backup and ends
+        with *backup_name*.
+
+        :raises ValueError:
+            if a parent backup is missing.
+        """
+        chain = [backup_name]
+        manifest = load_manifest(self._storage, backup_name)
+        while manifest is not None and manifest.get("parent"):
+            parent = manifest["parent"]
+            if parent in chain or not self._storage.exists(parent):
+                raise ValueError("the parent backup '{}' of '{}' is missing"\
+                                 .format(parent, chain[0]))
+            chain.insert(0, parent)
+            manifest = load_manifest(self._storage, parent)
+        return chain
+
+    def _unpack_archive(self, backup_name, extract_dir):
+        """
+        Extracts the archive *backup_name* from the storage into
+        *extract_dir*.
+        """
+        manifest = load_manifest(self._storage, backup_name)
+        if manifest is not None:
+            archive_format = manifest["format"]
+        else:
+            archive_format = self._archive_format_of(backup_name)
+
+        with self._storage.open_read(backup_name) as file:
+            unpack_archive(file, archive_format, extract_dir)
+        if manifest is not None:
+            self._fetch_content(manifest, extract_dir)
+        return None
+
+    def _apply_delta_backup(self, backup_name, target_dir):
+        """
+        Applies the delta backup *backup_name* to the backup, which has
+        already been unpacked into *target_dir*: Files are replaced,
+        chunk deltas are applied to the region files and deleted files are
+        removed.
         """
-        world_conf_backup_path = os.path.join(backup_dir, "world_conf.json")
+        manifest = load_manifest(self._storage, backup_name)
 
-        # Load the configuration backup.
-        with open(world_conf_backup_path) as file:
-            _, backup_conf = json.load(file)
+        delta_dir = tempfile.mkdtemp(prefix=".delta-", dir=target_dir)
+        try:
+            self._unpack_archive(backup_name, delta_dir)
+            for dirpath, dirnames, filenames in os.walk(delta_dir):
+                rel_dir = os.path.relpath(dirpath, delta_dir)
+                dst_dir = os.path.normpath(os.path.join(target_dir, rel_dir))
+                os.makedirs(dst_dir, exist_ok=True)
+
+                for filename in filenames:
+                    src = os.path.join(dirpath, filename)
+                    if rel_dir == os.curdir and filename == DELETED_FILES_NAME:
+                        continue
+                    elif filename.endswith(CHUNK_DELTA_SUFFIX):
+                        dst = os.path.join(
+                            dst_dir, filename[:-len(CHUNK_DELTA_SUFFIX)]
+                            )
+                        with open(src, "rb") as delta:
+                            apply_chunk_delta(delta, dst)
+                    else:
+                        os.replace(src, os.path.join(dst_dir, filename))
+        finally:
+            shutil.rmtree(delta_dir)
 
-        # Restore the configuration.
-        #
-        # Todo:
-        #   * restore the *port* option?
-        conf = self._world.conf()
-        conf.clear()
-        conf.update(backup_conf)
+        for name in manifest.get("deleted", list()):
+            path = os.path.join(target_dir, name)
+            if os.path.isfile(path):
+                os.remove(path)
         return None
 
-    def create(self, archive_format):
+    def _unpack(self, backup_name, target_dir):
         """
-        Creates a backup of the world and returns the name of the created
-        backup archive.
+        Unpacks the backup *backup_name* into *target_dir*. If it is a
+        delta backup, the full backup and all deltas up to *backup_name*
+        are applied in order.
+        """
+        chain = self._backup_chain(backup_name)
+        self._unpack_archive(chain[0], target_dir)
+        for path in chain[1:]:
+            self._apply_delta_backup(path, target_dir)
+        return None
 
-        Parameters:
-            * archive_format
-                A string in shutil.get_archive_formats() that defines the
-                compression type.
+    def restore_only(self, backup_name, patterns, message=str(), delay=0):
+        """
+        Restores only the files of the world, which match one of the glob
+        *patterns* (see :meth:`select_members`). The files are extracted
+        directly into the world directory, all other files are not touched.
+
+        Returns the list of the restored members.
 
         Exceptions:
-            * ...
+            * WorldStartFailed
+            * WorldStopFailed
         """
-        with tempfile.TemporaryDirectory() as tmp_data_dir:
-
-            # Copy all stuff that should be included into the backup in the
-            # temporary directory.
-            self._save_world(tmp_data_dir)
-            self._save_world_conf(tmp_data_dir)
+        # Look up the members, before we stop the world.
+        names = self.select_members(backup_name, patterns)
+        if not names:
+            return names
+
+        # Unlike the full restore, we stop the world smoothly, since all
+        # other data of the world is kept.
+        # The files of a delta backup must be rebuilt from the whole
+        # chain first.
+        staging_dir = None
+        if len(self._backup_chain(backup_name)) > 1:
+            staging_dir = self._staging_dir()
+        try:
+            if staging_dir is not None:
+                self._unpack(backup_name, staging_dir)
 
-            # Put all in an archive.
-            backup_filename = self._create_filename(datetime.datetime.now())
-            with tempfile.TemporaryDirectory() as tmp_archive_dir:
-
-                # *make_archive* returns the **complete** path to the crated
-                # archive.
-                backup_path = shutil.make_archive(
-                    base_name = os.path.join(tmp_archive_dir, backup_filename),
-                    format = archive_format,
-                    root_dir = tmp_data_dir,
-                    base_dir = "./"
-                    )
+            was_online = self._world.is_online()
+            if was_online:
+                self._world.stop(force_stop=True, message=message, delay=delay)
 
-                # Move the backup to our folder in *plugins_data_dir*:
-                #   EMSM_ROOT/plugins_data/backups/foo/
-                #
-                # We move the backup to a temporary filename, so that
-                # when something goes wrong, no corrupted backup will be
-                # stored.
-                # When the *move* was successful, we rename the file.
-                dst = os.path.join(
-                    self._backup_dir, os.path.basename(backup_path)
-                    )
-                shutil.move(src=backup_path, dst=dst + ".tmp")
-                os.rename(dst + ".tmp", dst)
+            if staging_dir is None:
+                self._extract_members(backup_name, names)
+            else:
+                for name in names:
+                    dst = self._world_member_path(name)
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    os.replace(os.path.join(staging_dir, name), dst)
 
-        self.clean_backup_dir()
-        return None
+            if was_online:
+                self._world.start()
+        finally:
+            if staging_dir is not None:
+                remove_tree_in_background(staging_dir)
+        return names
 
-    def restore(self, backup_file, message=str(), delay=0):
+    def restore(self, backup_name, message=str(), delay=0):
         """
-        Restores the backup of the world from the given *backup_file*. If
+        Restores the backup of the world from the given *backup_name*. If
         the backup archive contains the server executable it will be restored
         too if necessairy.
 
         Exceptions:
             * WorldStartFailed
             * WorldStopFailed
-            * ... shutil.unpack_archive() exceptions ...
-        """
-        # Extract the backup in a temporary directory and copy then all things
-        # into the EMSM directories.
-        with tempfile.TemporaryDirectory() as temp_dir:
-            shutil.unpack_archive(
-                filename = backup_file,
-                extract_dir = temp_dir
-                )
+            * ... unpack_archive() exceptions ...
+        """
+        # Extract the backup into a staging directory, while the world is
+        # still running. The world is only down for the two *renames*
+        # in *_restore_world()* and the restart.
+        staging_dir = self._staging_dir()
+        try:
+            self._unpack(backup_name, staging_dir)
 
             # Stop the world.
             was_online = self._world.is_online()
@@ -522,37 +3790,213 @@ class BackupManager(object):
                 self._world.kill_processes()
 
             # Restore the world.
-            self._restore_world(temp_dir)
-            self._restore_world_conf(temp_dir)
+            self._restore_world(staging_dir)
+            self._restore_world_conf(staging_dir)
 
-        # Restart the world if it was online before restoring.
-        if was_online:
-            self._world.start()
+            # Restart the world if it was online before restoring.
+            if was_online:
+                self._world.start()
+        finally:
+            # The staging directory contains now the old world data. We
+            # remove it, after the world is back online.
+            remove_tree_in_background(staging_dir)
         return None
 
+    def restore_as(self, backup_name, world_name):
+        """
+        Restores the backup *backup_name* into the new world *world_name*,
+        e.g. to clone a world for testing. The world configuration of the
+        backup is added to the *worlds.conf* under the new name. If the world
+        has a *server.properties* file, a free *server-port* (and
+        *rcon.port*) is assigned, so that the new world can run next to the
+        original one.
+
+        Returns the new *server-port* or ``None``.
+
+        :raises ValueError:
+            if the world already exists.
+        """
+        worlds_conf = self._app.conf().worlds()
+        world_dir = self._app.paths().world(world_name)
+        if worlds_conf.has_section(world_name) or os.path.exists(world_dir):
+            raise ValueError("the world '{}' already exists"\
+                             .format(world_name))
+
+        # The backup is extracted into a staging directory next to the new
+        # world directory, which is renamed, when the world is complete.
+        os.makedirs(os.path.dirname(world_dir), exist_ok=True)
+        staging_dir = tempfile.mkdtemp(
+            prefix = ".restore-{}-".format(world_name),
+            dir = os.path.dirname(world_dir)
+            )
+        try:
+            self._unpack(backup_name, staging_dir)
+            with open(os.path.join(staging_dir, "world_conf.json")) as file:
+                _, backup_conf = json.load(file)
+
+            port = None
+            properties = os.path.join(staging_dir, "world", "server.properties")
+            if os.path.isfile(properties):
+                # The new ports must not collide with any port of the
+                # other worlds, including their RCON and query ports.
+                used = set()
+                for world in self._app.worlds().get_all():
+                    used.add(world.address()[1])
+                    for address in (world.rcon_address(),
+                                    world.query_address()):
+                        if address is not None:
+                            used.add(address[1])
+                used.discard(None)
+                port = free_port(used)
+                rcon_port = free_port(used | {port}, port + 1)
+                set_server_properties(properties, {
+                    "server-port": port,
+                    "query.port": port,
+                    "rcon.port": rcon_port
+                    })
+
+            os.rename(os.path.join(staging_dir, "world"), world_dir)
+        finally:
+            shutil.rmtree(staging_dir)
+
+        worlds_conf.add_section(world_name)
+        worlds_conf[world_name].update(backup_conf)
+        return port
+
 
 class UiBackupManager(BackupManager):
+    """
+    Prints the progress and the results of the :class:`BackupManager`
+    methods. The output of :meth:`create` is written to *out* (default:
+    stdout), so that the backups of several worlds can run at once.
+    """
+
+    def __init__(self, *args, out=None, **kargs):
+        """
+        """
+        super().__init__(*args, **kargs)
+        self._out = out
+        return None
 
     def list(self):
         """
         Prints a list with all existing backups.
         """
-        backups = list(self.backup_list().items())
-        backups.sort(reverse=True)
+        records = self.catalog().records()
+        records.reverse()
 
         print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
-        if not backups:
+        if not records:
             print("\t", "- no backups found -")
         else:
-            for date, path in backups:
-                print("\t", "*", date.ctime())
+            for record in records:
+                details = [format_size(record["size"])]
+                if record["format"] is not None:
+                    details.append(record["format"])
+                if record["file_count"] is not None:
+                    details.append("{} files".format(record["file_count"]))
+                if record["duration"] is not None:
+                    details.append("{:.1f}s".format(record["duration"]))
+                # The backup may be incremental, a chunk delta or both,
+                # which is only recorded in its manifest.
+                if record.get("parent"):
+                    details.append("delta")
+
+                print("\t", "*", self._record_date(record).ctime(),
+                      "({})".format(", ".join(details)))
+                print("\t", " ", record["filename"])
+        return None
+
+    def watch(self):
+        """
+        Starts the watcher of the world, if necessary, and prints its pid.
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+        if self.journal() is None:
+            print("\t", "- watch is disabled -")
+            return None
+
+        try:
+            pid = self.start_watcher()
+        except OSError as err:
+            print("\t", termcolor.colored("error:", "red"),
+                  "could not start the watcher: {}".format(err))
+        else:
+            print("\t", "watcher is running (pid {})".format(pid))
+        return None
+
+    def prune(self, dry_run=False):
+        """
+        Removes the backups, which are no longer kept by the retention
+        policy and prints the decision for each backup. If *dry_run* is
+        true, nothing is removed.
+
+        This method corresponds to the command line arguments:
+
+            --prune [--dry-run]
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+
+        plan = self.retention_plan() if dry_run else self.clean_backup_dir()
+        if not plan:
+            print("\t", "- no backups found -")
+        for record, reasons in plan:
+            if reasons:
+                print("\t", termcolor.colored("keep  ", "green"),
+                      self._record_date(record).ctime(),
+                      "({})".format(", ".join(reasons)))
+            else:
+                print("\t", termcolor.colored("remove", "red"),
+                      self._record_date(record).ctime())
+        return None
+
+    def usage(self, content_usage):
+        """
+        Prints the storage used by the backups of the world. *content_usage*
+        is the result of :meth:`ContentStore.usage`.
+
+        The *unique* bytes are only used by this world: the archives and
+        the objects in the content store, no other world references. The
+        *shared* bytes are the objects, which are also referenced by other
+        worlds.
+
+        This method corresponds to the command line argument:
+
+            --usage
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+
+        records = self.catalog().records()
+        archives = sum(record["size"] for record in records)
+        unique, shared = content_usage.get(self.world().name(), (0, 0))
+
+        print("\t", "backups:", len(records))
+        print("\t", "unique: ", format_size(archives + unique),
+              "(archives {}, content {})".format(
+                  format_size(archives), format_size(unique)
+                  ))
+        print("\t", "shared: ", format_size(shared))
+        return None
+
+    def recover_catalog(self):
+        """
+        This method corresponds to the command line argument:
+
+            --rebuild-catalog
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+
+        self.rebuild_catalog()
+        print("\t", "done. ({} backups found)"\
+              .format(len(self.catalog().records())))
         return None
 
     def create(self, archive_format):
         """
         Creates a new backup.
         """
-        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"),
+              file=self._out)
 
         try:
             super().create(archive_format)
@@ -562,10 +4006,36 @@ class UiBackupManager(BackupManager):
             # can go wrong when creating a backup.
             raise
         else:
-            print("\t", "done.")
+            print("\t", "done.", file=self._out)
         return None
 
-    def _restore(self, *, backup_path, message, delay, verify_restore=True):
+    def print_verification(self, jobs):
+        """
+        Waits for the verification *jobs* returned by :meth:`verify` and
+        prints the results. Returns ``True``, if all backups are intact.
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+
+        intact = True
+        if not jobs:
+            print("\t", "- no backups found -")
+        for date, path, future in jobs:
+            try:
+                problems = future.result()
+            except Exception as err:
+                problems = ["the verification failed: {}".format(err)]
+
+            if problems:
+                intact = False
+                print("\t", "*", date.ctime(), termcolor.colored("corrupted", "red"))
+                for problem in problems:
+                    print("\t\t", problem)
+            else:
+                print("\t", "*", date.ctime(), termcolor.colored("ok", "green"))
+        return intact
+
+    def _restore(self, *, backup_name, message, delay, verify_restore=True,
+                 only=None):
         """
         The main purpose of this method is simply to wrap the restore
         progress and print it in a user friendly way to the console.
@@ -575,18 +4045,36 @@ class UiBackupManager(BackupManager):
 
         If *verify_restore* is True, the user is asked if he really wants to
         restore (and so overwrite) the world.
+
+        If *only* is a list of glob patterns, only the matching files are
+        restored (see :meth:`restore_only`).
         """
+        if only:
+            names = self.select_members(backup_name, only)
+            if not names:
+                print("\t", termcolor.colored("error:", "red"),
+                      "no file in the backup matches.")
+                return None
+
+            print("\t", "{} file(s) selected.".format(len(names)))
+            target = "{} file(s) of".format(len(names))
+        else:
+            target = "the"
+
         if verify_restore:
             prompt = "\t Do you really want to restore and " +\
                      termcolor.colored("overwrite", "red") +\
-                     " the world '{}'?"
-            prompt = prompt.format(self.world().name())
+                     " {} world '{}'?"
+            prompt = prompt.format(target, self.world().name())
             if not emsm.core.lib.userinput.ask(prompt):
                 return None
 
         # Restore the world.
         try:
-            super().restore(backup_path, message, delay)
+            if only:
+                super().restore_only(backup_name, only, message, delay)
+            else:
+                super().restore(backup_name, message, delay)
         except emsm.core.worlds.WorldStopFailed:
             print("\t", termcolor.colored("error:", "red"),
                   "the world could not be stopped.")
@@ -603,7 +4091,95 @@ class UiBackupManager(BackupManager):
             print("\t", "done.")
         return None
 
-    def restore(self, backup_path, message, delay, backup_date=None):
+    def _resolve_backup(self, backup_path):
+        """
+        Returns a two tuple with the manager and the name of the backup
+        *backup_path*, which is either the path of a local backup archive,
+        the name of a backup in the storage or a unique prefix of the name
+        (e.g. ``2014_09_02-20_37``). If there is no such backup, an error
+        is printed and ``(None, None)`` is returned.
+        """
+        name = os.path.basename(backup_path)
+        if os.path.isfile(backup_path):
+            storage = LocalStorage(os.path.dirname(os.path.abspath(backup_path)))
+            return (self.with_storage(storage), name)
+        if self.storage().exists(name):
+            return (self, name)
+
+        names = [record["filename"] for record in self.catalog().records() \
+                 if record["filename"].startswith(backup_path)]
+        if len(names) == 1:
+            return (self, names[0])
+
+        print("\t", termcolor.colored("error:", "red"),
+              "the backup '{}' does not exist.".format(backup_path))
+        return (None, None)
+
+    def print_diff(self, old_path, new_path):
+        """
+        Prints the files, which have been added, removed or modified between
+        the backups *old_path* and *new_path* (see :meth:`_resolve_backup`).
+        For modified region files, the coordinates of the changed chunks
+        are printed.
+
+        This method corresponds to the command line argument:
+
+            --diff A B
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+
+        old_bm, old_name = self._resolve_backup(old_path)
+        new_bm, new_name = self._resolve_backup(new_path)
+        if old_bm is None or new_bm is None:
+            return None
+
+        try:
+            diff = old_bm.diff(old_name, new_name, new_bm.storage())
+        except ValueError as err:
+            print("\t", termcolor.colored("error:", "red"), err)
+            return None
+
+        print("\t", "old:", old_name)
+        print("\t", "new:", new_name)
+        if not diff:
+            print("\t", "- no changes -")
+            return None
+
+        marks = {
+            "added": termcolor.colored("+", "green"),
+            "removed": termcolor.colored("-", "red"),
+            "modified": termcolor.colored("~", "yellow")
+            }
+        delta_sum = 0
+        for status, name, old_state, new_state in diff:
+            old_size = old_state["size"] if old_state else 0
+            new_size = new_state["size"] if new_state else 0
+            delta_sum += new_size - old_size
+
+            details = [format_size_delta(new_size - old_size)]
+            chunks = None
+            if status == "modified" and "chunks" in old_state \
+               and "chunks" in new_state:
+                chunks = changed_chunks(
+                    name, old_state["chunks"], new_state["chunks"]
+                    )
+                details.append("{} chunks".format(len(chunks)))
+
+            print("\t", marks[status], name, "({})".format(", ".join(details)))
+            if chunks:
+                print("\t\t", " ".join("({}, {})".format(x, z) \
+                                        for x, z in chunks))
+
+        print("\t", "{} added, {} removed, {} modified ({})".format(
+            sum(1 for entry in diff if entry[0] == "added"),
+            sum(1 for entry in diff if entry[0] == "removed"),
+            sum(1 for entry in diff if entry[0] == "modified"),
+            format_size_delta(delta_sum)
+            ))
+        return None
+
+    def restore(self, backup_path, message, delay, backup_date=None,
+                only=None):
         """
         This method corresponds to the command line argument:
 
@@ -611,17 +4187,47 @@ class UiBackupManager(BackupManager):
         """
         print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
 
+        # *backup_path* is either the path of a local backup archive or the
+        # name of a backup in the storage.
+        bm, name = self._resolve_backup(backup_path)
+        if bm is None:
+            return None
+
         # Print some information about the backup archive.
-        print("\t", "backup path: {}".format(backup_path))
+        print("\t", "backup path: {}".format(bm.storage().url(name)))
 
         # Restore the backup.
-        self._restore(
-            backup_path=backup_path, message=message, delay=delay,
-            verify_restore=True
+        bm._restore(
+            backup_name=name, message=message, delay=delay,
+            verify_restore=True, only=only
             )
         return None
 
-    def restore_latest(self, message, delay):
+    def restore_as(self, world_name, backup_path):
+        """
+        This method corresponds to the command line argument:
+
+            --restore-as NEWWORLD PATH
+        """
+        print(termcolor.colored("{}:".format(self.world().name()), "cyan"))
+
+        bm, name = self._resolve_backup(backup_path)
+        if bm is None:
+            return None
+
+        print("\t", "backup path: {}".format(bm.storage().url(name)))
+        try:
+            port = BackupManager.restore_as(bm, name, world_name)
+        except ValueError as err:
+            print("\t", termcolor.colored("error:", "red"), err)
+            return None
+
+        print("\t", "restored as '{}'.".format(world_name))
+        if port is not None:
+            print("\t", "server-port: {}".format(port))
+        return None
+
+    def restore_latest(self, message, delay, only=None):
         """
         This method corresponds to the command line argument:
 
@@ -634,17 +4240,17 @@ class UiBackupManager(BackupManager):
         if latest_backup == (None, None):
             print("\t", termcolor.colored("error:", "red"), "no backup available.")
         else:
-            date, path = latest_backup
+            date, name = latest_backup
             print("\t", "backup date:", date.ctime())
 
             # Restore the backup.
             self._restore(
-                backup_path=path, message=message, delay=delay,
-                verify_restore=True
+                backup_name=name, message=message, delay=delay,
+                verify_restore=True, only=only
                 )
         return None
 
-    def restore_menu(self, message, delay):
+    def restore_menu(self, message, delay, only=None):
         """
         This method corresponds to the command line argument:
 
@@ -676,8 +4282,8 @@ class UiBackupManager(BackupManager):
 
             # Restore the backup.
             self._restore(
-                backup_path=backup[1], message=message, delay=delay,
-                verify_restore=True
+                backup_name=backup[1], message=message, delay=delay,
+                verify_restore=True, only=only
                 )
         return None
 
@@ -695,6 +4301,21 @@ class Backups(BasePlugin):
 
         self._setup_conf()
         self._setup_argparser()
+
+        # Limits the number of online worlds, which are copied at the same
+        # time (see --jobs).
+        self._snapshot_lock = threading.BoundedSemaphore(
+            self._max_online_snapshots
+            )
+
+        # The content store is shared by the backups of all worlds.
+        self._content_store = ContentStore(self._backup_storage(CONTENT_DIR))
+
+        # The watcher of a world is started together with the world.
+        if self._watch:
+            emsm.core.worlds.WorldWrapper.world_started.connect(
+                self._start_watcher
+                )
         return None
 
     def _setup_conf(self):
@@ -730,6 +4351,101 @@ class Backups(BasePlugin):
         # backup_logs
         self._backup_logs = conf.getboolean("backup_logs", True)
 
+        # verify_workers
+        self._verify_workers = conf.getint("verify_workers", 0)
+        if self._verify_workers < 0:
+            self._verify_workers = 0
+
+        # incremental
+        self._incremental = conf.getboolean("incremental", False)
+
+        # watch
+        self._watch = conf.getboolean("watch", False)
+
+        # chunk_delta
+        self._chunk_delta = conf.getboolean("chunk_delta", False)
+
+        # full_backup_interval
+        self._full_backup_interval = conf.getint("full_backup_interval", 7)
+        if self._full_backup_interval < 0:
+            self._full_backup_interval = 0
+
+        # keep_hourly, keep_daily, keep_weekly, keep_monthly
+        self._retention = dict()
+        for tier, period in RETENTION_TIERS:
+            self._retention[tier] = conf.getint("keep_" + tier, 0)
+            if self._retention[tier] < 0:
+                self._retention[tier] = 0
+
+        # io_class
+        self._io_class = conf.get("io_class", "none")
+        if not self._io_class in IOPRIO_CLASSES:
+            self._io_class = "none"
+
+        # io_priority
+        self._io_priority = conf.getint("io_priority", 4)
+        self._io_priority = min(max(self._io_priority, 0), 7)
+
+        # niceness
+        self._niceness = conf.getint("niceness", 0)
+        self._niceness = min(max(self._niceness, 0), 19)
+
+        # bandwidth_limit
+        self._bandwidth_limit = conf.getint("bandwidth_limit", 0)
+        if self._bandwidth_limit < 0:
+            self._bandwidth_limit = 0
+
+        # lag_backoff
+        self._lag_backoff = conf.getint("lag_backoff", 0)
+        if self._lag_backoff < 0:
+            self._lag_backoff = 0
+
+        # max_online_snapshots
+        self._max_online_snapshots = conf.getint("max_online_snapshots", 2)
+        if self._max_online_snapshots < 1:
+            self._max_online_snapshots = 1
+
+        # storage
+        self._storage = conf.get("storage", "local")
+        if not self._storage in ("local", "mount", "s3"):
+            self._storage = "local"
+
+        # storage_path
+        self._storage_path = conf.get("storage_path", "")
+        if self._storage_path:
+            self._storage_path = os.path.expanduser(self._storage_path)
+        elif self._storage == "mount":
+            log.warning("storage 'mount' requires the 'storage_path'. "\
+                        "Using the 'local' storage.")
+            self._storage = "local"
+
+        # s3_endpoint, s3_region, s3_bucket, s3_prefix,
+        # s3_access_key, s3_secret_key
+        self._s3_endpoint = conf.get("s3_endpoint", "")
+        self._s3_region = conf.get("s3_region", "us-east-1")
+        self._s3_bucket = conf.get("s3_bucket", "")
+        self._s3_prefix = conf.get("s3_prefix", "emsm/")
+        self._s3_access_key = conf.get("s3_access_key", "")
+        self._s3_secret_key = conf.get("s3_secret_key", "")
+        if self._storage == "s3" \
+           and not (self._s3_endpoint and self._s3_bucket):
+            log.warning("storage 's3' requires the 's3_endpoint' and the "\
+                        "'s3_bucket'. Using the 'local' storage.")
+            self._storage = "local"
+
+        # s3_part_size
+        self._s3_part_size = conf.getint("s3_part_size", 8)
+        if self._s3_part_size < 5:
+            self._s3_part_size = 5
+
+        # dedup
+        self._dedup = conf.getboolean("dedup", False)
+
+        # dedup_min_size
+        self._dedup_min_size = conf.getint("dedup_min_size", 64)
+        if self._dedup_min_size < 0:
+            self._dedup_min_size = 0
+
         # Write
         # ^^^^^
 
@@ -739,6 +4455,30 @@ class Backups(BasePlugin):
         conf["restore_delay"] = str(self._restore_delay)
         conf["max_storage_size"] = str(self._max_storage_size)
         conf["backup_logs"] = "yes" if self._backup_logs else "no"
+        conf["verify_workers"] = str(self._verify_workers)
+        conf["incremental"] = "yes" if self._incremental else "no"
+        conf["watch"] = "yes" if self._watch else "no"
+        conf["chunk_delta"] = "yes" if self._chunk_delta else "no"
+        conf["full_backup_interval"] = str(self._full_backup_interval)
+        for tier, period in RETENTION_TIERS:
+            conf["keep_" + tier] = str(self._retention[tier])
+        conf["io_class"] = str(self._io_class)
+        conf["io_priority"] = str(self._io_priority)
+        conf["niceness"] = str(self._niceness)
+        conf["bandwidth_limit"] = str(self._bandwidth_limit)
+        conf["lag_backoff"] = str(self._lag_backoff)
+        conf["max_online_snapshots"] = str(self._max_online_snapshots)
+        conf["storage"] = str(self._storage)
+        conf["storage_path"] = str(self._storage_path)
+        conf["s3_endpoint"] = str(self._s3_endpoint)
+        conf["s3_region"] = str(self._s3_region)
+        conf["s3_bucket"] = str(self._s3_bucket)
+        conf["s3_prefix"] = str(self._s3_prefix)
+        conf["s3_access_key"] = str(self._s3_access_key)
+        conf["s3_secret_key"] = str(self._s3_secret_key)
+        conf["s3_part_size"] = str(self._s3_part_size)
+        conf["dedup"] = "yes" if self._dedup else "no"
+        conf["dedup_min_size"] = str(self._dedup_min_size)
         return None
 
     def _setup_argparser(self):
@@ -771,6 +4511,14 @@ class Backups(BasePlugin):
             metavar = "PATH",
             help = "Restores the backup at the given path."
             )
+        me_group.add_argument(
+            "--restore-as",
+            action = "store",
+            dest = "backups_restore_as",
+            nargs = 2,
+            metavar = ("NEWWORLD", "PATH"),
+            help = "Restores the backup at the given path into a new world."
+            )
         me_group.add_argument(
             "--restore-latest",
             action = "count",
@@ -784,6 +4532,265 @@ class Backups(BasePlugin):
             help = "Opens a dialog allowing the user to select the backup "\
                    "that should be restored."
             )
+        me_group.add_argument(
+            "--diff",
+            action = "store",
+            dest = "backups_diff",
+            nargs = 2,
+            metavar = ("A", "B"),
+            help = "Lists the files and region chunks, which changed between "\
+                   "the backups A and B."
+            )
+        me_group.add_argument(
+            "--usage",
+            action = "count",
+            dest = "backups_usage",
+            help = "Shows the unique and the shared storage used by the "\
+                   "backups."
+            )
+        me_group.add_argument(
+            "--rebuild-catalog",
+            action = "count",
+            dest = "backups_rebuild_catalog",
+            help = "Recreates the backup catalog from the backup directory."
+            )
+        me_group.add_argument(
+            "--verify",
+            action = "count",
+            dest = "backups_verify",
+            help = "Checks all backups against their manifests."
+            )
+        me_group.add_argument(
+            "--prune",
+            action = "count",
+            dest = "backups_prune",
+            help = "Removes the backups, which are not kept by the "\
+                   "retention policy."
+            )
+        me_group.add_argument(
+            "--watch",
+            action = "count",
+            dest = "backups_watch",
+            help = "Starts the watchers, which record the changed files "\
+                   "of the worlds for incremental backups."
+            )
+
+        parser.add_argument(
+            "--dry-run",
+            action = "count",
+            dest = "backups_dry_run",
+            help = "Shows which backups --prune would keep or remove and "\
+                   "why, without removing anything."
+            )
+
+        parser.add_argument(
+            "--jobs",
+            action = "store",
+            dest = "backups_jobs",
+            metavar = "N",
+            type = int,
+            default = 1,
+            help = "Creates the backups of up to N worlds at once."
+            )
+
+        parser.add_argument(
+            "--only",
+            action = "append",
+            dest = "backups_only",
+            metavar = "GLOB",
+            help = "Restores only the files of the world matching the glob "\
+                   "pattern, e.g. 'region/r.0.0.mca'. Can be used multiple "\
+                   "times."
+            )
+        return None
+
+    def _backup_manager(self, world, out=None):
+        """
+        Returns the :class:`UiBackupManager` for the *world*. The output
+        of the manager is written to *out*.
+        """
+        bm = UiBackupManager(
+            app = self.app(),
+            world = world,
+            max_storage_size = self._max_storage_size,
+            backup_dir = os.path.join(self.data_dir(), world.name()),
+            backup_logs = self._backup_logs,
+            incremental = self._incremental,
+            chunk_delta = self._chunk_delta,
+            full_backup_interval = self._full_backup_interval,
+            retention = self._retention,
+            bandwidth_limit = self._bandwidth_limit*1024,
+            lag_backoff = self._lag_backoff,
+            snapshot_lock = self._snapshot_lock,
+            storage = self._backup_storage(world.name()),
+            content_store = self._content_store,
+            dedup = self._dedup,
+            dedup_min_size = self._dedup_min_size*1024,
+            watch = self._watch,
+            out = out
+            )
+        return bm
+
+    def _backup_storage(self, name):
+        """
+        Returns the :class:`BackupStorage` for the sub directory (or prefix)
+        *name* of the configured storage. The backups of a world are stored
+        in the sub directory with the name of the world.
+        """
+        if self._storage == "s3":
+            client = emsm.core.lib.s3.S3Client(
+                endpoint = self._s3_endpoint,
+                access_key = self._s3_access_key,
+                secret_key = self._s3_secret_key,
+                region = self._s3_region
+                )
+            storage = S3Storage(
+                client = client,
+                bucket = self._s3_bucket,
+                prefix = self._s3_prefix + name + "/",
+                part_size = self._s3_part_size*2**20
+                )
+        elif self._storage == "mount":
+            storage = MountedStorage(os.path.join(self._storage_path, name))
+        elif self._storage_path:
+            storage = LocalStorage(os.path.join(self._storage_path, name))
+        else:
+            storage = LocalStorage(os.path.join(self.data_dir(), name))
+        return storage
+
+    def _start_watcher(self, world):
+        """
+        Called, when the *world* has been started. Starts the watcher of
+        the world.
+        """
+        try:
+            self._backup_manager(world).start_watcher()
+        except (OSError, StorageError) as err:
+            log.warning("could not start the watcher of the world '{}': {}"\
+                        .format(world.name(), err))
+        return None
+
+    def _print_storage_error(self, world, err):
+        """
+        Reports, that the storage of the *world* is not available, and sets
+        the exit code to *2*.
+        """
+        log.error("the storage of the world '{}' failed: {}"\
+                  .format(world.name(), err))
+        print(termcolor.colored("{}:".format(world.name()), "cyan"))
+        print("\t", termcolor.colored("error:", "red"), err)
+        self.app().set_exit_code(2)
+        return None
+
+    def _lower_priority(self):
+        """
+        Applies the *niceness* and the I/O priority to the EMSM process, so
+        that the backups don't compete with the running worlds.
+        """
+        if self._niceness > 0:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, self._niceness)
+            except OSError as err:
+                log.warning("could not change the niceness: {}".format(err))
+
+        if self._io_class != "none":
+            try:
+                set_io_priority(self._io_class, self._io_priority)
+            except OSError as err:
+                log.warning("could not change the I/O priority: {}"\
+                            .format(err))
+        return None
+
+    def _create_parallel(self, worlds, jobs):
+        """
+        Creates the backups of the *worlds* in a pool of *jobs* threads.
+
+        The output of each world is buffered and printed in the order of
+        the *worlds*, followed by a summary table. The exit code is set to
+        *2*, if a backup failed.
+        """
+        buffers = [io.StringIO() for world in worlds]
+        managers = [self._backup_manager(world, out=buffer) \
+                    for world, buffer in zip(worlds, buffers)]
+
+        summary = list()
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            futures = [executor.submit(bm.create, self._archive_format) \
+                       for bm in managers]
+
+            for bm, buffer, future in zip(managers, buffers, futures):
+                try:
+                    future.result()
+                except Exception as err:
+                    log.exception(err)
+                    print("\t", termcolor.colored("error:", "red"), err,
+                          file=buffer)
+                    summary.append((bm.world().name(), None))
+                    self.app().set_exit_code(2)
+                else:
+                    summary.append((bm.world().name(), bm.catalog().latest()))
+                print(buffer.getvalue(), end="")
+
+        # Print the summary table.
+        width = max([len("world")] + [len(name) for name, record in summary])
+        print(termcolor.colored("summary:", "cyan"))
+        print("\t", "{:<{}}  {:<6}  {:>9}  {:>10}"\
+              .format("world", width, "status", "duration", "size"))
+        for name, record in summary:
+            if record is None:
+                print("\t", "{:<{}}  {}".format(
+                    name, width, termcolor.colored("failed", "red")
+                    ))
+            else:
+                print("\t", "{:<{}}  {}  {:>8.1f}s  {:>10}".format(
+                    name, width, termcolor.colored("ok    ", "green"),
+                    record["duration"], format_size(record["size"])
+                    ))
+        return None
+
+    def _collect_garbage(self):
+        """
+        Removes the objects from the content store, which are no longer
+        referenced by any world.
+        """
+        try:
+            count, size = self._content_store.collect_garbage()
+        except (OSError, StorageError) as err:
+            log.warning("could not clean the content store: {}".format(err))
+        else:
+            if count:
+                log.info("removed {} objects ({}) from the content store."\
+                         .format(count, format_size(size)))
+        return None
+
+    def _print_usage(self, managers):
+        """
+        Prints the storage used by the backups of the worlds and the total
+        size of the content store.
+        """
+        content_usage = self._content_store.usage()
+        for bm in managers:
+            bm.usage(content_usage)
+
+        objects = self._content_store.objects()
+        print(termcolor.colored("content store:", "cyan"))
+        print("\t", "{} objects ({})".format(
+            len(objects), format_size(sum(objects.values()))
+            ))
+        return None
+
+    def _verify(self, managers):
+        """
+        Verifies the backups of all *managers* in a process pool. The exit
+        code is set to *2*, if a corrupted backup has been found.
+        """
+        max_workers = self._verify_workers or None
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            jobs = [(bm, bm.verify(executor)) for bm in managers]
+
+            for bm, world_jobs in jobs:
+                if not bm.print_verification(world_jobs):
+                    self.app().set_exit_code(2)
         return None
 
     def run(self, args):
@@ -794,25 +4801,79 @@ class Backups(BasePlugin):
         worlds = self.app().worlds().get_selected()
         worlds.sort(key = lambda w: w.name())
 
+        # A world, whose storage is not available (e.g. not mounted), is
+        # skipped.
+        managers = list()
         for world in worlds:
-            bm = UiBackupManager(
-                app = self.app(),
-                world = world,
-                max_storage_size = self._max_storage_size,
-                backup_dir = os.path.join(self.data_dir(), world.name()),
-                backup_logs = self._backup_logs
-                )
+            try:
+                managers.append(self._backup_manager(world))
+            except StorageError as err:
+                self._print_storage_error(world, err)
+        worlds = [bm.world() for bm in managers]
+
+        if args.backups_create or args.backups_verify:
+            self._lower_priority()
+
+        # The backups of several worlds are created at once, if the user
+        # wants it.
+        if args.backups_create and args.backups_jobs > 1:
+            self._create_parallel(worlds, args.backups_jobs)
+            self._collect_garbage()
+            return None
+
+        # The verification of the backups is done for all worlds at once
+        # in a process pool.
+        if args.backups_verify:
+            self._verify(managers)
+            return None
+
+        if args.backups_usage:
+            self._print_usage(managers)
+            return None
 
-            if args.backups_list:
-                bm.list()
-            elif args.backups_create:
-                bm.create(self._archive_format)
-            elif args.backups_restore:
-                bm.restore(args.backups_restore, self._restore_message,
-                           self._restore_delay
-                           )
-            elif args.backups_restore_latest:
-                bm.restore_latest(self._restore_message, self._restore_delay)
-            elif args.backups_restore_menu:
-                bm.restore_menu(self._restore_message, self._restore_delay)
+        for bm in managers:
+            try:
+                if args.backups_list:
+                    bm.list()
+                elif args.backups_create:
+                    bm.create(self._archive_format)
+                elif args.backups_restore:
+                    bm.restore(args.backups_restore, self._restore_message,
+                               self._restore_delay, only=args.backups_only
+                               )
+                elif args.backups_restore_as:
+                    bm.restore_as(*args.backups_restore_as)
+                elif args.backups_restore_latest:
+                    bm.restore_latest(
+                        self._restore_message, self._restore_delay,
+                        only=args.backups_only
+                        )
+                elif args.backups_restore_menu:
+                    bm.restore_menu(
+                        self._restore_message, self._restore_delay,
+                        only=args.backups_only
+                        )
+                elif args.backups_diff:
+                    bm.print_diff(*args.backups_diff)
+                elif args.backups_rebuild_catalog:
+                    bm.recover_catalog()
+                elif args.backups_prune:
+                    bm.prune(dry_run=bool(args.backups_dry_run))
+                elif args.backups_watch:
+                    bm.watch()
+            except StorageError as err:
+                self._print_storage_error(bm.world(), err)
+
+        # The backups may no longer need some objects in the content store.
+        if args.backups_create \
+           or (args.backups_prune and not args.backups_dry_run):
+            self._collect_garbage()
         return None
+
+
+# Main
+# ------------------------------------------------
+
+# The watcher process of a world (see :meth:`BackupManager.start_watcher`).
+if __name__ == "__main__" and sys.argv[1:2] == ["--watch"]:
+    watch_world(sys.argv[2], sys.argv[3])
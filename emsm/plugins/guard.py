@@ -50,11 +50,36 @@ are checked.
 
     Defines how the guard handles a world in trouble.
 
+    A world is stopped only once, but restarted as long as it fails. The
+    restarts are delayed with an exponential backoff: After the *n*-th
+    restart, the guard waits *--restart-backoff* * 2^(n-1) seconds, before
+    it restarts the world again. If a world has been restarted
+    *--max-restarts* times within *--restart-window* minutes, it is
+    considered broken and put in quarantine: The guard does not restart it
+    anymore, until the quarantine is cleared with *--reset*.
+
+.. option:: --restart-backoff SECONDS
+
+    The delay after the first restart of a world (default: 60).
+
+.. option:: --max-restarts N
+
+    The number of restarts within the *--restart-window*, after which the
+    world is quarantined (default: 5).
+
+.. option:: --restart-window MINUTES
+
+    The time span, in which the restarts are counted (default: 30).
+
+.. option:: --reset
+
+    Clears the quarantine and the restart history of the selected worlds.
+
 .. note::
 
-    Per default, all tests will be performed. If you don't want to run all
-    tests, you can pass the tests, which should be performed as command
-    line arguments.
+    Per default, only *--test-status*, *--test-log* and *--test-port* will
+    be performed. If you want to run other tests or not all of them, you can
+    pass the tests, which should be performed as command line arguments.
 
 .. option:: --test-status
 
@@ -62,11 +87,75 @@ are checked.
 
 .. option:: --test-log
 
-    Check if the logs contain an error.
+    Check if a new error has been logged since the previous run. The guard
+    remembers how much of the log it has already scanned, so each line is
+    only read once and an old error does not trigger the test again.
 
 .. option:: --test-port
 
-    Check if the world is reachable.
+    Check if the world is reachable. The ports of all worlds are checked at
+    once, so the test takes at most 5 seconds, no matter how many worlds
+    are selected. A world fails the test, if no connection could be made
+    within 5 attempts.
+
+.. option:: --daemon
+
+    Runs the guard until it receives *SIGTERM*. The tests are repeated every
+    *--interval* seconds. The daemon keeps the state of the worlds in memory
+    and reads only the new lines of the logs, so a crashed world is detected
+    within seconds instead of minutes. The guard database is only saved,
+    when it changed. Between two checks, the EMSM lock is released, so that
+    other EMSM commands (e.g. backups) can run. Afterwards, the configuration
+    is read again, so that changes made in the meantime are not overwritten,
+    when the daemon exits.
+
+    Each warning is printed only once in daemon mode.
+
+.. option:: --interval SECONDS
+
+    The number of seconds between two checks of the daemon (default: 10).
+
+.. option:: --test-ping
+
+    Check if the world answers the *Server List Ping* (the status request
+    of the multiplayer server list) in time. Unlike *--test-port*, this test
+    also fails, if the server accepts connections, but is stuck. Servers
+    before Minecraft 1.7 are pinged with the legacy protocol.
+
+    This test is only performed, if it is selected explicitly.
+
+.. option:: --ping-max-latency MS
+
+    The ping test fails, if the world needs longer than *MS* milliseconds
+    to answer the ping (default: 1000).
+
+.. option:: --test-lag
+
+    Check if the world lags too much. The *Can't keep up!* warnings of the
+    last hour are collected from the new lines of the log (see also
+    ``worlds --lag``). The test fails, if there have been more than
+    *--lag-max-events* warnings in the last hour or if the 95th percentile
+    of the lag exceeds *--lag-max-p95*. The warnings before the latest
+    restart of the world are not counted.
+
+    This test is only performed, if it is selected explicitly.
+
+.. option:: --lag-max-events N
+
+    The maximum number of lag warnings per hour (default: 60).
+
+.. option:: --lag-max-p95 MS
+
+    The maximum 95th percentile of the lag in milliseconds (default: 5000).
+
+.. option:: --test-rcon
+
+    Check if the world answers a command (*list*) sent via RCON. The test is
+    skipped, if *enable-rcon* is not set in the :file:`server.properties`.
+    The RCON connections are kept open, so the daemon sends the command
+    without a new handshake.
+
+    This test is only performed, if it is selected explicitly.
 
 .. option:: --output-format {console, text}
 
@@ -93,6 +182,15 @@ This plugin is made for cron (therefore it does not print much):
     # Runs the guard every 5 minutes for the world *foo*.
     */5 * *   *   *   root minecraft -w foo guard --output-only-new-warnings --output-format text
 
+If the worlds should be checked more often, run the guard as daemon instead,
+e.g. with systemd:
+
+.. code-block:: ini
+
+    [Service]
+    ExecStart=/usr/bin/minecraft -W guard --daemon --interval 10 --error-action restart
+    KillSignal=SIGTERM
+
 Changelog
 ---------
 
@@ -122,12 +220,20 @@ import time
 import socket
 import logging
 import json
+import copy
+import signal
+import threading
+import asyncio
+import random
+import struct
+import collections
 
 # third party
 import termcolor
 
 # local
 import emsm
+import emsm.core.lib.lag
 from emsm.core.base_plugin import BasePlugin
 
 
@@ -145,6 +251,41 @@ except NameError:
 
 PLUGIN = "Guard"
 
+# The names of the tests (see *Guard._test_<name>*).
+TESTS = ("status", "log", "port", "ping", "lag", "rcon")
+
+# The tests, which are performed, if no test has been selected. The other
+# tests must be selected explicitly.
+DEFAULT_TESTS = ("status", "log", "port")
+
+# The timeout of a single connection attempt of the port test, the number
+# of attempts and the time after which a world is considered unreachable.
+PORT_TIMEOUT = 1
+PORT_ATTEMPTS = 5
+PORT_DEADLINE = 5
+
+# The maximum delay in seconds before the next connection attempt. The
+# delays are random, so that the retries of the worlds are spread.
+PORT_RETRY_JITTER = 0.25
+
+# The maximum delay in seconds between two restarts of a world.
+MAX_RESTART_BACKOFF = 60*60
+
+# Seconds, until a world is considered unresponsive by the ping test.
+PING_TIMEOUT = 5
+
+# The protocol version sent in the handshake of a Server List Ping. ``-1``
+# means, that the client does not know the version of the server.
+PING_PROTOCOL_VERSION = -1
+
+#: The answer of a Server List Ping: The *version* name of the server
+#: (``None`` for very old servers), the *motd*, the number of *online*
+#: players, the maximum number of players and the round-trip *latency* in
+#: seconds.
+PingResult = collections.namedtuple(
+    "PingResult", ["version", "motd", "online", "max", "latency"]
+    )
+
 log = logging.getLogger(__file__)
 
 
@@ -172,6 +313,13 @@ class TestFailure(Exception):
         return tmp
 
 
+class PingError(Exception):
+    """
+    Raised, if a server sent an invalid answer to a Server List Ping.
+    """
+    pass
+
+
 # Functions
 # ------------------------------------------------
 
@@ -203,9 +351,351 @@ def port_is_open(adr, timeout=1, attempts=1):
     return False
 
 
+def _run_concurrently(coros):
+    """
+    Runs the coroutines *coros* at the same time in a new event loop and
+    returns the list of their results. If a coroutine raised an exception,
+    the exception is returned as its result.
+    """
+    async def run_all():
+        return await asyncio.gather(*coros, return_exceptions=True)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return list(loop.run_until_complete(run_all()))
+    finally:
+        loop.close()
+
+
+async def _probe_port(adr, timeout, attempts, deadline):
+    """
+    Tries to connect to the tcp address *adr* up to
+    *attempts* times and returns the latency of the first successful
+    connection in seconds or ``None``. Each attempt waits at most *timeout*
+    seconds and the whole probe ends after *deadline* seconds.
+    """
+    loop = asyncio.get_event_loop()
+    end = loop.time() + deadline
+    for i in range(attempts):
+        remaining = end - loop.time()
+        if remaining <= 0:
+            break
+
+        start = loop.time()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(*adr), min(timeout, remaining)
+                )
+        except (OSError, asyncio.TimeoutError) as err:
+            delay = random.uniform(0, PORT_RETRY_JITTER*(i + 1))
+            await asyncio.sleep(max(min(delay, end - loop.time()), 0))
+        else:
+            latency = loop.time() - start
+            writer.close()
+            return latency
+    return None
+
+
+def probe_ports(addresses, timeout=PORT_TIMEOUT, attempts=PORT_ATTEMPTS,
+                deadline=PORT_DEADLINE):
+    """
+    Checks all tcp *addresses* at the same time and returns the list of the
+    connection latencies in seconds. The latency is ``None``, if the
+    address is not reachable (see :func:`port_is_open`).
+
+    The check takes at most *deadline* seconds, no matter how many
+    addresses are checked.
+    """
+    if not addresses:
+        return list()
+
+    return _run_concurrently([
+        _probe_port(adr, timeout, attempts, deadline) for adr in addresses
+        ])
+
+
+def _pack_varint(value):
+    """
+    Returns the *value* encoded as VarInt of the Minecraft protocol.
+    """
+    value &= 0xFFFFFFFF
+    data = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def _unpack_varint(data, offset=0):
+    """
+    Decodes the VarInt at *offset* in *data* and returns a two tuple with
+    the value and the offset of the next byte.
+
+    :raises PingError:
+        if the VarInt is invalid.
+    """
+    value = 0
+    for i in range(5):
+        if offset >= len(data):
+            raise PingError("truncated VarInt")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << 7*i
+        if not byte & 0x80:
+            return (value, offset)
+    raise PingError("VarInt is too long")
+
+
+def _pack_packet(packet_id, payload=b""):
+    """
+    Returns the packet *packet_id* with the *payload* and its length prefix.
+    """
+    data = _pack_varint(packet_id) + payload
+    return _pack_varint(len(data)) + data
+
+
+async def _read_packet(reader):
+    """
+    Reads a packet from the stream *reader* and returns a two tuple with the
+    packet id and the payload.
+
+    :raises PingError:
+        if the server answered with the *kick* packet of the legacy
+        protocol (servers before 1.7).
+    """
+    # The length of the packet (VarInt).
+    header = await reader.readexactly(1)
+    if header == b"\xff":
+        raise PingError("the server uses the legacy protocol")
+    while header[-1] & 0x80 and len(header) < 5:
+        header += await reader.readexactly(1)
+    length, _ = _unpack_varint(header)
+
+    data = await reader.readexactly(length)
+    packet_id, offset = _unpack_varint(data)
+    return (packet_id, data[offset:])
+
+
+def _chat_text(component):
+    """
+    Returns the plain text of the chat *component* (the MOTD of a server).
+    """
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return "".join(_chat_text(item) for item in component)
+    if isinstance(component, dict):
+        return _chat_text(component.get("text", "")) \
+               + _chat_text(component.get("extra", list()))
+    return str()
+
+
+async def _ping_status(reader, writer, host, port):
+    """
+    Performs the Server List Ping of Minecraft 1.7 and newer: The handshake,
+    the status request and the ping. Returns a :class:`PingResult`.
+    """
+    loop = asyncio.get_event_loop()
+
+    host = host.encode()
+    handshake = _pack_varint(PING_PROTOCOL_VERSION) \
+                + _pack_varint(len(host)) + host \
+                + struct.pack(">H", port) + _pack_varint(1)
+    writer.write(_pack_packet(0x00, handshake) + _pack_packet(0x00))
+
+    packet_id, payload = await _read_packet(reader)
+    if packet_id != 0x00:
+        raise PingError("unexpected packet {:#x}".format(packet_id))
+    length, offset = _unpack_varint(payload)
+    try:
+        status = json.loads(payload[offset:offset + length].decode())
+        version = status.get("version", dict()).get("name")
+        motd = _chat_text(status.get("description", ""))
+        players = status.get("players", dict())
+        online = int(players.get("online", 0))
+        max_players = int(players.get("max", 0))
+    except (ValueError, AttributeError) as err:
+        raise PingError("invalid status: {}".format(err))
+
+    # The latency is the round-trip time of the ping packet.
+    token = random.getrandbits(63)
+    start = loop.time()
+    writer.write(_pack_packet(0x01, struct.pack(">q", token)))
+    packet_id, payload = await _read_packet(reader)
+    if packet_id != 0x01 or payload != struct.pack(">q", token):
+        raise PingError("invalid pong")
+    latency = loop.time() - start
+    return PingResult(version, motd, online, max_players, latency)
+
+
+async def _ping_legacy(reader, writer):
+    """
+    Performs the legacy Server List Ping (``0xFE 0x01``) of Minecraft 1.6
+    and older. Returns a :class:`PingResult`.
+    """
+    loop = asyncio.get_event_loop()
+
+    start = loop.time()
+    writer.write(b"\xfe\x01")
+    header = await reader.readexactly(3)
+    if header[0] != 0xFF:
+        raise PingError("unexpected packet {:#x}".format(header[0]))
+    length = struct.unpack(">H", header[1:])[0]
+    text = (await reader.readexactly(2*length)).decode("utf-16-be")
+    latency = loop.time() - start
+
+    try:
+        # 1.4 - 1.6: "§1\0<protocol>\0<version>\0<motd>\0<online>\0<max>"
+        if text.startswith("\xa71\x00"):
+            fields = text.split("\x00")
+            version, motd, online, max_players = fields[2:6]
+        # Before 1.4: "<motd>§<online>§<max>"
+        else:
+            version = None
+            motd, online, max_players = text.rsplit("\xa7", 2)
+        return PingResult(version, motd, int(online), int(max_players), latency)
+    except ValueError as err:
+        raise PingError("invalid status: {}".format(err))
+
+
+async def _ping(adr, timeout):
+    """
+    Pings the server at the tcp address *adr* and returns a
+    :class:`PingResult`. If the server does not understand the protocol of
+    Minecraft 1.7, the legacy protocol is used.
+    """
+    loop = asyncio.get_event_loop()
+    end = loop.time() + timeout
+    host, port = adr
+
+    async def ping(legacy):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            if legacy:
+                return await _ping_legacy(reader, writer)
+            return await _ping_status(reader, writer, host or "localhost", port)
+        finally:
+            writer.close()
+
+    try:
+        return await asyncio.wait_for(ping(False), timeout)
+    except (PingError, asyncio.IncompleteReadError, ConnectionResetError):
+        remaining = end - loop.time()
+        if remaining <= 0:
+            raise asyncio.TimeoutError()
+        return await asyncio.wait_for(ping(True), remaining)
+
+
+def ping_servers(addresses, timeout=PING_TIMEOUT):
+    """
+    Pings the servers at the tcp *addresses* at the same time and returns
+    the list of their :class:`PingResult`. If a server could not be pinged,
+    the exception is returned instead: :class:`asyncio.TimeoutError`, if the
+    server did not answer within *timeout* seconds, :class:`PingError`, if
+    the answer was invalid, or an :class:`OSError`.
+    """
+    return _run_concurrently([_ping(adr, timeout) for adr in addresses])
+
+
+def ping(adr, timeout=PING_TIMEOUT):
+    """
+    Pings the server at the tcp address *adr* and returns its
+    :class:`PingResult`.
+
+    :raises asyncio.TimeoutError:
+        if the server did not answer within *timeout* seconds.
+    :raises PingError:
+        if the server sent an invalid answer.
+    :raises OSError:
+        if the server is not reachable.
+    """
+    result = ping_servers([adr], timeout)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def restart_backoff(restarts, base):
+    """
+    Returns the number of seconds, which should be waited after the
+    *restarts*-th restart of a world, before it is restarted again.
+    """
+    if restarts <= 0:
+        return 0
+    return min(base*2**(restarts - 1), MAX_RESTART_BACKOFF)
+
+
 # Classes
 # ------------------------------------------------
 
+class LogFollower(object):
+    """
+    Reads the log of a world incrementally, so that each line is only
+    scanned once.
+
+    *start_re* matches the line, which is logged when the server starts,
+    and *error_re* an error line (see :class:`emsm.core.server.BaseServerWrapper`).
+    *state* is the value of :meth:`state` after the previous scan.
+    """
+
+    def __init__(self, path, start_re, error_re, state=None):
+        """
+        """
+        self._path = path
+        self._start_re = re.compile(start_re)
+        self._error_re = re.compile(error_re)
+
+        # The inode of the log and the number of bytes, which have already
+        # been scanned.
+        state = state or dict()
+        self._inode = state.get("inode")
+        self._offset = state.get("offset", 0)
+        return None
+
+    def state(self):
+        """
+        Returns a JSON serializable dictionary with the *inode* of the log
+        and the *offset* of the first line, which has not been scanned yet.
+        """
+        return {"inode": self._inode, "offset": self._offset}
+
+    def update(self):
+        """
+        Scans the new lines of the log and returns the list of the error
+        lines, which have been logged after the last start of the server.
+        An incomplete last line is scanned in the next update.
+        """
+        try:
+            with open(self._path, "rb") as file:
+                stat = os.fstat(file.fileno())
+
+                # The log has been rotated or truncated.
+                if stat.st_ino != self._inode or stat.st_size < self._offset:
+                    self._inode = stat.st_ino
+                    self._offset = 0
+
+                file.seek(self._offset)
+                data = file.read()
+        except (IOError, FileNotFoundError):
+            return list()
+
+        data = data[:data.rfind(b"\n") + 1]
+        self._offset += len(data)
+
+        errors = list()
+        for line in data.decode(errors="replace").splitlines():
+            # The errors before a restart are obsolete.
+            if self._start_re.match(line):
+                errors = list()
+            elif self._error_re.search(line):
+                errors.append(line)
+        return errors
+
+
 class Guard(BasePlugin):
 
     VERSION = "4.0.0-beta"
@@ -222,6 +712,20 @@ class Guard(BasePlugin):
         # in the guard database. Read more below.
         self._guard_db = None
         self._load_guard_db()
+
+        # Maps the name of a world to its :class:`LogFollower` and its
+        # :class:`~emsm.core.lib.lag.LagMonitor`.
+        self._logs = dict()
+        self._lags = dict()
+        self._lag_max_events = 60
+        self._lag_max_p95 = 5000
+
+        # The output of ``screen -ls`` and the latencies of the worlds
+        # (see :meth:`_probe_ports`) during a check.
+        self._sessions = None
+        self._latencies = dict()
+        self._pings = dict()
+        self._ping_max_latency = 1
         return None
 
     def _setup_argparser(self):
@@ -236,7 +740,8 @@ class Guard(BasePlugin):
             title = "tests",
             description = ("You can define which tests are performed, by "
                            "passing one of these arguments. If no test is "
-                           "selected, all tests are performed."
+                           "selected, the status, log and port tests are "
+                           "performed."
                            )
             )
         tests_group.add_argument(
@@ -249,7 +754,7 @@ class Guard(BasePlugin):
             "--test-log",
             action = "count",
             dest = "guard_test_log",
-            help = "Check if the logs contain an error."
+            help = "Check if a new error has been logged."
             )
         tests_group.add_argument(
             "--test-port",
@@ -257,6 +762,54 @@ class Guard(BasePlugin):
             dest = "guard_test_port",
             help = "Check if the world's server is reachable."
             )
+        tests_group.add_argument(
+            "--test-ping",
+            action = "count",
+            dest = "guard_test_ping",
+            help = "Check if the world's server answers the server list ping. "
+                   "(Not performed per default.)"
+            )
+        tests_group.add_argument(
+            "--ping-max-latency",
+            action = "store",
+            type = int,
+            default = 1000,
+            metavar = "MS",
+            dest = "guard_ping_max_latency",
+            help = "The maximum latency of the ping test in milliseconds."
+            )
+        tests_group.add_argument(
+            "--test-lag",
+            action = "count",
+            dest = "guard_test_lag",
+            help = "Check if the world's server lags too much. "
+                   "(Not performed per default.)"
+            )
+        tests_group.add_argument(
+            "--lag-max-events",
+            action = "store",
+            type = int,
+            default = 60,
+            metavar = "N",
+            dest = "guard_lag_max_events",
+            help = "The maximum number of lag warnings per hour."
+            )
+        tests_group.add_argument(
+            "--lag-max-p95",
+            action = "store",
+            type = int,
+            default = 5000,
+            metavar = "MS",
+            dest = "guard_lag_max_p95",
+            help = "The maximum 95th percentile of the lag in milliseconds."
+            )
+        tests_group.add_argument(
+            "--test-rcon",
+            action = "count",
+            dest = "guard_test_rcon",
+            help = "Check if the world's server answers RCON commands. "
+                   "(Not performed per default.)"
+            )
 
         # Error action
         parser.add_argument(
@@ -267,6 +820,39 @@ class Guard(BasePlugin):
             dest = "guard_error_action",
             help = "Defines the reaction on detected errors."
             )
+        parser.add_argument(
+            "--restart-backoff",
+            action = "store",
+            type = int,
+            default = 60,
+            metavar = "SECONDS",
+            dest = "guard_restart_backoff",
+            help = "The delay after the first restart of a world."
+            )
+        parser.add_argument(
+            "--max-restarts",
+            action = "store",
+            type = int,
+            default = 5,
+            metavar = "N",
+            dest = "guard_max_restarts",
+            help = "Quarantines a world after N restarts in the restart window."
+            )
+        parser.add_argument(
+            "--restart-window",
+            action = "store",
+            type = int,
+            default = 30,
+            metavar = "MINUTES",
+            dest = "guard_restart_window",
+            help = "The time span, in which the restarts are counted."
+            )
+        parser.add_argument(
+            "--reset",
+            action = "count",
+            dest = "guard_reset",
+            help = "Clears the quarantine and the restart history."
+            )
 
         # Output
         output_group = parser.add_argument_group(
@@ -288,6 +874,23 @@ class Guard(BasePlugin):
             dest = "guard_output_only_new_warnings",
             help = "Prints only new warnings."
             )
+
+        # Daemon
+        parser.add_argument(
+            "--daemon",
+            action = "count",
+            dest = "guard_daemon",
+            help = "Checks the worlds continuously, until SIGTERM is received."
+            )
+        parser.add_argument(
+            "--interval",
+            action = "store",
+            type = int,
+            default = 10,
+            metavar = "SECONDS",
+            dest = "guard_interval",
+            help = "The number of seconds between two checks of the daemon."
+            )
         return None
 
     # Guard database
@@ -296,19 +899,42 @@ class Guard(BasePlugin):
     We store some data about the worlds health, so that we are able to print a
     warning for the same error only once.
 
-    The guard db is simply a json serialized dictionary, which stores only
+    The guard db is simply a json serialized dictionary. *errors* stores only
     information about worlds which are *already* in trouble:
 
-        {'myworld': {'failed_test': 'status',
-                     'test_message': 'world is offline',
-                     'time': 1418996881.327088,
-                     'warning_printed': False
-                     }
-         'world2': ...
+        {'errors': {'myworld': {'failed_test': 'status',
+                                'test_message': 'world is offline',
+                                'time': 1418996881.327088,
+                                'warning_printed': False
+                                },
+                    'world2': ...
+                    },
+         'logs': {'myworld': {'inode': 1838290, 'offset': 20713},
+                  'world2': ...
+                  },
+         'lag': {'myworld': {'inode': 1838290, 'offset': 20713,
+                             'events': [[1418996881.0, 5023], ...]
+                             },
+                 'world2': ...
+                 },
+         'restarts': {'myworld': {'times': [1418996881.327088, ...],
+                                  'quarantined': None
+                                  },
+                      'world2': ...
+                      }
         }
 
-    A world is removed from this database, as soon as it is restarted or if
-    it passes all tests.
+    A world is removed from *errors*, as soon as it is restarted or if it
+    passes all tests. *logs* stores the state of the :class:`LogFollower` of
+    each world, so that the log test only scans the new lines of the log.
+    *lag* stores the state of the lag monitors in the same way.
+
+    *restarts* stores the times of the restarts within the restart window
+    and the time, when the world has been quarantined (or ``None``). The
+    record is kept after the world recovered, so that a flapping world is
+    detected too. It is only removed with *--reset*.
+
+    The database is only written, if it changed.
     """
 
     def _guard_db_path(self):
@@ -324,13 +950,25 @@ class Guard(BasePlugin):
                 self._guard_db = json.load(file)
         except (IOError, FileNotFoundError):
             self._guard_db = dict()
+
+        # Until EMSM 4, the database contained only the errors.
+        if not "errors" in self._guard_db:
+            self._guard_db = {"errors": self._guard_db}
+        self._guard_db.setdefault("logs", dict())
+        self._guard_db.setdefault("lag", dict())
+        self._guard_db.setdefault("restarts", dict())
+        self._saved_guard_db = copy.deepcopy(self._guard_db)
         return None
 
     def _save_guard_db(self):
         """
         """
+        if self._guard_db == self._saved_guard_db:
+            return None
+
         with open(self._guard_db_path(), "w") as file:
             json.dump(self._guard_db, file)
+        self._saved_guard_db = copy.deepcopy(self._guard_db)
         return None
 
     # World health checks
@@ -345,7 +983,7 @@ class Guard(BasePlugin):
         This test fails, if the world is offline or has been launched multiple
         times.
         """
-        pids = world.pids()
+        pids = world.pids(self._sessions)
 
         # Check if the world is offline.
         if len(pids) == 0:
@@ -360,57 +998,251 @@ class Guard(BasePlugin):
 
     def _test_log(self, world):
         """
-        This test failes, if the log contains a severe error.
+        This test failes, if a new severe error has been logged since the
+        previous test.
         """
-        # Search the log for error records.
-        error_re = world.server().log_error_re()
-        log = world.latest_log()
-
-        res = re.search(error_re, log)
-        if res:
-            raise TestFailure(world, "log", str(res))
+        # Only the lines of the log, which have not been scanned by the
+        # previous test, are read.
+        follower = self._logs.get(world.name())
+        if follower is None:
+            follower = LogFollower(
+                world.log_path(), world.server().log_start_re(),
+                world.server().log_error_re(),
+                self._guard_db["logs"].get(world.name())
+                )
+            self._logs[world.name()] = follower
+
+        errors = follower.update()
+        self._guard_db["logs"][world.name()] = follower.state()
+        if errors:
+            message = errors[0]
+            if len(errors) > 1:
+                message += " (and {} more)".format(len(errors) - 1)
+            raise TestFailure(world, "log", message)
         return None
 
+    def _probe_ports(self, worlds):
+        """
+        Checks the ports of all *worlds* at once and returns a dictionary,
+        which maps the name of each world, whose address is known, to the
+        connection latency or ``None``, if the world is not reachable.
+        """
+        worlds = [(world, world.address()) for world in worlds]
+        worlds = [(world, (ip, port)) for world, (ip, port) in worlds \
+                  if port is not None]
+
+        latencies = probe_ports([adr for world, adr in worlds])
+        return {world.name(): latency \
+                for (world, adr), latency in zip(worlds, latencies)}
+
     def _test_port(self, world):
         """
         This test fails, if the world's port is not open.
         """
-        ip, port = world.address()
+        if not world.name() in self._latencies:
+            self._latencies.update(self._probe_ports([world]))
 
         # Check if the EMSM could retrieve the world's address.
-        if port is None:
+        if not world.name() in self._latencies:
             log.warning("port test for '{}' could not be performed, since the "
-                        "world's address could not be retrieved."
+                        "world's address could not be retrieved."\
+                        .format(world.name())
                         )
-        # Check if we can create a connection to the address and raise an
+        # Check if we could create a connection to the address and raise an
         # error if not.
-        elif not port_is_open((ip, port), timeout=1, attempts=5):
-            raise TestFailure(world, "port")
+        elif self._latencies[world.name()] is None:
+            raise TestFailure(
+                world, "port", "not reachable within {}s".format(PORT_DEADLINE)
+                )
+        else:
+            log.info("port test for '{}' passed ({:.0f}ms)."\
+                     .format(world.name(), self._latencies[world.name()]*1000))
+        return None
+
+    def _ping_worlds(self, worlds):
+        """
+        Pings all *worlds* at once and returns a dictionary, which maps the
+        name of each world, whose address is known, to the result of
+        :func:`ping_servers`.
+        """
+        worlds = [(world, world.address()) for world in worlds]
+        worlds = [(world, (ip, port)) for world, (ip, port) in worlds \
+                  if port is not None]
+
+        results = ping_servers([adr for world, adr in worlds])
+        return {world.name(): result \
+                for (world, adr), result in zip(worlds, results)}
+
+    def _test_ping(self, world):
+        """
+        This test fails, if the world does not answer the server list ping
+        or answers too slow.
+        """
+        if not world.name() in self._pings:
+            self._pings.update(self._ping_worlds([world]))
+
+        # Check if the EMSM could retrieve the world's address.
+        if not world.name() in self._pings:
+            log.warning("ping test for '{}' could not be performed, since the "
+                        "world's address could not be retrieved."\
+                        .format(world.name())
+                        )
+            return None
+
+        result = self._pings[world.name()]
+        if isinstance(result, asyncio.TimeoutError):
+            raise TestFailure(
+                world, "ping", "no answer within {}s".format(PING_TIMEOUT)
+                )
+        elif isinstance(result, Exception):
+            raise TestFailure(world, "ping", str(result) or repr(result))
+        elif result.latency > self._ping_max_latency:
+            raise TestFailure(
+                world, "ping", "latency {:.0f}ms".format(result.latency*1000)
+                )
+        else:
+            log.info("ping test for '{}' passed ({}/{} players, {:.0f}ms)."\
+                     .format(world.name(), result.online, result.max,
+                             result.latency*1000))
+        return None
+
+    def _test_lag(self, world):
+        """
+        This test fails, if the world logged too many lag warnings in the
+        last hour or if the lag has been too high.
+        """
+        lag_re = world.server().log_lag_re()
+        if lag_re is None:
+            log.info("lag test for '{}' skipped, since the server does not "
+                     "report lags.".format(world.name())
+                     )
+            return None
+
+        # Only the lines of the log, which have not been scanned by the
+        # previous test, are read.
+        monitor = self._lags.get(world.name())
+        if monitor is None:
+            monitor = emsm.core.lib.lag.LagMonitor(
+                world.log_path(), lag_re,
+                self._guard_db["lag"].get(world.name()),
+                start_re = world.server().log_start_re()
+                )
+            self._lags[world.name()] = monitor
+
+        monitor.update()
+        self._guard_db["lag"][world.name()] = monitor.state()
+
+        stats = monitor.stats()
+        if stats.events > self._lag_max_events:
+            raise TestFailure(
+                world, "lag", "{} lag warnings in the last hour"\
+                .format(stats.events)
+                )
+        elif stats.p95 is not None and stats.p95 > self._lag_max_p95:
+            raise TestFailure(
+                world, "lag", "p95 lag {}ms in the last hour".format(stats.p95)
+                )
+        else:
+            log.info("lag test for '{}' passed ({} warnings in the last hour)."\
+                     .format(world.name(), stats.events))
         return None
 
+    def _test_rcon(self, world):
+        """
+        This test fails, if the world does not answer a command sent via
+        RCON.
+        """
+        if world.rcon_address() is None:
+            log.info("rcon test for '{}' skipped, since RCON is not enabled."\
+                     .format(world.name()))
+            return None
+
+        start = time.monotonic()
+        try:
+            world.rcon_command("list")
+        except emsm.core.rcon.RconError as err:
+            raise TestFailure(world, "rcon", str(err))
+        log.info("rcon test for '{}' passed ({:.0f}ms)."\
+                 .format(world.name(), (time.monotonic() - start)*1000))
+        return None
+
+    def _selected_tests(self, args):
+        """
+        Returns the names of the tests selected in *args*. If no test has
+        been selected, the :data:`DEFAULT_TESTS` are returned.
+        """
+        tests = [name for name in TESTS if getattr(args, "guard_test_" + name)]
+        return tests or list(DEFAULT_TESTS)
+
     def _test(self, world, args):
         """
         Performs the via *args* selected tests on the world, to check if
         everything works fine.
         """
-        # Todo: If the number of tests gets bigger, it would be wise
-        #       to replace this with loops.
-
-        do_all_tests = not (args.guard_test_status \
-                            or args.guard_test_log \
-                            or args.guard_test_port
-                            )
-
-        if do_all_tests or args.guard_test_status:
-            self._test_status(world)
-        if do_all_tests or args.guard_test_log:
-            self._test_log(world)
-        if do_all_tests or args.guard_test_port:
-            self._test_port(world)
+        for name in self._selected_tests(args):
+            getattr(self, "_test_" + name)(world)
         return None
 
     # Error reaction
 
+    def _restart_record(self, world, args):
+        """
+        Returns the restart record of the *world* (see the guard database),
+        without the restarts, which are older than the restart window.
+        """
+        db_record = self._guard_db["restarts"].get(world.name())
+        if db_record is None:
+            return {"times": list(), "quarantined": None}
+
+        window_start = time.time() - args.guard_restart_window*60
+        times = [t for t in db_record["times"] if t > window_start]
+        if times != db_record["times"]:
+            db_record["times"] = times
+        return db_record
+
+    def _next_restart(self, db_record, args):
+        """
+        Returns the time, when the world with the restart record *db_record*
+        may be restarted again.
+        """
+        if not db_record["times"]:
+            return time.time()
+        return db_record["times"][-1] \
+               + restart_backoff(len(db_record["times"]),
+                                 args.guard_restart_backoff)
+
+    def _restart(self, world, args):
+        """
+        Restarts the *world*, unless it is quarantined or the backoff delay
+        has not expired yet. Quarantines the world, if it has been restarted
+        too often within the restart window.
+        """
+        db_record = self._restart_record(world, args)
+        self._guard_db["restarts"][world.name()] = db_record
+
+        if db_record["quarantined"]:
+            log.info("'{}' is quarantined and will not be restarted."\
+                     .format(world.name()))
+        elif len(db_record["times"]) >= args.guard_max_restarts:
+            db_record["quarantined"] = time.time()
+            log.error("'{}' has been restarted {} times within {} minutes "
+                      "and is quarantined now."\
+                      .format(world.name(), len(db_record["times"]),
+                              args.guard_restart_window)
+                      )
+
+            # The quarantine is a new warning.
+            self._guard_db["errors"][world.name()]["warning_printed"] = False
+        elif time.time() < self._next_restart(db_record, args):
+            log.info("restart of '{}' delayed until {}."\
+                     .format(world.name(),
+                             time.ctime(self._next_restart(db_record, args)))
+                     )
+        else:
+            db_record["times"].append(time.time())
+            world.restart(force_restart=True)
+        return None
+
     def _handle_error(self, world, args):
         """
         The *world* is in trouble. This method reacts on the world's issues
@@ -422,7 +1254,21 @@ class Guard(BasePlugin):
         elif args.guard_error_action == "stop":
             world.stop(force_stop=True)
         elif args.guard_error_action == "restart":
-            world.restart(force_restart=True)
+            self._restart(world, args)
+        return None
+
+    def _reset(self, world):
+        """
+        Clears the quarantine and the restart history of the *world*.
+        """
+        db_record = self._guard_db["restarts"].pop(world.name(), None)
+        self._guard_db["errors"].pop(world.name(), None)
+
+        print(termcolor.colored("{}:".format(world.name()), "cyan"))
+        if db_record and db_record["quarantined"]:
+            print("\t", "The quarantine has been cleared.")
+        else:
+            print("\t", "The world was not quarantined.")
         return None
 
     def _guard(self, world, args):
@@ -437,31 +1283,61 @@ class Guard(BasePlugin):
 
             # Note, that *db_record* is actually a reference and not only
             # a copy.
-            db_record = self._guard_db.get(world.name(), dict())
-            self._guard_db[world.name()] = db_record
-
-            # Handle the error, if we did not react earlier on it
-            # or if the error_action changed.
-            if db_record.get("error_action") is None \
+            db_record = self._guard_db["errors"].get(world.name(), dict())
+            self._guard_db["errors"][world.name()] = db_record
+
+            # Update the guard database. The record is kept, as long as
+            # the world fails the same way, so that *test_time* is the time
+            # of the first failure and the database does not change.
+            handled = db_record.get("error_action") == args.guard_error_action
+            if db_record.get("failed_test") != err.test_name \
+               or db_record.get("test_message") != err.message \
                or db_record.get("error_action") != args.guard_error_action:
+                db_record["failed_test"] = err.test_name
+                db_record["test_message"] = err.message
+                db_record["test_time"] = time.time()
+                db_record["error_action"] = args.guard_error_action
+                db_record["warning_printed"] = False
+
+            # Handle the error, if we did not react earlier on it or if the
+            # error_action changed. A world is restarted as long as it fails,
+            # but the restarts are delayed (see :meth:`_restart`).
+            if not handled or args.guard_error_action == "restart":
                 self._handle_error(world, args)
-
-            # Update the guard database.
-            db_record["failed_test"] = err.test_name
-            db_record["test_message"] = err.message
-            db_record["test_time"] = time.time()
-            db_record["error_action"] = args.guard_error_action
-            db_record["warning_printed"] = db_record.get("warning_printed", False)
         else:
             # The world is running fine. So we can remove it from the
             # error database, if it was registered.
-            if world.name() in self._guard_db:
-                self._guard_db.pop(world.name())
+            if world.name() in self._guard_db["errors"]:
+                self._guard_db["errors"].pop(world.name())
         return None
 
     # Output
 
-    def _print_status_text(self, world, db_record):
+    def _restart_status(self, world, args):
+        """
+        Returns the list of the (key, value) pairs, which describe the
+        restart backoff state of the *world*.
+        """
+        if not world.name() in self._guard_db["restarts"]:
+            return list()
+
+        db_record = self._restart_record(world, args)
+        status = [(
+            "restarts", "{} in the last {} minutes"\
+            .format(len(db_record["times"]), args.guard_restart_window)
+            )]
+        if db_record["quarantined"]:
+            status.append((
+                "quarantined", "since {} (clear with --reset)"\
+                .format(time.ctime(db_record["quarantined"]))
+                ))
+        elif db_record["times"]:
+            status.append((
+                "next_restart", time.ctime(self._next_restart(db_record, args))
+                ))
+        return status
+
+    def _print_status_text(self, world, db_record, args):
         """
         """
         print(world.name())
@@ -471,11 +1347,13 @@ class Guard(BasePlugin):
         print("test_message: ", db_record["test_message"])
         print("test_time:    ", time.ctime(db_record["test_time"]))
         print("error_action: ", db_record["error_action"])
+        for key, value in self._restart_status(world, args):
+            print("{:<14}".format(key + ":"), value)
         print()
         print()
         return None
 
-    def _print_status_console(self, world, db_record):
+    def _print_status_console(self, world, db_record, args):
         """
         """
         print(termcolor.colored("{}:".format(world.name()), "cyan"))
@@ -483,6 +1361,10 @@ class Guard(BasePlugin):
         print("\t", "test_message: ", db_record["test_message"])
         print("\t", "test_time:    ", time.ctime(db_record["test_time"]))
         print("\t", "error_action: ", db_record["error_action"])
+        for key, value in self._restart_status(world, args):
+            if key == "quarantined":
+                value = termcolor.colored(value, "red")
+            print("\t", "{:<14}".format(key + ":"), value)
         return None
 
     def _print_status(self, world, args):
@@ -490,7 +1372,7 @@ class Guard(BasePlugin):
         Prints a warning if the world is in trouble or nothing, if not.
         """
         # Get the status report without altering the database.
-        db_record = self._guard_db.get(world.name())
+        db_record = self._guard_db["errors"].get(world.name())
 
         # Break, if the world is not in trouble.
         # (This means that no records exists.)
@@ -504,9 +1386,9 @@ class Guard(BasePlugin):
 
         # Print the status.
         if args.guard_output_format == "console":
-            self._print_status_console(world, db_record)
+            self._print_status_console(world, db_record, args)
         elif args.guard_output_format == "text":
-            self._print_status_text(world, db_record)
+            self._print_status_text(world, db_record, args)
 
         # Mark the status as already printed.
         db_record["warning_printed"] = True
@@ -514,16 +1396,86 @@ class Guard(BasePlugin):
 
     # --
 
+    def _check(self, worlds, args):
+        """
+        Runs the guard once for all *worlds*.
+        """
+        # The screen sessions are only listed once and the ports of all
+        # worlds are checked at the same time.
+        self._sessions = emsm.core.worlds.screen_ls()
+        if "port" in self._selected_tests(args):
+            self._latencies = self._probe_ports(worlds)
+        if "ping" in self._selected_tests(args):
+            self._pings = self._ping_worlds(worlds)
+            self._ping_max_latency = args.guard_ping_max_latency/1000
+        self._lag_max_events = args.guard_lag_max_events
+        self._lag_max_p95 = args.guard_lag_max_p95
+        try:
+            for world in worlds:
+                self._guard(world, args)
+                self._print_status(world, args)
+        finally:
+            self._sessions = None
+            self._latencies = dict()
+            self._pings = dict()
+
+        # Save any changes made during the run.
+        self._save_guard_db()
+        return None
+
+    def _daemon(self, worlds, args):
+        """
+        Checks the *worlds* every *--interval* seconds, until SIGTERM is
+        received. The EMSM lock is released between two checks and the
+        configuration is read again, after the lock has been reacquired.
+        """
+        stop = threading.Event()
+        def handle_sigterm(signum, frame):
+            log.info("the guard daemon received SIGTERM.")
+            stop.set()
+            return None
+        old_handler = signal.signal(signal.SIGTERM, handle_sigterm)
+
+        # Each warning is printed only once.
+        args.guard_output_only_new_warnings = True
+
+        lock = self.app().lock()
+        interval = max(args.guard_interval, 1)
+        log.info("the guard daemon checks the worlds every {}s."\
+                 .format(interval))
+        try:
+            while not stop.is_set():
+                self._check(worlds, args)
+                sys.stdout.flush()
+
+                lock.release()
+                try:
+                    stop.wait(interval)
+                finally:
+                    lock.acquire()
+
+                    # The configuration may have been changed, while the
+                    # lock was released. Since the EMSM writes the
+                    # configuration on exit, our copy must not be stale.
+                    self.app().conf().read()
+        finally:
+            signal.signal(signal.SIGTERM, old_handler)
+        log.info("the guard daemon stopped.")
+        return None
+
     def run(self, args):
         """
         """
         # Run the guard for all selected worlds in alphabetical order.
         worlds = self.app().worlds().get_selected()
         worlds.sort(key = lambda w: w.name())
-        for world in worlds:
-            self._guard(world, args)
-            self._print_status(world, args)
 
-        # Save any changes made during the run.
-        self._save_guard_db()
+        if args.guard_reset:
+            for world in worlds:
+                self._reset(world)
+            self._save_guard_db()
+        elif args.guard_daemon:
+            self._daemon(worlds, args)
+        else:
+            self._check(worlds, args)
         return None
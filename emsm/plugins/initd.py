@@ -63,12 +63,63 @@ worlds.conf
     [foo]
     enable_initd = no
 
+    [proxy]
+    depends_on = lobby, survival
+
 **enable_initd**
 
     If ``yes``, the autostart/-stop is enabled.
 
+**depends_on**
+
+    A comma separated list of worlds, which must be running, before the
+    world is started. The world is stopped before these worlds. E.g. a
+    BungeeCord proxy should depend on its backend servers. Cycles and
+    unknown worlds are reported, when the configuration is loaded.
+
+**start_order**
+
+    An integer (default: 0). Worlds with a lower start order are started
+    before and stopped after worlds with a higher one, even if they do not
+    depend on each other.
+
+The worlds are started in levels: The first level contains all worlds
+without dependencies (and with the lowest start order). All worlds of a
+level are started, before the initd waits until their ports accept
+connections. Then the next level is started.
+
 If you want to enable *init.d* for all worlds, use the *DEFAULT* section.
 
+main.conf
+^^^^^^^^^
+
+.. code-block:: ini
+
+    [initd]
+    parallel_stop = no
+    stop_deadline = 60
+    start_timeout = 120
+
+**parallel_stop**
+
+    If ``yes``, all worlds are stopped at the same time: The *stop_message*
+    is sent to all worlds at once, then the largest *stop_delay* of the
+    worlds is waited, before *save-all* and *stop* are sent to all worlds.
+    Finally, the stop of all worlds is awaited together. This way, the
+    shutdown takes only as long as the slowest world and not the sum of all
+    delays and timeouts.
+
+**stop_deadline**
+
+    The maximum number of seconds the parallel stop may take. Worlds, which
+    are still online after the deadline, are killed. Choose a value below
+    the timeout of your init system (e.g. *TimeoutStopSec* of systemd).
+
+**start_timeout**
+
+    The maximum number of seconds waited, until the worlds of a level
+    accept connections, before the next level is started.
+
 Arguments
 ---------
 
@@ -82,6 +133,9 @@ Arguments
     Note, that this will always **force** the stop of the world, since the
     process is killed anyway during system shutdown.
 
+    If *parallel_stop* is enabled, all worlds are stopped at once within
+    the *stop_deadline*.
+
 .. option:: --restart
 
     Forces the restart of all worlds which has *enable_initd* enabled.
@@ -101,6 +155,8 @@ The exit code is set to:
 
 # std
 import logging
+import socket
+import time
 
 # third party
 import blinker
@@ -142,9 +198,31 @@ class InitD(BasePlugin):
         """
         BasePlugin.__init__(self, app, name)
 
+        self._setup_conf()
         self._setup_argparser()
         return None
 
+    def _setup_conf(self):
+        """
+        Loads the configuration values and makes sure they have a valid value.
+        """
+        conf = self.conf()
+
+        self._parallel_stop = conf.getboolean("parallel_stop", False)
+        self._stop_deadline = conf.getint("stop_deadline", 60)
+        if self._stop_deadline <= 0:
+            log.warning("initd: stop_deadline must be positive, using 60.")
+            self._stop_deadline = 60
+        self._start_timeout = conf.getint("start_timeout", 120)
+        if self._start_timeout < 0:
+            log.warning("initd: start_timeout must be positive, using 120.")
+            self._start_timeout = 120
+
+        conf["parallel_stop"] = "yes" if self._parallel_stop else "no"
+        conf["stop_deadline"] = str(self._stop_deadline)
+        conf["start_timeout"] = str(self._start_timeout)
+        return None
+
     def _setup_argparser(self):
         """
         Sets the argument parser up.
@@ -206,9 +284,38 @@ class InitD(BasePlugin):
         worlds.sort(key = lambda w: w.name())
         return worlds
 
+    def _wait_ready(self, worlds, timeout):
+        """
+        Waits up to *timeout* seconds, until the ports of the *worlds* accept
+        connections. Returns the list of the worlds, which are not ready.
+        Worlds, whose address is unknown, are considered ready.
+        """
+        pending = [(world, world.address()) for world in worlds]
+        pending = [(world, (ip or "localhost", port)) \
+                   for world, (ip, port) in pending if port is not None]
+
+        end_time = time.time() + timeout
+        while pending and time.time() < end_time:
+            for world, adr in list(pending):
+                try:
+                    socket.create_connection(adr, 1).close()
+                except OSError:
+                    pass
+                else:
+                    pending.remove((world, adr))
+            if pending:
+                time.sleep(0.5)
+        return [world for world, adr in pending]
+
     def _start(self):
         """
         Starts all worlds if *enable_initd* is true.
+
+        The worlds are started level by level (see
+        :meth:`~emsm.core.worlds.WorldManager.dependency_levels`). The next
+        level is started, when the worlds of the current level accept
+        connections. A world is not started, if a world it depends on could
+        not be started.
         """
         # We create the unformatted messages here to increase readability.
         raw_msg = "[ {status} ] starting the minecraft world '{{world_name}}'"
@@ -219,15 +326,40 @@ class InitD(BasePlugin):
         # Start the worlds.
         log.info("initd start ...")
 
-        for world in self._initd_worlds():
-            print(pre_msg.format(world_name=world.name()), end="\r")
-            try:
-                world.start()
-            except emsm.core.worlds.WorldStartFailed as err:
-                print(fail_msg.format(world_name=world.name()))
-                self.app().set_exit_code(2)
-            else:
-                print(ok_msg.format(world_name=world.name()))
+        levels = self.app().worlds().dependency_levels(self._initd_worlds())
+        failed = set()
+        for i, level in enumerate(levels):
+            started = list()
+            for world in level:
+                print(pre_msg.format(world_name=world.name()), end="\r")
+
+                missing = failed.intersection(world.depends_on())
+                if missing:
+                    log.warning("initd: '{}' is not started, since '{}' is "
+                                "not ready.".format(world.name(),
+                                                    "', '".join(sorted(missing))))
+                    print(fail_msg.format(world_name=world.name()))
+                    failed.add(world.name())
+                    self.app().set_exit_code(2)
+                    continue
+
+                try:
+                    world.start()
+                except emsm.core.worlds.WorldStartFailed as err:
+                    print(fail_msg.format(world_name=world.name()))
+                    failed.add(world.name())
+                    self.app().set_exit_code(2)
+                else:
+                    print(ok_msg.format(world_name=world.name()))
+                    started.append(world)
+
+            # Wait until the worlds are ready, before the worlds which depend
+            # on them are started.
+            if i + 1 < len(levels) and started:
+                for world in self._wait_ready(started, self._start_timeout):
+                    log.warning("initd: '{}' did not open its port within {}s."\
+                                .format(world.name(), self._start_timeout))
+                    failed.add(world.name())
 
         log.info("initd start done.")
         return None
@@ -235,6 +367,9 @@ class InitD(BasePlugin):
     def _stop(self):
         """
         Stops all worlds if *enable_initd* is true.
+
+        The worlds are stopped in the reverse order of the start, so a
+        proxy is stopped before its backend servers.
         """
         # We create the unformatted messages here to increase readability.
         raw_msg = "[ {status} ] stopping the minecraft world '{{world_name}}'"
@@ -245,20 +380,61 @@ class InitD(BasePlugin):
         # Stop the worlds.
         log.info("initd stop ...")
 
-        for world in self._initd_worlds():
-            print(pre_msg.format(world_name=world.name()), end="\r")
-            try:
-                # Because the process is killed anyway, we force it here.
-                world.stop(force_stop=True)
-            except emsm.core.worlds.WorldStopFailed as err:
-                print(fail_msg.format(world_name=world.name()))
-                self.app().set_exit_code(2)
-            else:
-                print(ok_msg.format(world_name=world.name()))
+        levels = self.app().worlds().dependency_levels(self._initd_worlds())
+        levels.reverse()
+
+        if self._parallel_stop:
+            self._stop_parallel(levels, fail_msg, ok_msg)
+            log.info("initd stop done.")
+            return None
+
+        for level in levels:
+            for world in level:
+                print(pre_msg.format(world_name=world.name()), end="\r")
+                try:
+                    # Because the process is killed anyway, we force it here.
+                    world.stop(force_stop=True)
+                except emsm.core.worlds.WorldStopFailed as err:
+                    print(fail_msg.format(world_name=world.name()))
+                    self.app().set_exit_code(2)
+                else:
+                    print(ok_msg.format(world_name=world.name()))
 
         log.info("initd stop done.")
         return None
 
+    def _stop_parallel(self, levels, fail_msg, ok_msg):
+        """
+        Stops the worlds of each level in *levels* at the same time. All
+        levels together are stopped within the *stop_deadline*.
+
+        See also:
+            * WorldManager.stop_worlds()
+        """
+        end_time = time.time() + self._stop_deadline
+        for i, level in enumerate(levels):
+            print("[ ... ] stopping {} minecraft worlds".format(len(level)),
+                  end="\r")
+
+            # The remaining time is shared by the remaining levels. Each
+            # level gets at least one second, if there is enough time left.
+            remaining = max(0, end_time - time.time())
+            deadline = min(remaining, max(1, remaining/(len(levels) - i)))
+
+            # Because the process is killed anyway, we force it here.
+            failed = self.app().worlds().stop_worlds(
+                level, force_stop=True, deadline=deadline
+                )
+            if failed:
+                self.app().set_exit_code(2)
+
+            for world in level:
+                if world in failed:
+                    print(fail_msg.format(world_name=world.name()))
+                else:
+                    print(ok_msg.format(world_name=world.name()))
+        return None
+
     def _restart(self):
         """
         Forces the restart of all worlds which has *enable_initd* enabled.
@@ -272,7 +448,8 @@ class InitD(BasePlugin):
         # Restart the worlds.
         log.info("initd restart ...")
 
-        for world in self._initd_worlds():
+        levels = self.app().worlds().dependency_levels(self._initd_worlds())
+        for world in [world for level in levels for world in level]:
             print(pre_msg.format(world_name=world.name()), end="\r")
             try:
                 # Because the process is killed anyway, we force it here.
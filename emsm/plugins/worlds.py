@@ -93,6 +93,20 @@ Arguments
 
     Limits the number of printed lines.
 
+.. option:: --lag
+
+    Prints the tick lag warnings (*Can't keep up!*) of the last hour: The
+    number of warnings, the warnings per hour, the 95th percentile and the
+    maximum of the lag. Only the part of the log, which has not been scanned
+    by the previous call, is read.
+
+.. option:: --query
+
+    Prints the status of the world (motd, version, plugins, map and the
+    online players) retrieved with the UDP query protocol. This requires
+    *enable-query* in the :file:`server.properties`. All selected worlds are
+    queried at once.
+
 .. option:: --pid
 
     Prints the PID of the screen session that runs the server.
@@ -117,6 +131,8 @@ Arguments
 .. option:: --verbose-send CMD
 
     Sends the command to the server and prints the echo in the logfiles.
+    If *enable-rcon* is set in the :file:`server.properties`, the command is
+    sent via RCON and the response of the server is printed instead.
 
 .. option:: --console
 
@@ -178,6 +194,12 @@ Examples
     $ minecraft -w foo worlds --log-limit 5
     $ minecraft -w foo worlds --log-start '-50' --log-limit 10
 
+    # Print the tick lag statistics of all worlds:
+    $ minecraft -W worlds --lag
+
+    # Print the players of all worlds:
+    $ minecraft -W worlds --query
+
     # Open the console of a running world
     $ minecraft -w bar worlds --console
 
@@ -192,12 +214,16 @@ Examples
 import os
 import sys
 import time
+import json
+import asyncio
 
 # third party
 import termcolor
 
 # emsm
 import emsm
+import emsm.core.lib.lag
+import emsm.core.query
 from emsm.core.base_plugin import BasePlugin
 
 
@@ -276,6 +302,71 @@ class MyWorld(object):
         print("\t", self._world.directory())
         return None
 
+    def print_lag(self, state=None):
+        """
+        Scans the new lines of the log for tick lag warnings and prints the
+        aggregates of the last hour. Returns the new *state* of the
+        monitor.
+
+        See also:
+            * emsm.core.lib.lag.LagMonitor
+        """
+        print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
+
+        lag_re = self._world.server().log_lag_re()
+        if lag_re is None:
+            print("\t", "The server does not report lags.")
+            return state
+
+        monitor = emsm.core.lib.lag.LagMonitor(
+            self._world.log_path(), lag_re, state,
+            start_re = self._world.server().log_start_re()
+            )
+        monitor.update()
+        stats = monitor.stats()
+
+        if not stats.events:
+            print("\t", termcolor.colored("no lag", "green"),
+                  "in the last hour.")
+            return monitor.state()
+
+        print("\t", "events:   ", stats.events,
+              "({:.1f}/h)".format(stats.per_hour))
+        if stats.p95 is not None:
+            print("\t", "p95:      ", "{}ms".format(stats.p95))
+            print("\t", "max:      ", "{}ms".format(stats.max))
+        print("\t", "last:     ", time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.localtime(stats.last)
+            ))
+        return monitor.state()
+
+    def print_query(self, result):
+        """
+        Prints the *result* of :func:`emsm.core.query.query_servers` for
+        this world or a note, if the query is not enabled (*result* is
+        ``None``).
+        """
+        print(termcolor.colored("{}:".format(self._world.name()), "cyan"))
+        if result is None:
+            print("\t", "The query is not enabled (enable-query).")
+        elif isinstance(result, asyncio.TimeoutError):
+            print("\t", termcolor.colored("error:", "red"),
+                  "no answer to the query.")
+        elif isinstance(result, Exception):
+            print("\t", termcolor.colored("error:", "red"), result)
+        else:
+            print("\t", "motd:    ", result.hostname)
+            print("\t", "version: ", result.version)
+            if result.server_mod:
+                print("\t", "server:  ", result.server_mod)
+            if result.plugins:
+                print("\t", "plugins: ", ", ".join(result.plugins))
+            print("\t", "map:     ", result.map)
+            print("\t", "players: ", "{}/{}".format(result.online, result.max),
+                  ", ".join(result.players))
+            print("\t", "latency: ", "{:.0f}ms".format(result.latency*1000))
+        return None
+
     def print_latest_log(self, start_line=0, line_limit=20):
         """
         Prints the latest log of the world.
@@ -642,6 +733,13 @@ class Worlds(BasePlugin):
             help = "The number of lines that will be printed."
             )
 
+        log_group.add_argument(
+            "--lag",
+            action = "count",
+            dest = "worlds_lag",
+            help = "Prints the tick lag statistics of the last hour."
+            )
+
         # XXX: I need a name for that group
         # of arguments.
         console_group = parser.add_argument_group(title="console")
@@ -680,6 +778,12 @@ class Worlds(BasePlugin):
             dest = "status",
             help = "Prints the status of the world."
             )
+        status_group.add_argument(
+            "--query",
+            action = "count",
+            dest = "worlds_query",
+            help = "Prints the status retrieved with the UDP query."
+            )
         status_group.add_argument(
             "--start",
             action = "count",
@@ -731,6 +835,28 @@ class Worlds(BasePlugin):
             )
         return None
 
+    def _lag_db_path(self):
+        """
+        """
+        return os.path.join(self.data_dir(), "lag.json")
+
+    def _load_lag_db(self):
+        """
+        Returns the states of the lag monitors of the worlds.
+        """
+        try:
+            with open(self._lag_db_path()) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return dict()
+
+    def _save_lag_db(self, lag_db):
+        """
+        """
+        with open(self._lag_db_path(), "w") as file:
+            json.dump(lag_db, file)
+        return None
+
     def run(self, args):
         """
         """
@@ -738,6 +864,19 @@ class Worlds(BasePlugin):
         worlds = self.app().worlds().get_selected()
         worlds.sort(key = lambda w: w.name())
 
+        if args.worlds_lag:
+            lag_db = self._load_lag_db()
+
+        # All worlds are queried at once.
+        if args.worlds_query:
+            addresses = [(world, world.query_address()) for world in worlds]
+            addresses = [(world, adr) for world, adr in addresses if adr]
+            results = emsm.core.query.query_servers(
+                [adr for world, adr in addresses]
+                )
+            query_results = {world.name(): result \
+                             for (world, adr), result in zip(addresses, results)}
+
         for world in worlds:
             world = MyWorld(self.app, world)
 
@@ -760,6 +899,10 @@ class Worlds(BasePlugin):
                 if args.log_limit is None:
                     args.log_limit = self._default_log_limit
                 world.print_latest_log(args.log_start, args.log_limit)
+            elif args.worlds_lag:
+                lag_db[world.world().name()] = world.print_lag(
+                    lag_db.get(world.world().name())
+                    )
 
             # pid / status / ...
             elif args.pid:
@@ -767,6 +910,8 @@ class Worlds(BasePlugin):
 
             elif args.status:
                 world.print_status()
+            elif args.worlds_query:
+                world.print_query(query_results.get(world.world().name()))
 
             # send / screen / ...
             elif args.send:
@@ -794,4 +939,7 @@ class Worlds(BasePlugin):
             # Setup
             elif args.uninstall:
                 world.uninstall()
+
+        if args.worlds_lag:
+            self._save_lag_db(lag_db)
         return None
@@ -62,12 +62,15 @@ setup(
     include_package_data = True,
     platforms = "LINUX",
     install_requires = requirements,
+    python_requires = ">=3.6",
     classifiers = [
         "Development Status :: 4 - Beta",
         "Environment :: Console",
         "License :: OSI Approved :: MIT License",
         "Operating System :: POSIX :: Linux",
-        "Programming Language :: Python :: 3.2",
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.6",
         "Topic :: Games/Entertainment",
         "Topic :: System :: Systems Administration",
         "Topic :: Utilities"